@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from books_service.models import Author, Book
+from books_service.models import Author, Book, EmailOutbox
 
 
 admin.site.register(Book)
 admin.site.register(Author)
+admin.site.register(EmailOutbox)
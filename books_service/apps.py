@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class BooksServiceConfig(AppConfig):
@@ -7,3 +8,5 @@ class BooksServiceConfig(AppConfig):
 
     def ready(self) -> None:
         from books_service import signals
+
+        post_migrate.connect(signals.create_search_indexes, sender=self)
@@ -0,0 +1,175 @@
+import hashlib
+import time
+import uuid
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from library_project.db_router import replica_reads_active
+
+
+CACHE_PREFIX = "catalog"
+NAMESPACES = ("books", "authors", "feed")
+# cached with the data, conditional requests are answered from them
+VALIDATOR_HEADERS = ("ETag", "Last-Modified")
+
+
+def _version_key(namespace: str, scope: str) -> str:
+    return f"{CACHE_PREFIX}:{namespace}:version:{scope}"
+
+
+def _stats_key(namespace: str, result: str) -> str:
+    return f"{CACHE_PREFIX}:{namespace}:stats:{result}"
+
+
+def _new_version() -> str:
+    # the bump time tells whether replicas may still lag behind
+    return f"{int(time.time())}-{uuid.uuid4().hex[:12]}"
+
+
+def _changed_within(versions: list[str], seconds: int) -> bool:
+    now = time.time()
+    for version in versions:
+        changed, separator, _ = version.partition("-")
+        if separator and now - int(changed) < seconds:
+            return True
+    return False
+
+
+def _get_versions(*keys: str) -> list[str]:
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _response_cache_key(
+    namespace: str, request: Request, pk: Optional[str] = None
+) -> tuple[str, list[str]]:
+    """
+    Key of a cached response: absolute URL with sorted query params, and
+    the versions it depends on. Bumping a version orphans its responses.
+
+    - "all" version: every page of the namespace
+    - "list" version: list pages
+    - "<pk>" version: detail page of a single object
+    """
+    scope = "list" if pk is None else str(pk)
+    versions = _get_versions(
+        _version_key(namespace, "all"), _version_key(namespace, scope)
+    )
+    query = sorted(request.query_params.lists())
+    url = request.build_absolute_uri(request.path)
+    digest = hashlib.md5(f"{url}?{query}".encode()).hexdigest()
+    key = (
+        f"{CACHE_PREFIX}:{namespace}:page:{scope}:"
+        f"{':'.join(versions)}:{digest}"
+    )
+    return key, versions
+
+
+def response_cache_key(
+    namespace: str, request: Request, pk: Optional[str] = None
+) -> str:
+    return _response_cache_key(namespace, request, pk)[0]
+
+
+def _count(namespace: str, result: str) -> None:
+    key = _stats_key(namespace, result)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def cached_response(
+    namespace: str,
+    request: Request,
+    get_response: Callable[[], Response],
+    pk: Optional[str] = None,
+) -> Response:
+    key, versions = _response_cache_key(namespace, request, pk)
+    entry = cache.get(key)
+    if entry is not None:
+        _count(namespace, "hits")
+        headers = {**entry["headers"], "X-Cache": "HIT"}
+        response = get_conditional_response(
+            request,
+            etag=headers.get("ETag"),
+            last_modified=parse_http_date_safe(
+                headers.get("Last-Modified", "")
+            ),
+        )
+        if response is None:
+            return Response(entry["data"], headers=headers)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    response = get_response()
+    _count(namespace, "misses")
+    # a replica may not have the change yet, its response is served
+    # but not cached under the new version
+    stale = replica_reads_active() and _changed_within(
+        versions, settings.REPLICA_PIN_SECONDS
+    )
+    if response.status_code == status.HTTP_200_OK and not stale:
+        entry = {
+            "data": response.data,
+            "headers": {
+                name: response[name]
+                for name in VALIDATOR_HEADERS
+                if response.has_header(name)
+            },
+        }
+        cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+def get_cache_stats() -> dict[str, dict[str, int]]:
+    keys = {
+        (namespace, result): _stats_key(namespace, result)
+        for namespace in NAMESPACES
+        for result in ("hits", "misses")
+    }
+    values = cache.get_many(keys.values())
+    stats = {namespace: {"hits": 0, "misses": 0} for namespace in NAMESPACES}
+    for (namespace, result), key in keys.items():
+        stats[namespace][result] = values.get(key, 0)
+    return stats
+
+
+def _bump_versions(namespace: str, scopes: tuple[str, ...]) -> None:
+    cache.set_many(
+        {_version_key(namespace, scope): _new_version() for scope in scopes},
+        timeout=None,
+    )
+
+
+def invalidate_catalog_cache(
+    namespace: str, pk: Optional[int] = None, everything: bool = False
+) -> None:
+    """
+    Invalidate list pages of the namespace and the detail page of `pk`
+    (or every page with `everything`). Versions are bumped right away and
+    again after commit, so a response cached by a concurrent request from
+    not yet committed data does not survive the transaction.
+    """
+    scopes = ("list",)
+    if pk is not None:
+        scopes += (str(pk),)
+    if everything:
+        scopes += ("all",)
+
+    _bump_versions(namespace, scopes)
+    transaction.on_commit(lambda: _bump_versions(namespace, scopes))
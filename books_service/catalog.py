@@ -0,0 +1,370 @@
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import IO, Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from books_service.cache import invalidate_catalog_cache
+from books_service.models import Author, Book
+from books_service.search import fill_search_vectors
+
+
+FORMATS = ("jsonl", "csv")
+FIELDS = (
+    "title",
+    "author_first_name",
+    "author_last_name",
+    "cover",
+    "inventory",
+    "daily_fee",
+)
+BOOK_FIELDS = ("title", "cover", "inventory", "daily_fee")
+AUTHOR_FIELDS = {
+    "author_first_name": "first_name",
+    "author_last_name": "last_name",
+}
+
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    authors_created: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def format_from_path(path: str) -> Optional[str]:
+    extension = path.rsplit(".", 1)[-1].lower()
+    return extension if extension in FORMATS else None
+
+
+def read_rows(stream: IO[str], file_format: str) -> Iterator[dict]:
+    """Rows of a JSONL or CSV catalog, read one line at a time"""
+    if file_format == "csv":
+        yield from csv.DictReader(stream)
+        return
+
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def write_rows(
+    stream: IO[str], file_format: str, rows: Iterable[tuple]
+) -> int:
+    written = 0
+    if file_format == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+        return written
+
+    for row in rows:
+        stream.write(json.dumps(dict(zip(FIELDS, row)), default=str))
+        stream.write("\n")
+        written += 1
+    return written
+
+
+def export_rows(chunk_size: int) -> Iterator[tuple]:
+    """Books in id order, fetched with a server-side cursor where possible"""
+    return (
+        Book.objects.order_by("id")
+        .values_list(
+            "title",
+            "author__first_name",
+            "author__last_name",
+            "cover",
+            "inventory",
+            "daily_fee",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+@lru_cache
+def row_fields() -> tuple:
+    return tuple(
+        (
+            name,
+            Author._meta.get_field(AUTHOR_FIELDS[name])
+            if name in AUTHOR_FIELDS
+            else Book._meta.get_field(name),
+        )
+        for name in FIELDS
+    )
+
+
+def clean_row(row: dict) -> dict:
+    """
+    Validate a row with the model fields' own clean(), which applies
+    max_length, choices, and the integer and decimal validators, without
+    building model instances.
+    """
+    if not isinstance(row, dict):
+        raise ValidationError("Row must be an object")
+
+    cleaned, errors = {}, {}
+    for name, model_field in row_fields():
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        try:
+            cleaned[name] = model_field.clean(value, None)
+        except ValidationError as error:
+            errors[name] = error.messages
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+class CatalogImporter:
+    """
+    Load catalog rows in batches: authors are resolved by their natural
+    key (first name, last name) and created in bulk, books are inserted
+    with bulk_create, or with COPY through a staging table on PostgreSQL.
+    Books already in the catalog (same title, author and cover) are
+    skipped, or have inventory and daily_fee updated with `update`.
+
+    Per-row save() and its signals are bypassed, so books_count, search
+    vectors and the catalog cache are refreshed once in finish(), and no
+    new book notifications are sent.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 5000,
+        update: bool = False,
+        use_copy: Optional[bool] = None,
+        max_errors: int = 100,
+    ) -> None:
+        self.batch_size = batch_size
+        self.update = update
+        self.using = router.db_for_write(Book)
+        connection = connections[self.using]
+        if use_copy is None:
+            use_copy = connection.vendor == "postgresql"
+        self.use_copy = use_copy and connection.vendor == "postgresql"
+        self.max_errors = max_errors
+        self.authors: dict[tuple[str, str], int] = {}
+        self.author_ids: set[int] = set()
+        self.stats = ImportStats()
+
+    def run(self, rows: Iterable[dict], progress=None) -> ImportStats:
+        batch = []
+        for line, row in enumerate(rows, start=1):
+            try:
+                batch.append(clean_row(row))
+            except ValidationError as error:
+                self.stats.invalid += 1
+                if len(self.stats.errors) < self.max_errors:
+                    self.stats.errors.append(f"Row {line}: {error}")
+            if len(batch) >= self.batch_size:
+                self.load_batch(batch)
+                batch = []
+                if progress:
+                    progress(self.stats)
+        if batch:
+            self.load_batch(batch)
+        self.finish()
+        return self.stats
+
+    def load_batch(self, batch: list[dict]) -> None:
+        with transaction.atomic(using=self.using):
+            authors = self.resolve_authors(batch)
+            books = {}
+            for row in batch:
+                author_id = authors[
+                    (row["author_first_name"], row["author_last_name"])
+                ]
+                # the last duplicate in a batch wins, as a later batch would
+                books[(row["title"], author_id, row["cover"])] = row
+            if self.use_copy:
+                existing = self.copy_books(books)
+            else:
+                existing = self.create_books(books)
+
+        created = len(books) - existing
+        updated = existing if self.update else 0
+        self.stats.rows += len(batch)
+        self.stats.created += created
+        self.stats.updated += updated
+        self.stats.skipped += len(batch) - created - updated
+        self.author_ids.update(authors.values())
+
+    def resolve_authors(self, batch: list[dict]) -> dict:
+        names = {
+            (row["author_first_name"], row["author_last_name"])
+            for row in batch
+        }
+        missing = names - self.authors.keys()
+        if missing:
+            self.fetch_authors(missing)
+            new = missing - self.authors.keys()
+            if new:
+                Author.objects.using(self.using).bulk_create(
+                    [
+                        Author(first_name=first_name, last_name=last_name)
+                        for first_name, last_name in new
+                    ],
+                    ignore_conflicts=True,
+                )
+                self.fetch_authors(new)
+                self.stats.authors_created += len(new)
+        return {name: self.authors[name] for name in names}
+
+    def fetch_authors(self, names: set[tuple[str, str]]) -> None:
+        # IN lists on both columns compile and plan much faster than an OR
+        # of pairs, the few extra authors they match are filtered here
+        authors = (
+            Author.objects.using(self.using)
+            .filter(
+                first_name__in={first_name for first_name, _ in names},
+                last_name__in={last_name for _, last_name in names},
+            )
+            .values_list("id", "first_name", "last_name")
+        )
+        for author_id, first_name, last_name in authors:
+            if (first_name, last_name) in names:
+                self.authors[(first_name, last_name)] = author_id
+
+    def create_books(self, books: dict) -> int:
+        """bulk_create the batch, returns how many books already existed"""
+        titles = {title for title, _, _ in books}
+        author_ids = {author_id for _, author_id, _ in books}
+        existing = (
+            Book.objects.using(self.using)
+            .filter(title__in=titles, author_id__in=author_ids)
+            .values_list("title", "author_id", "cover")
+        )
+        existing = len(set(existing) & books.keys())
+
+        options = {"ignore_conflicts": True}
+        if self.update:
+            options = {
+                "update_conflicts": True,
+                "unique_fields": ("title", "author", "cover"),
+                "update_fields": ("inventory", "daily_fee", "updated_at"),
+            }
+        Book.objects.using(self.using).bulk_create(
+            [
+                Book(
+                    author_id=author_id,
+                    **{name: row[name] for name in BOOK_FIELDS},
+                )
+                for (_, author_id, _), row in books.items()
+            ],
+            batch_size=self.batch_size,
+            **options,
+        )
+        return existing
+
+    def copy_books(self, books: dict) -> int:
+        """
+        COPY the batch into a staging table and insert it from there with
+        search vectors computed in the same statement, so the new rows are
+        not rewritten by a later UPDATE. Returns how many books already
+        existed.
+        """
+        now = timezone.now().isoformat()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for (title, author_id, cover), row in books.items():
+            writer.writerow(
+                (
+                    title,
+                    author_id,
+                    cover,
+                    row["inventory"],
+                    row["daily_fee"],
+                    now,
+                    now,
+                )
+            )
+        buffer.seek(0)
+
+        connection = connections[self.using]
+        qn = connection.ops.quote_name
+        table = qn(Book._meta.db_table)
+        columns = (
+            "title, author_id, cover, inventory, daily_fee, "
+            "created_at, updated_at"
+        )
+        conflict = "DO NOTHING"
+        if self.update:
+            conflict = (
+                "DO UPDATE SET inventory = EXCLUDED.inventory, "
+                "daily_fee = EXCLUDED.daily_fee, "
+                "updated_at = EXCLUDED.updated_at"
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS catalog_import "
+                f"ON COMMIT DELETE ROWS AS SELECT {columns} FROM {table} "
+                "WITH NO DATA"
+            )
+            # rows stay until commit, which an outer transaction may delay
+            cursor.execute("TRUNCATE catalog_import")
+            cursor.copy_expert(
+                f"COPY catalog_import ({columns}) FROM STDIN WITH CSV",
+                buffer,
+            )
+            existing = None
+            if self.update:
+                cursor.execute(
+                    f"SELECT count(*) FROM catalog_import JOIN {table} "
+                    "USING (title, author_id, cover)"
+                )
+                existing = cursor.fetchone()[0]
+            staged = ", ".join(
+                f"catalog_import.{column}" for column in columns.split(", ")
+            )
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}, search_vector) "
+                f"SELECT {staged}, "
+                "setweight(to_tsvector(%s::regconfig, catalog_import.title),"
+                " 'A') || setweight(to_tsvector(%s::regconfig, "
+                "author.first_name || ' ' || author.last_name), 'B') "
+                f"FROM catalog_import JOIN {qn(Author._meta.db_table)} "
+                "author ON author.id = catalog_import.author_id "
+                f"ON CONFLICT (title, author_id, cover) {conflict}",
+                [settings.BOOK_SEARCH_CONFIG] * 2,
+            )
+            if existing is None:
+                existing = len(books) - cursor.rowcount
+        return existing
+
+    def finish(self) -> None:
+        """Refresh what the Book.save() signals would have maintained"""
+        author_ids = sorted(self.author_ids)
+        for offset in range(0, len(author_ids), self.batch_size):
+            chunk = author_ids[offset:offset + self.batch_size]
+            Author.recount_books(chunk)
+            fill_search_vectors(
+                Book.objects.using(self.using).filter(author_id__in=chunk)
+            )
+        if author_ids:
+            invalidate_catalog_cache("books", everything=True)
+            invalidate_catalog_cache("authors", everything=True)
+            invalidate_catalog_cache("feed", everything=True)
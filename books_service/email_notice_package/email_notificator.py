@@ -1,21 +1,49 @@
-from datetime import datetime
+import hashlib
+import json
+from datetime import date, datetime
+from typing import Optional
 
 import django
 from django.conf import settings  # noqa: E402
-from templated_email import send_templated_mail
+from django.core.mail import EmailMessage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import translation
+from templated_email import get_templated_mail, send_templated_mail
+
+
+DATE_CONTEXT_KEYS = ("date_joined", "date_subscription")
 
 
 class EmailNotificator:
+    @staticmethod
+    def sign_up_context(user_email: str) -> dict:
+        return {
+            "email": user_email,
+            "date_joined": datetime.now().date(),
+        }
+
+    @staticmethod
+    def subscription_context(
+        user_email: str,
+        author_full_name: str,
+        date_subscription: date,
+        status: bool,
+    ) -> dict:
+        return {
+            "email": user_email,
+            "date_subscription": date_subscription,
+            "author_full_name": author_full_name,
+            "status": status,
+        }
+
     @staticmethod
     def send_sing_up_email(user_email: str) -> None:
         send_templated_mail(
             template_name="sign-up",
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user_email],
-            context={
-                "email": user_email,
-                "date_joined": datetime.now().date(),
-            },
+            context=EmailNotificator.sign_up_context(user_email),
         )
 
     @staticmethod
@@ -29,10 +57,98 @@ class EmailNotificator:
             template_name="subscribe-manage",
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user_email],
-            context={
-                "email": user_email,
-                "date_subscription": date_subscription,
-                "author_full_name": author_full_name,
-                "status": status,
-            },
+            context=EmailNotificator.subscription_context(
+                user_email, author_full_name, date_subscription, status
+            ),
+        )
+
+    @staticmethod
+    def queue_email(
+        template_name: str, user_email: str, context: dict
+    ) -> None:
+        """
+        Store the email in the outbox within the current transaction and
+        wake the outbox worker once it commits. An identical email still
+        pending is not queued again.
+        """
+        from books_service.models import EmailOutbox
+        from books_service.tasks import send_outbox_emails
+
+        payload = json.dumps(
+            [template_name, user_email, context],
+            sort_keys=True,
+            cls=DjangoJSONEncoder,
+        )
+        EmailOutbox.objects.bulk_create(
+            [
+                EmailOutbox(
+                    template_name=template_name,
+                    recipient=user_email,
+                    context=context,
+                    dedup_key=hashlib.sha256(payload.encode()).hexdigest(),
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        transaction.on_commit(send_outbox_emails.delay)
+
+    @staticmethod
+    def queue_sign_up_email(user_email: str) -> None:
+        EmailNotificator.queue_email(
+            "sign-up", user_email, EmailNotificator.sign_up_context(user_email)
         )
+
+    @staticmethod
+    def queue_subscription_email(
+        user_email: str,
+        author_full_name: str,
+        date_subscription: Optional[date] = None,
+        status: bool = True,
+    ) -> None:
+        EmailNotificator.queue_email(
+            "subscribe-manage",
+            user_email,
+            EmailNotificator.subscription_context(
+                user_email,
+                author_full_name,
+                date_subscription or datetime.now().date(),
+                status,
+            ),
+        )
+
+    @staticmethod
+    def build_email(
+        template_name: str, user_email: str, context: dict
+    ) -> EmailMessage:
+        """Render a queued email, dates come back from JSON as strings"""
+        context = {
+            key: date.fromisoformat(value)
+            if key in DATE_CONTEXT_KEYS and isinstance(value, str)
+            else value
+            for key, value in context.items()
+        }
+        return get_templated_mail(
+            template_name=template_name,
+            context=context,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[user_email],
+        )
+
+    @staticmethod
+    def build_new_book_email(book) -> EmailMessage:
+        """
+        Render the new book announcement once, without recipients: the
+        same message is sent to every subscriber of the author
+        """
+        with translation.override(settings.LANGUAGE_CODE):
+            return get_templated_mail(
+                template_name="new-book",
+                context={
+                    "title": book.title,
+                    "author_full_name": book.author.full_name,
+                    "cover": book.get_cover_display(),
+                    "daily_fee": book.daily_fee,
+                },
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[],
+            )
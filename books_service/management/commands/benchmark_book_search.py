@@ -0,0 +1,74 @@
+import math
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db.models import Q, QuerySet
+
+from books_service.models import Book
+from books_service.search import is_full_text_search_supported, search_books
+
+
+PAGE_SIZE = 25
+
+
+def icontains_books(queryset: QuerySet, term: str) -> QuerySet:
+    return queryset.filter(
+        Q(title__icontains=term)
+        | Q(author__first_name__icontains=term)
+        | Q(author__last_name__icontains=term)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the icontains filters of the book list "
+        "with the ?q= full-text search on the current database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "terms",
+            nargs="*",
+            help="Search terms, by default words of random book titles",
+        )
+        parser.add_argument("--samples", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        if not is_full_text_search_supported():
+            self.stdout.write(
+                "Full-text search requires PostgreSQL, "
+                "search falls back to icontains"
+            )
+
+        terms = options["terms"] or self.sample_terms(options["samples"])
+        queryset = Book.objects.select_related("author")
+
+        for name, search in (
+            ("icontains", icontains_books),
+            ("full-text", search_books),
+        ):
+            timings = []
+            found = 0
+            for term in terms:
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    books = search(queryset, term)
+                    found = books.count()
+                    list(books[:PAGE_SIZE])
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{name:>10}: {len(terms)} terms, "
+                f"mean {statistics.mean(timings):.2f} ms, "
+                f"p95 {timings[math.ceil(len(timings) * 0.95) - 1]:.2f} ms, "
+                f"last term found {found} books"
+            )
+
+    @staticmethod
+    def sample_terms(count: int) -> list[str]:
+        titles = Book.objects.order_by("?").values_list(
+            "title", flat=True
+        )[:count]
+        return [max(title.split(), key=len) for title in titles]
@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from books_service.cache import get_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the books and authors response cache"
+
+    def handle(self, *args, **options):
+        for namespace, stats in get_cache_stats().items():
+            total = stats["hits"] + stats["misses"]
+            ratio = stats["hits"] / total if total else 0
+            self.stdout.write(
+                f"{namespace}: {stats['hits']} hits, "
+                f"{stats['misses']} misses, hit ratio {ratio:.1%}"
+            )
@@ -0,0 +1,45 @@
+import sys
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from books_service.catalog import (
+    FORMATS,
+    export_rows,
+    format_from_path,
+    write_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream every book to a JSONL or CSV catalog "
+        "readable by import_catalog"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Catalog file, or - for stdout")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or format_from_path(path)
+        if file_format is None:
+            raise CommandError("Pass --format for files without extension")
+
+        start = time.perf_counter()
+        rows = export_rows(options["chunk_size"])
+        if path == "-":
+            write_rows(sys.stdout, file_format, rows)
+            return
+
+        with open(path, "w", encoding="utf-8", newline="") as stream:
+            written = write_rows(stream, file_format, rows)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Exported {written} books to {path} in {elapsed:.1f} s "
+                f"({written / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
@@ -0,0 +1,78 @@
+import sys
+
+from django.core.management import BaseCommand, CommandError
+
+from books_service.catalog import (
+    FORMATS,
+    CatalogImporter,
+    format_from_path,
+    read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load books from a JSONL or CSV catalog (title, author_first_name, "
+        "author_last_name, cover, inventory, daily_fee) in batches. "
+        "Imported books do not notify author subscribers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Catalog file, or - for stdin")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Update inventory and daily_fee of books already imported",
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Use bulk_create instead of COPY on PostgreSQL",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or format_from_path(path)
+        if file_format is None:
+            raise CommandError("Pass --format for files without extension")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        importer = CatalogImporter(
+            batch_size=options["batch_size"],
+            update=options["update"],
+            use_copy=False if options["no_copy"] else None,
+        )
+        stream = (
+            sys.stdin
+            if path == "-"
+            else open(path, encoding="utf-8", newline="")
+        )
+        try:
+            stats = importer.run(
+                read_rows(stream, file_format), progress=self.progress
+            )
+        except ValueError as error:
+            raise CommandError(f"Could not read {path}: {error}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in stats.errors:
+            self.stderr.write(error)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {stats.rows} rows in {stats.elapsed:.1f} s "
+                f"({stats.rows_per_second:.0f} rows/s): "
+                f"{stats.created} books created, {stats.updated} updated, "
+                f"{stats.skipped} skipped, {stats.invalid} invalid rows, "
+                f"{stats.authors_created} authors created"
+            )
+        )
+
+    def progress(self, stats):
+        self.stdout.write(
+            f"{stats.rows} rows, {stats.rows_per_second:.0f} rows/s"
+        )
@@ -0,0 +1,44 @@
+from django.core.management import BaseCommand
+from django.db.models import Count, F
+
+from books_service.models import Author
+
+
+class Command(BaseCommand):
+    help = "Recalculate the denormalized Author.books_count"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report authors with a wrong books_count",
+        )
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            mismatched = (
+                Author.objects.annotate(actual_books_count=Count("books"))
+                .exclude(books_count=F("actual_books_count"))
+                .values_list("id", "books_count", "actual_books_count")
+            )
+            for author_id, stored, actual in mismatched:
+                self.stdout.write(
+                    f"Author {author_id}: books_count {stored}, "
+                    f"actual {actual}"
+                )
+            if mismatched:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{len(mismatched)} authors have a wrong books_count"
+                    )
+                )
+            else:
+                self.stdout.write(self.style.SUCCESS("books_count is valid"))
+            return
+
+        updated = Author.recount_books()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recalculated books_count of {updated} authors"
+            )
+        )
@@ -0,0 +1,40 @@
+from django.core.management import BaseCommand
+
+from books_service.models import Author
+from books_service.search import (
+    is_full_text_search_supported,
+    update_search_vectors,
+)
+
+
+class Command(BaseCommand):
+    help = "Fill search_vector of books used by the ?q= book search"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild every book, not only books without search_vector",
+        )
+
+    def handle(self, *args, **options):
+        if not is_full_text_search_supported():
+            self.stdout.write("Full-text search requires PostgreSQL")
+            return
+
+        authors = Author.objects.all()
+        if not options["all"]:
+            authors = authors.filter(
+                books__search_vector__isnull=True
+            ).distinct()
+
+        updated = 0
+        for author in authors.iterator():
+            books = author.books.all()
+            if not options["all"]:
+                books = books.filter(search_vector__isnull=True)
+            updated += update_search_vectors(author, books)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated search vector of {updated} books")
+        )
@@ -1,18 +1,58 @@
 import time
-from django.db import connections
+
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
-from django.core.management import BaseCommand
+
+
+FIRST_DELAY = 0.1
 
 
 class Command(BaseCommand):
+    help = (
+        "Wait until the database accepts connections and answers "
+        "SELECT 1, retrying with exponential backoff"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=60,
+            help="Seconds to wait before giving up",
+        )
+        parser.add_argument(
+            "--max-delay",
+            type=float,
+            default=5,
+            help="Longest pause between two attempts, in seconds",
+        )
+
     def handle(self, *args, **options):
         self.stdout.write("Waiting for database...")
-        db_conn = None
-        while not db_conn:
+        connection = connections[options["database"]]
+        deadline = time.monotonic() + options["timeout"]
+        delay = FIRST_DELAY
+        while True:
             try:
-                db_conn = connections["default"]
-            except OperationalError:
-                self.stdout.write("Database unavailable, waititng 1 second...")
-                time.sleep(1)
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                break
+            except OperationalError as error:
+                connection.close()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f"Database unavailable after "
+                        f"{options['timeout']:g} seconds: {error}"
+                    )
+                pause = min(delay, remaining)
+                self.stdout.write(
+                    f"Database unavailable, waiting {pause:.1f} seconds..."
+                )
+                time.sleep(pause)
+                delay = min(delay * 2, options["max_delay"])
 
+        connection.close()
         self.stdout.write(self.style.SUCCESS("Database available!"))
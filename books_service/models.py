@@ -1,12 +1,20 @@
+import datetime
 import os
 import uuid
+from django.utils import timezone
 from django.utils.text import slugify
-from typing import Union
+from typing import Iterable, Optional, Union
 
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, router, transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 from django.conf import settings
 
+from books_service.cache import invalidate_catalog_cache
+
 
 def image_file_path(instance: Union["Book", "Author"], filename: str) -> str:
     _, extension = os.path.splitext(filename)
@@ -32,15 +40,52 @@ class Author(models.Model):
         through="Subscription",
         related_name="subscribed",
     )
+    books_count = models.PositiveIntegerField(
+        default=0, editable=False, db_index=True
+    )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ("first_name", "last_name")
         ordering = ["last_name", "first_name"]
+        indexes = [
+            models.Index(
+                fields=["last_name", "first_name", "id"],
+                name="author_name_keyset_idx",
+            ),
+        ]
 
     @property
     def full_name(self) -> str:
         return str(self)
 
+    @staticmethod
+    def change_books_count(author_id: int, delta: int) -> None:
+        authors = Author.objects.filter(pk=author_id)
+        if delta < 0:
+            authors = authors.filter(books_count__gte=-delta)
+        authors.update(
+            books_count=models.F("books_count") + delta,
+            updated_at=timezone.now(),
+        )
+
+    @staticmethod
+    def recount_books(author_ids: Optional[Iterable[int]] = None) -> int:
+        """Recalculate books_count of the given authors (all by default)"""
+        books_count = (
+            Book.objects.filter(author=models.OuterRef("pk"))
+            .order_by()
+            .values("author")
+            .annotate(count=models.Count("id"))
+            .values("count")
+        )
+        authors = Author.objects.all()
+        if author_ids is not None:
+            authors = authors.filter(pk__in=author_ids)
+        return authors.update(
+            books_count=Coalesce(models.Subquery(books_count), 0)
+        )
+
     def __str__(self) -> str:
         return f"{self.first_name} {self.last_name}"
 
@@ -52,6 +97,20 @@ class Subscription(models.Model):
     )
     subscription_started = models.DateField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["author", "user"],
+                name="subscription_author_user_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"],
+                name="subscription_user_author_unique",
+            ),
+        ]
+
     def __str__(self) -> str:
         return (
             f"{self.user} subscribed to "
@@ -59,6 +118,65 @@ class Subscription(models.Model):
             f"{self.subscription_started}"
         )
 
+    @staticmethod
+    def _execute_returning(sql: str, params: list) -> list[tuple]:
+        with connections[router.db_for_write(Subscription)].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    @staticmethod
+    def subscribe(user_id: int, author_ids: Iterable[int]) -> list[int]:
+        """
+        Subscribe the user to the existing authors among `author_ids` in
+        one INSERT ... ON CONFLICT DO NOTHING. Returns the ids of authors
+        newly subscribed to, existing subscriptions are left as they are.
+        """
+        author_ids = list(author_ids)
+        if not author_ids:
+            return []
+        qn = connections[router.db_for_write(Subscription)].ops.quote_name
+        placeholders = ", ".join(["%s"] * len(author_ids))
+        rows = Subscription._execute_returning(
+            f"INSERT INTO {qn(Subscription._meta.db_table)} "
+            f"(user_id, author_id, subscription_started) "
+            f"SELECT %s, id, %s FROM {qn(Author._meta.db_table)} "
+            f"WHERE id IN ({placeholders}) "
+            f"ON CONFLICT (user_id, author_id) DO NOTHING "
+            f"RETURNING author_id",
+            [user_id, timezone.now().date(), *author_ids],
+        )
+        if rows:
+            invalidate_catalog_cache("feed", user_id)
+        return [author_id for author_id, in rows]
+
+    @staticmethod
+    def unsubscribe(
+        user_id: int, author_ids: Iterable[int]
+    ) -> dict[int, datetime.date]:
+        """
+        Delete the user's subscriptions to `author_ids` in one statement.
+        Returns {author id: subscription start} of the deleted ones.
+        """
+        author_ids = list(author_ids)
+        if not author_ids:
+            return {}
+        qn = connections[router.db_for_write(Subscription)].ops.quote_name
+        placeholders = ", ".join(["%s"] * len(author_ids))
+        rows = Subscription._execute_returning(
+            f"DELETE FROM {qn(Subscription._meta.db_table)} "
+            f"WHERE user_id = %s AND author_id IN ({placeholders}) "
+            f"RETURNING author_id, subscription_started",
+            [user_id, *author_ids],
+        )
+        if rows:
+            invalidate_catalog_cache("feed", user_id)
+        return {
+            author_id: started
+            if isinstance(started, datetime.date)
+            else datetime.date.fromisoformat(started)
+            for author_id, started in rows
+        }
+
 
 class Book(models.Model):
     COVER_CHOICES = (
@@ -78,10 +196,23 @@ class Book(models.Model):
     cover = models.CharField(max_length=4, choices=COVER_CHOICES)
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=6, decimal_places=2)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("title", "author", "cover")
         ordering = ["title"]
+        indexes = [
+            models.Index(fields=["title", "id"], name="book_title_keyset_idx"),
+            models.Index(
+                fields=["created_at", "id"], name="book_created_keyset_idx"
+            ),
+            models.Index(
+                fields=["author", "created_at", "id"],
+                name="book_author_created_idx",
+            ),
+        ]
 
     @staticmethod
     def validate_inventory_field(
@@ -92,12 +223,81 @@ class Book(models.Model):
                 {"inventory": ["Inventory cannot be negative"]}
             )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_author_id = instance.__dict__.get("author_id")
+        return instance
+
+    @staticmethod
+    def change_inventory(book_id: int, delta: int) -> bool:
+        """
+        Change inventory with a single conditional UPDATE, so concurrent
+        borrowings can neither oversell nor lose updates.
+        Returns False when there are not enough copies in stock.
+        """
+        books = Book.objects.filter(pk=book_id)
+        if delta < 0:
+            books = books.filter(inventory__gte=-delta)
+        updated = books.update(
+            inventory=models.F("inventory") + delta,
+            updated_at=timezone.now(),
+        )
+        if updated:
+            invalidate_catalog_cache("books", book_id)
+        return bool(updated)
+
     def clean(self):
         self.validate_inventory_field(self.inventory, ValidationError)
 
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return f"'{self.title}' written by {self.author}"
+
+
+class EmailOutbox(models.Model):
+    """
+    Templated email waiting to be sent by send_outbox_emails. A pending
+    email with the same dedup_key is never queued twice.
+    """
+
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    )
+    template_name = models.CharField(max_length=63)
+    recipient = models.EmailField()
+    context = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    dedup_key = models.CharField(max_length=64)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default="pending"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("id",)
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"],
+                name="email_outbox_due_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=Q(status="pending"),
+                name="email_outbox_pending_dedup",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.template_name} to {self.recipient} ({self.status})"
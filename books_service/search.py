@@ -0,0 +1,141 @@
+import logging
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F, OuterRef, Q, QuerySet, Subquery, Value
+from django.db.models.functions import Concat
+
+from books_service.models import Author, Book
+
+
+SEARCH_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS books_service_book_search_gin "
+    "ON books_service_book USING gin (search_vector)"
+)
+# needs a role allowed to create extensions and the contrib modules
+TRIGRAM_INDEX_SQL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS books_service_book_title_trgm "
+    "ON books_service_book USING gin (title gin_trgm_ops)",
+)
+
+logger = logging.getLogger("books_service")
+
+_trigram_support: dict[str, bool] = {}
+
+
+def is_full_text_search_supported() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def is_trigram_search_supported() -> bool:
+    """Whether pg_trgm is installed, checked once per database alias"""
+    if not is_full_text_search_supported():
+        return False
+
+    if connection.alias not in _trigram_support:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+            )
+            _trigram_support[connection.alias] = cursor.fetchone() is not None
+    return _trigram_support[connection.alias]
+
+
+def install_search_indexes(using: str) -> None:
+    """
+    Create the GIN indexes of book search. Without pg_trgm, for a role
+    that may not create extensions, search keeps to full-text matches.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(SEARCH_INDEX_SQL)
+        try:
+            with transaction.atomic(using=using):
+                for statement in TRIGRAM_INDEX_SQL:
+                    cursor.execute(statement)
+        except DatabaseError as error:
+            logger.warning(
+                f"Trigram search unavailable, book search matches full "
+                f"words only: {error}"
+            )
+    _trigram_support.pop(using, None)
+
+
+def book_search_vector(author: Author) -> SearchVector:
+    """Title is weighted above author name, so title matches rank higher"""
+    config = settings.BOOK_SEARCH_CONFIG
+    return SearchVector("title", weight="A", config=config) + SearchVector(
+        Value(author.full_name), weight="B", config=config
+    )
+
+
+def update_search_vectors(author: Author, books: QuerySet = None) -> int:
+    """Refresh search_vector of given books (all author's books by default)"""
+    if not is_full_text_search_supported():
+        return 0
+
+    if books is None:
+        books = Book.objects.filter(author=author)
+
+    return books.update(search_vector=book_search_vector(author))
+
+
+def fill_search_vectors(books: QuerySet) -> int:
+    """
+    Fill the missing search_vector of given books with one UPDATE,
+    reading the author name through a subquery
+    """
+    if not is_full_text_search_supported():
+        return 0
+
+    config = settings.BOOK_SEARCH_CONFIG
+    author_name = Author.objects.filter(pk=OuterRef("author_id")).values(
+        full_name=Concat("first_name", Value(" "), "last_name")
+    )
+    return books.filter(search_vector__isnull=True).update(
+        search_vector=SearchVector("title", weight="A", config=config)
+        + SearchVector(Subquery(author_name), weight="B", config=config)
+    )
+
+
+def search_books(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Rank books by full-text match on title and author name, with trigram
+    word similarity on title as a fallback for partial words and typos.
+    Falls back to icontains lookups on databases without full-text search,
+    and to full-text matches only without pg_trgm.
+    """
+    if not is_full_text_search_supported():
+        return queryset.filter(
+            Q(title__icontains=query)
+            | Q(author__first_name__icontains=query)
+            | Q(author__last_name__icontains=query)
+        )
+
+    search_query = SearchQuery(
+        query, search_type="websearch", config=settings.BOOK_SEARCH_CONFIG
+    )
+    if not is_trigram_search_supported():
+        return (
+            queryset.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "title", "id")
+        )
+
+    return (
+        queryset.filter(
+            Q(search_vector=search_query)
+            | Q(title__trigram_word_similar=query)
+        )
+        .annotate(
+            rank=SearchRank(F("search_vector"), search_query),
+            similarity=TrigramWordSimilarity(query, "title"),
+        )
+        .order_by("-rank", "-similarity", "title", "id")
+    )
@@ -18,6 +18,14 @@ class AuthorSerializer(serializers.ModelSerializer):
         )
 
 
+class SubscriptionBulkSerializer(serializers.Serializer):
+    authors = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000,
+    )
+
+
 class BookSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
@@ -46,6 +54,21 @@ class BookListSerializer(BookSerializer):
         )
 
 
+class BookFeedSerializer(BookListSerializer):
+    class Meta:
+        model = Book
+        fields = (
+            "id",
+            "title",
+            "title_image",
+            "author",
+            "author_full_name",
+            "cover",
+            "created_at",
+            "book_link",
+        )
+
+
 class BookDetailSerializer(BookListSerializer):
     author_link = serializers.HyperlinkedRelatedField(
         source="author",
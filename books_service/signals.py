@@ -1,34 +1,130 @@
-from django.db.models.signals import m2m_changed, post_save
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
 from user.models import User
-from .models import Author, Subscription
+from .models import Author, Book, Subscription
+from books_service.cache import invalidate_catalog_cache
+from books_service.search import install_search_indexes, update_search_vectors
+from books_service.tasks import notify_new_book_subscribers
 from books_service.email_notice_package.email_notificator import (
     EmailNotificator,
 )
 
 
 @receiver(post_save, sender=User)
-def user_profile_created(sender, instance, created, **kwargs):
-    if created:
-        EmailNotificator.send_sing_up_email(instance.email)
+def user_profile_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        EmailNotificator.queue_sign_up_email(instance.email)
 
 
 @receiver(m2m_changed, sender=Author.subscribers.through)
-def send_subscription_notification(sender, instance, **kwargs):
-    author = Author.objects.get(pk=tuple(kwargs.get("pk_set"))[0])
-
+def send_subscription_notification(sender, instance, pk_set, **kwargs):
     if kwargs.get("action") == "post_add":
-        EmailNotificator.send_subscription_email(
-            user_email=instance.email, author_full_name=author.full_name
-        )
+        for author in Author.objects.filter(pk__in=pk_set):
+            EmailNotificator.queue_subscription_email(
+                user_email=instance.email, author_full_name=author.full_name
+            )
     elif kwargs.get("action") == "pre_remove":
-        subscription_instance = Subscription.objects.get(
-            user=instance, author=author
-        )
-        EmailNotificator.send_subscription_email(
-            user_email=instance.email,
-            author_full_name=author.full_name,
-            status=False,
-            date_subscription=subscription_instance.subscription_started,
+        for subscription in Subscription.objects.filter(
+            user=instance, author_id__in=pk_set
+        ).select_related("author"):
+            EmailNotificator.queue_subscription_email(
+                user_email=instance.email,
+                author_full_name=subscription.author.full_name,
+                status=False,
+                date_subscription=subscription.subscription_started,
+            )
+
+
+@receiver(m2m_changed, sender=Author.subscribers.through)
+def invalidate_subscriber_feed(sender, instance, action, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not isinstance(instance, Author):
+        invalidate_catalog_cache("feed", instance.pk)
+    elif pk_set is None:
+        invalidate_catalog_cache("feed", everything=True)
+    else:
+        for user_id in pk_set:
+            invalidate_catalog_cache("feed", user_id)
+
+
+@receiver(post_save, sender=Book)
+def notify_subscribers_of_new_book(
+    sender, instance, created, raw=False, **kwargs
+):
+    if created and not raw:
+        transaction.on_commit(
+            lambda: notify_new_book_subscribers.delay(instance.pk)
         )
+
+
+@receiver(post_save, sender=Book)
+def update_book_search_vector(sender, instance, **kwargs):
+    update_search_vectors(
+        instance.author, Book.objects.filter(pk=instance.pk)
+    )
+
+
+@receiver(post_save, sender=Book)
+def update_author_books_count_on_save(
+    sender, instance, created, raw=False, **kwargs
+):
+    previous_author_id = getattr(instance, "_loaded_author_id", None)
+    instance._loaded_author_id = instance.author_id
+    if raw:
+        return
+
+    if created:
+        Author.change_books_count(instance.author_id, 1)
+        invalidate_catalog_cache("authors", instance.author_id)
+    elif previous_author_id and previous_author_id != instance.author_id:
+        Author.change_books_count(previous_author_id, -1)
+        Author.change_books_count(instance.author_id, 1)
+        invalidate_catalog_cache("authors", previous_author_id)
+        invalidate_catalog_cache("authors", instance.author_id)
+
+
+@receiver(post_delete, sender=Book)
+def update_author_books_count_on_delete(sender, instance, **kwargs):
+    Author.change_books_count(instance.author_id, -1)
+    invalidate_catalog_cache("authors", instance.author_id)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    invalidate_catalog_cache("books", instance.pk)
+    invalidate_catalog_cache("feed", everything=True)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_cache(
+    sender, instance, created=False, update_fields=None, **kwargs
+):
+    invalidate_catalog_cache("authors", instance.pk)
+    name_fields = {"first_name", "last_name"}
+    if created or (update_fields and not name_fields & set(update_fields)):
+        return
+    invalidate_catalog_cache("books", everything=True)
+    invalidate_catalog_cache("feed", everything=True)
+
+
+@receiver(post_save, sender=Author)
+def update_author_books_search_vector(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    name_fields = {"first_name", "last_name"}
+    if created or (update_fields and not name_fields & set(update_fields)):
+        return
+    update_search_vectors(instance)
+
+
+def create_search_indexes(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """GIN indexes for book search, created after migrations on PostgreSQL"""
+    if connections[using].vendor != "postgresql":
+        return
+
+    install_search_indexes(using)
@@ -0,0 +1,207 @@
+import copy
+import logging
+import time
+from smtplib import SMTPException
+
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from books_service.email_notice_package.email_notificator import (
+    EmailNotificator,
+)
+from books_service.models import Book, EmailOutbox, Subscription
+from library_project import metrics
+from tgbot.notificator import send_notification
+
+
+logger = logging.getLogger("books_service")
+
+SUBSCRIBERS_CHUNK_SIZE = 1000
+
+
+def record_failed_attempt(email: EmailOutbox, error: Exception) -> None:
+    """Retry the email with exponential backoff, or give up on it"""
+    email.last_error = str(error)
+    if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+        email.status = "failed"
+        logger.error(f"Gave up sending email {email.id}: {error}")
+    else:
+        email.next_attempt_at = timezone.now() + timezone.timedelta(
+            seconds=settings.EMAIL_RETRY_BACKOFF * 2 ** (email.attempts - 1)
+        )
+
+
+@shared_task
+def send_outbox_emails() -> int:
+    """
+    Send due outbox emails in batches, each batch over a single SMTP
+    connection. A failed email is retried with exponential backoff and
+    marked failed after EMAIL_MAX_ATTEMPTS. Returns the number sent.
+
+    A batch is claimed in a short transaction that counts the attempt and
+    hides it from other workers for EMAIL_CLAIM_TIMEOUT, so no row lock is
+    held while talking to the SMTP server. When the connection cannot be
+    opened, the whole batch backs off.
+    """
+    sent = 0
+    while True:
+        with transaction.atomic():
+            emails = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status="pending", next_attempt_at__lte=timezone.now())
+                .order_by("id")[: settings.EMAIL_BATCH_SIZE]
+            )
+            if not emails:
+                break
+
+            claimed_until = timezone.now() + timezone.timedelta(
+                seconds=settings.EMAIL_CLAIM_TIMEOUT
+            )
+            for email in emails:
+                email.attempts += 1
+                email.next_attempt_at = claimed_until
+            EmailOutbox.objects.bulk_update(
+                emails, ["attempts", "next_attempt_at"]
+            )
+
+        try:
+            connection = get_connection()
+            connection.open()
+        except Exception as error:
+            logger.error(f"Could not connect to the SMTP server: {error}")
+            for email in emails:
+                record_failed_attempt(email, error)
+        else:
+            with connection:
+                for email in emails:
+                    try:
+                        message = EmailNotificator.build_email(
+                            email.template_name, email.recipient, email.context
+                        )
+                        message.connection = connection
+                        message.send()
+                    except Exception as error:
+                        record_failed_attempt(email, error)
+                    else:
+                        email.status = "sent"
+                        email.sent_at = timezone.now()
+
+        EmailOutbox.objects.bulk_update(
+            emails, ["status", "last_error", "next_attempt_at", "sent_at"]
+        )
+
+        batch_sent = sum(email.status == "sent" for email in emails)
+        sent += batch_sent
+        metrics.increment("emails:sent", batch_sent)
+        metrics.increment("emails:failed_attempts", len(emails) - batch_sent)
+        if len(emails) < settings.EMAIL_BATCH_SIZE:
+            break
+    return sent
+
+
+@shared_task
+def notify_new_book_subscribers(book_id: int) -> int:
+    """
+    Walk the subscribers of the book's author in keyset chunks ordered by
+    user id and hand every chunk to its own send_new_book_chunk task, so
+    authors with many subscribers are served by all workers in parallel.
+    Returns the number of chunks queued.
+    """
+    book = Book.objects.filter(pk=book_id).values("author_id").first()
+    if book is None:
+        return 0
+
+    chunks = 0
+    last_user_id = 0
+    while True:
+        rows = list(
+            Subscription.objects.filter(
+                author_id=book["author_id"], user_id__gt=last_user_id
+            )
+            .order_by("user_id")
+            .values_list("user_id", "user__email", "user__telegram_id")[
+                :SUBSCRIBERS_CHUNK_SIZE
+            ]
+        )
+        if not rows:
+            break
+        send_new_book_chunk.delay(
+            book_id,
+            [email for _, email, _ in rows],
+            [chat_id for _, _, chat_id in rows if chat_id is not None],
+        )
+        chunks += 1
+        last_user_id = rows[-1][0]
+
+    logger.info(f"Queued {chunks} subscriber chunks for new book {book_id}")
+    return chunks
+
+
+@shared_task(bind=True, max_retries=3)
+def send_new_book_chunk(
+    self, book_id: int, emails: list[str], telegram_ids: list[int]
+) -> None:
+    """
+    Announce a new book to a chunk of subscribers: the email is rendered
+    once and sent to everyone over one SMTP connection, then subscribers
+    with a linked Telegram account get a message as well.
+
+    Users have no language preference, so the email is rendered in
+    LANGUAGE_CODE only. Retries get only the emails that were not sent
+    yet, or the Telegram chats that failed, so nobody is notified twice.
+    """
+    book = Book.objects.select_related("author").filter(pk=book_id).first()
+    if book is None:
+        return
+
+    start = time.perf_counter()
+    countdown = 60 * 2**self.request.retries
+    sent = 0
+    if emails:
+        template = EmailNotificator.build_new_book_email(book)
+        try:
+            with get_connection() as connection:
+                for email in emails:
+                    message = copy.copy(template)
+                    message.to = [email]
+                    connection.send_messages([message])
+                    sent += 1
+        except (SMTPException, OSError) as error:
+            metrics.increment("new_book:emails_sent", sent)
+            raise self.retry(
+                args=(book_id, emails[sent:], telegram_ids),
+                exc=error,
+                countdown=countdown,
+            )
+
+    failed_chats = []
+    if telegram_ids:
+        failed_chats = send_notification(
+            f"New book by {book.author.full_name}: '{book.title}'",
+            telegram_ids,
+        )
+
+    elapsed = time.perf_counter() - start
+    telegram_sent = len(telegram_ids) - len(failed_chats)
+    metrics.increment("new_book:chunks")
+    metrics.increment("new_book:emails_sent", sent)
+    metrics.increment("new_book:telegram_sent", telegram_sent)
+    metrics.increment("new_book:telegram_failed", len(failed_chats))
+    metrics.increment("new_book:elapsed_ms", int(elapsed * 1000))
+    logger.info(
+        f"Announced book {book_id} to {sent} emails and {telegram_sent} "
+        f"Telegram chats in {elapsed:.2f}s "
+        f"({(sent + telegram_sent) / max(elapsed, 1e-6):.0f} per second)"
+    )
+
+    if failed_chats:
+        if self.request.retries >= self.max_retries:
+            logger.warning(
+                f"Gave up announcing book {book_id} to "
+                f"{len(failed_chats)} Telegram chats"
+            )
+            return
+        raise self.retry(args=(book_id, [], failed_chats), countdown=countdown)
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from books_service.models import Author, Book
+from books_service.search import is_full_text_search_supported
+
+
+ROWS = [
+    {
+        "title": "First",
+        "author_first_name": "John",
+        "author_last_name": "Doe",
+        "cover": "hard",
+        "inventory": 3,
+        "daily_fee": "1.50",
+    },
+    {
+        "title": "Second",
+        "author_first_name": "Jane",
+        "author_last_name": "Roe",
+        "cover": "soft",
+        "inventory": "0",
+        "daily_fee": 2,
+    },
+    {
+        "title": "Broken",
+        "author_first_name": "John",
+        "author_last_name": "Doe",
+        "cover": "paper",
+        "inventory": -1,
+        "daily_fee": "1.50",
+    },
+]
+
+
+class CatalogCommandsTests(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.author = Author.objects.create(first_name="John", last_name="Doe")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def write_jsonl(self, rows: list[dict]) -> str:
+        path = self.path("catalog.jsonl")
+        with open(path, "w") as stream:
+            for row in rows:
+                stream.write(json.dumps(row) + "\n")
+        return path
+
+    def import_catalog(self, path: str, *args) -> tuple[str, str]:
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "import_catalog",
+            path,
+            "--batch-size=2",
+            *args,
+            stdout=stdout,
+            stderr=stderr,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_resolves_authors_and_skips_invalid_rows(self) -> None:
+        output, errors = self.import_catalog(self.write_jsonl(ROWS))
+
+        self.assertIn("2 books created", output)
+        self.assertIn("1 invalid rows", output)
+        self.assertIn("1 authors created", output)
+        self.assertIn("Row 3", errors)
+        self.assertIn("cover", errors)
+        self.assertEqual(
+            Book.objects.get(title="First").author_id, self.author.id
+        )
+        self.assertEqual(Author.objects.count(), 2)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.books_count, 1)
+        if is_full_text_search_supported():
+            self.assertFalse(
+                Book.objects.filter(search_vector__isnull=True).exists()
+            )
+
+    def test_reimport_skips_or_updates_existing_books(self) -> None:
+        path = self.write_jsonl(ROWS[:2])
+        self.import_catalog(path)
+
+        output, _ = self.import_catalog(path)
+        self.assertIn("0 books created", output)
+        self.assertIn("2 skipped", output)
+
+        path = self.write_jsonl([{**ROWS[0], "inventory": 10}])
+        output, _ = self.import_catalog(path, "--update")
+        self.assertIn("1 updated", output)
+        self.assertEqual(Book.objects.get(title="First").inventory, 10)
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_export_import_round_trip(self) -> None:
+        self.import_catalog(self.write_jsonl(ROWS[:2]))
+        path = self.path("catalog.csv")
+        call_command("export_catalog", path, stdout=StringIO())
+        Book.objects.all().delete()
+
+        output, _ = self.import_catalog(path)
+
+        self.assertIn("2 books created", output)
+        self.assertEqual(
+            list(
+                Book.objects.order_by("title").values_list(
+                    "title", "author__last_name", "inventory"
+                )
+            ),
+            [("First", "Doe", 3), ("Second", "Roe", 0)],
+        )
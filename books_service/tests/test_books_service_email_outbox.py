@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from books_service.email_notice_package.email_notificator import (
+    EmailNotificator,
+)
+from books_service.models import Author, EmailOutbox
+from books_service.tasks import send_outbox_emails
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    DEFAULT_FROM_EMAIL="from@example.com",
+)
+@mock.patch("books_service.tasks.send_outbox_emails.delay")
+class EmailOutboxTest(TestCase):
+    def test_sign_up_email_queued_after_commit(self, mock_delay) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            get_user_model().objects.create_user(
+                email="user@example.com", password="password"
+            )
+
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.template_name, "sign-up")
+        self.assertEqual(email.recipient, "user@example.com")
+        mock_delay.assert_called_once()
+        self.assertEqual(mail.outbox, [])
+
+    def test_pending_duplicate_not_queued(self, mock_delay) -> None:
+        for _ in range(2):
+            EmailNotificator.queue_subscription_email(
+                "user@example.com", "John Doe"
+            )
+
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_outbox_sent_in_one_batch(self, mock_delay) -> None:
+        user = get_user_model().objects.create_user(
+            email="user@example.com", password="password"
+        )
+        authors = [
+            Author.objects.create(first_name="Test", last_name=str(index))
+            for index in range(3)
+        ]
+        user.subscribed.add(*authors)
+        self.assertEqual(EmailOutbox.objects.count(), 4)
+
+        with mock.patch(
+            "books_service.tasks.get_connection", wraps=mail.get_connection
+        ) as mock_connection:
+            self.assertEqual(send_outbox_emails(), 4)
+
+        mock_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertFalse(
+            EmailOutbox.objects.exclude(status="sent").exists()
+        )
+
+    def test_failed_email_retried_later(self, mock_delay) -> None:
+        get_user_model().objects.create_user(
+            email="user@example.com", password="password"
+        )
+
+        with mock.patch(
+            "django.core.mail.EmailMessage.send",
+            side_effect=ConnectionError("SMTP down"),
+        ):
+            self.assertEqual(send_outbox_emails(), 0)
+
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, "pending")
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(send_outbox_emails(), 0)
+
+    def test_whole_batch_backs_off_when_smtp_unreachable(
+        self, mock_delay
+    ) -> None:
+        for index in range(2):
+            get_user_model().objects.create_user(
+                email=f"user{index}@example.com", password="password"
+            )
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.open",
+            side_effect=OSError("Connection refused"),
+        ) as mock_open:
+            self.assertEqual(send_outbox_emails(), 0)
+            self.assertEqual(send_outbox_emails(), 0)
+
+        mock_open.assert_called_once()
+        for email in EmailOutbox.objects.all():
+            self.assertEqual(email.status, "pending")
+            self.assertEqual(email.attempts, 1)
+            self.assertEqual(email.last_error, "Connection refused")
+            self.assertGreater(email.next_attempt_at, timezone.now())
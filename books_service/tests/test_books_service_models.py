@@ -66,3 +66,30 @@ class BookModelTest(TestCase):
                 inventory=-5,
                 daily_fee=10.00,
             )
+
+    def test_books_count_follows_book_changes(self) -> None:
+        other_author = Author.objects.create(
+            first_name="Jane",
+            last_name="Austen",
+        )
+        book = Book.objects.create(
+            title="Test Book",
+            author=self.author,
+            cover="hard",
+            inventory=5,
+            daily_fee=10.00,
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.books_count, 1)
+
+        book = Book.objects.get(pk=book.pk)
+        book.author = other_author
+        book.save()
+        self.author.refresh_from_db()
+        other_author.refresh_from_db()
+        self.assertEqual(self.author.books_count, 0)
+        self.assertEqual(other_author.books_count, 1)
+
+        book.delete()
+        other_author.refresh_from_db()
+        self.assertEqual(other_author.books_count, 0)
@@ -0,0 +1,137 @@
+from smtplib import SMTPException
+from unittest import mock
+
+from celery.exceptions import Retry
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.test import TestCase, override_settings
+
+from books_service.models import Author, Book
+from books_service.tasks import (
+    notify_new_book_subscribers,
+    send_new_book_chunk,
+)
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    DEFAULT_FROM_EMAIL="from@example.com",
+)
+@mock.patch("books_service.tasks.send_outbox_emails.delay")
+@mock.patch("books_service.tasks.send_notification", return_value=[])
+class NewBookFanOutTest(TestCase):
+    def setUp(self) -> None:
+        self.author = Author.objects.create(first_name="John", last_name="Doe")
+        for index in range(5):
+            user = get_user_model().objects.create_user(
+                email=f"user{index}@example.com",
+                password="password",
+                telegram_id=100 + index if index % 2 else None,
+            )
+            user.subscribed.add(self.author)
+        get_user_model().objects.create_user(
+            email="other@example.com", password="password"
+        )
+
+    @mock.patch("books_service.tasks.SUBSCRIBERS_CHUNK_SIZE", 2)
+    @mock.patch("books_service.tasks.send_new_book_chunk.delay")
+    def test_subscribers_split_into_keyset_chunks(
+        self, mock_chunk, mock_telegram, mock_outbox
+    ) -> None:
+        with mock.patch(
+            "books_service.signals.notify_new_book_subscribers.delay",
+            side_effect=notify_new_book_subscribers,
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                book = Book.objects.create(
+                    title="New Book",
+                    author=self.author,
+                    cover="hard",
+                    inventory=1,
+                    daily_fee=1.00,
+                )
+
+        self.assertEqual(mock_chunk.call_count, 3)
+        emails = [
+            email for call in mock_chunk.call_args_list for email in call[0][1]
+        ]
+        self.assertEqual(
+            emails, [f"user{index}@example.com" for index in range(5)]
+        )
+        self.assertEqual(mock_chunk.call_args_list[0][0][0], book.id)
+
+    def test_chunk_rendered_once_and_sent(
+        self, mock_telegram, mock_outbox
+    ) -> None:
+        book = Book.objects.create(
+            title="New Book",
+            author=self.author,
+            cover="hard",
+            inventory=1,
+            daily_fee=1.00,
+        )
+        emails = ["user0@example.com", "user1@example.com"]
+
+        with mock.patch(
+            "books_service.tasks.EmailNotificator.build_new_book_email",
+            wraps=lambda book: mail.EmailMessage(subject=book.title),
+        ) as mock_render:
+            send_new_book_chunk(book.id, emails, [101])
+
+        mock_render.assert_called_once()
+        self.assertEqual([message.to for message in mail.outbox], [
+            [email] for email in emails
+        ])
+        self.assertEqual(mock_telegram.call_args.args[1], [101])
+
+    def test_retry_skips_emails_already_sent(
+        self, mock_telegram, mock_outbox
+    ) -> None:
+        book = Book.objects.create(
+            title="New Book",
+            author=self.author,
+            cover="hard",
+            inventory=1,
+            daily_fee=1.00,
+        )
+        emails = [f"user{index}@example.com" for index in range(3)]
+
+        with mock.patch(
+            "books_service.tasks.get_connection"
+        ) as mock_connection, mock.patch.object(
+            send_new_book_chunk, "retry", side_effect=Retry()
+        ) as mock_retry:
+            connection = mock_connection.return_value.__enter__.return_value
+            connection.send_messages.side_effect = [1, SMTPException("down")]
+            with self.assertRaises(Retry):
+                send_new_book_chunk(book.id, emails, [101])
+
+        self.assertEqual(
+            mock_retry.call_args.kwargs["args"], (book.id, emails[1:], [101])
+        )
+        mock_telegram.assert_not_called()
+
+    def test_retry_only_failed_telegram_chats(
+        self, mock_telegram, mock_outbox
+    ) -> None:
+        book = Book.objects.create(
+            title="New Book",
+            author=self.author,
+            cover="hard",
+            inventory=1,
+            daily_fee=1.00,
+        )
+        mock_telegram.return_value = [103]
+
+        with mock.patch.object(
+            send_new_book_chunk, "retry", side_effect=Retry()
+        ) as mock_retry:
+            with self.assertRaises(Retry):
+                send_new_book_chunk(
+                    book.id, ["user0@example.com"], [101, 103]
+                )
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            mock_retry.call_args.kwargs["args"], (book.id, [], [103])
+        )
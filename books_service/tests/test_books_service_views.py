@@ -1,12 +1,17 @@
-from django.test import TestCase
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from django.db.models import Count
 
 
-from books_service.models import Author, Book
+from books_service.models import Author, Book, EmailOutbox, Subscription
+from books_service.search import install_search_indexes
+from library_project.pagination import KeysetPagination
 from books_service.serializers.common import (
     BookSerializer,
     AuthorSerializer,
@@ -14,6 +19,7 @@ from books_service.serializers.common import (
 
 AUTHOR_URL = reverse("books_service:authors-list")
 BOOK_URL = reverse("books_service:books-list")
+FEED_URL = reverse("books_service:feed-list")
 
 
 class AuthorViewSetTests(TestCase):
@@ -63,7 +69,7 @@ class AuthorViewSetTests(TestCase):
     def test_author_filter_by_books_count(self) -> None:
         response = self.client.get(AUTHOR_URL, {"books-count": 2})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        authors = Author.objects.annotate(books_count=Count("books")).filter(
+        authors = Author.objects.filter(
             books_count=2
         )
         serialized_authors = AuthorSerializer(authors, many=True)
@@ -72,7 +78,7 @@ class AuthorViewSetTests(TestCase):
     def test_author_filter_by_books_gt(self) -> None:
         response = self.client.get(AUTHOR_URL, {"books-gt": 5})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        authors = Author.objects.annotate(books_count=Count("books")).filter(
+        authors = Author.objects.filter(
             books_count__gt=5
         )
         serialized_authors = AuthorSerializer(authors, many=True)
@@ -81,7 +87,7 @@ class AuthorViewSetTests(TestCase):
     def test_author_filter_by_books_lt(self) -> None:
         response = self.client.get(AUTHOR_URL, {"books-lt": 3})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        authors = Author.objects.annotate(books_count=Count("books")).filter(
+        authors = Author.objects.filter(
             books_count__lt=3
         )
         serialized_authors = AuthorSerializer(authors, many=True)
@@ -90,7 +96,7 @@ class AuthorViewSetTests(TestCase):
     def test_author_filter_by_first_name(self) -> None:
         response = self.client.get(AUTHOR_URL, {"first-name": "John"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        authors = Author.objects.annotate(books_count=Count("books")).filter(
+        authors = Author.objects.filter(
             first_name__icontains="John"
         )
         serialized_authors = AuthorSerializer(authors, many=True)
@@ -99,7 +105,7 @@ class AuthorViewSetTests(TestCase):
     def test_author_filter_by_last_name(self) -> None:
         response = self.client.get(AUTHOR_URL, {"last-name": "Johnson"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        authors = Author.objects.annotate(books_count=Count("books")).filter(
+        authors = Author.objects.filter(
             last_name__icontains="Johnson"
         )
         serialized_authors = AuthorSerializer(authors, many=True)
@@ -108,7 +114,7 @@ class AuthorViewSetTests(TestCase):
     def test_author_filter_by_no_books(self) -> None:
         response = self.client.get(AUTHOR_URL, {"no-books": "true"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        authors = Author.objects.annotate(books_count=Count("books")).exclude(
+        authors = Author.objects.exclude(
             books_count__gt=0
         )
         serialized_authors = AuthorSerializer(authors, many=True)
@@ -117,13 +123,69 @@ class AuthorViewSetTests(TestCase):
     def test_author_filter_by_has_books(self) -> None:
         response = self.client.get(AUTHOR_URL, {"has-books": "true"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        authors = Author.objects.annotate(books_count=Count("books")).filter(
+        authors = Author.objects.filter(
             books_count__gt=0
         )
         serialized_authors = AuthorSerializer(authors, many=True)
         self.assertEqual(response.data["results"], serialized_authors.data)
 
 
+    def subscriber_client(self) -> APIClient:
+        client = APIClient()
+        client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="reader@gmail.com", password="testpassword"
+            )
+        )
+        return client
+
+    def test_subscribe_and_unsubscribe(self) -> None:
+        client = self.subscriber_client()
+        url = reverse(
+            "books_service:authors-manage-subscribe", args=[self.author1.id]
+        )
+
+        self.assertEqual(client.post(url).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            client.post(url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(
+            client.delete(url).status_code, status.HTTP_204_NO_CONTENT
+        )
+        self.assertEqual(
+            client.delete(url).status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(
+            EmailOutbox.objects.filter(
+                template_name="subscribe-manage"
+            ).count(),
+            2,
+        )
+
+    def test_bulk_subscribe_and_unsubscribe(self) -> None:
+        client = self.subscriber_client()
+        author2 = Author.objects.create(first_name="Jane", last_name="Doe")
+        url = reverse("books_service:authors-manage-subscriptions")
+        payload = {"authors": [self.author1.id, author2.id, 9999]}
+
+        response = client.post(url, payload, format="json")
+        self.assertEqual(
+            response.data["subscribed"], [self.author1.id, author2.id]
+        )
+        response = client.post(url, payload, format="json")
+        self.assertEqual(response.data["subscribed"], [])
+
+        response = client.delete(
+            url, {"authors": [self.author1.id]}, format="json"
+        )
+        self.assertEqual(response.data["unsubscribed"], [self.author1.id])
+        self.assertEqual(
+            list(Subscription.objects.values_list("author_id", flat=True)),
+            [author2.id],
+        )
+
+
 class BookViewSetTests(TestCase):
     def setUp(self) -> None:
         self.client = APIClient()
@@ -201,3 +263,232 @@ class BookViewSetTests(TestCase):
         books = Book.objects.filter(inventory=0)
         serialized_books = BookSerializer(books, many=True)
         self.assertEqual(response.data["results"], serialized_books.data)
+
+    def test_book_search(self) -> None:
+        other_author = Author.objects.create(
+            first_name="Jane", last_name="Austen"
+        )
+        Book.objects.create(
+            title="Emma",
+            author=other_author,
+            cover="soft",
+            inventory=2,
+            daily_fee=10.00,
+        )
+        response = self.client.get(BOOK_URL, {"q": "Doe"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]], [self.book.id]
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "PostgreSQL search")
+    def test_book_search_without_trigram_extension(self) -> None:
+        # indexes cannot be created while deferred checks are pending
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        with patch(
+            "books_service.search.TRIGRAM_INDEX_SQL",
+            ("CREATE EXTENSION no_such_extension",),
+        ):
+            install_search_indexes(DEFAULT_DB_ALIAS)
+
+        with patch(
+            "books_service.search.is_trigram_search_supported",
+            return_value=False,
+        ):
+            response = self.client.get(BOOK_URL, {"q": "Doe"})
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]], [self.book.id]
+        )
+
+    def test_book_search_no_match(self) -> None:
+        response = self.client.get(BOOK_URL, {"q": "Nonexistent"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [])
+
+    def test_book_list_cursor_pagination(self) -> None:
+        authors = [
+            Author.objects.create(first_name="Author", last_name=str(number))
+            for number in range(3)
+        ]
+        for number in range(30):
+            Book.objects.create(
+                title=f"Title {number % 10}",
+                author=authors[number // 10],
+                cover="hard",
+                inventory=1,
+                daily_fee=1.00,
+            )
+        expected = list(
+            Book.objects.order_by("title", "id").values_list("id", flat=True)
+        )
+
+        response = self.client.get(BOOK_URL, {"pagination": "cursor"})
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["previous"])
+        first_page = [book["id"] for book in response.data["results"]]
+
+        response = self.client.get(response.data["next"])
+        self.assertIsNone(response.data["next"])
+        second_page = [book["id"] for book in response.data["results"]]
+        self.assertEqual(first_page + second_page, expected)
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]], first_page
+        )
+        self.assertIsNone(response.data["previous"])
+
+    def test_book_search_rejects_cursor_pagination(self) -> None:
+        for params in ({"pagination": "cursor"}, {"cursor": "invalid"}):
+            response = self.client.get(BOOK_URL, {"q": "Book", **params})
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+            self.assertIn("q", response.data)
+
+    def test_book_list_invalid_cursor(self) -> None:
+        response = self.client.get(BOOK_URL, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_book_list_cached_until_book_changes(self) -> None:
+        response = self.client.get(BOOK_URL)
+        self.assertEqual(response["X-Cache"], "MISS")
+
+        response = self.client.get(BOOK_URL)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        self.book.inventory = 1
+        self.book.save()
+        response = self.client.get(BOOK_URL)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["inventory"], 1)
+
+    def test_book_detail_cached_until_author_renamed(self) -> None:
+        url = reverse("books_service:books-detail", args=[self.book.id])
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        self.author1.last_name = "Smith"
+        self.author1.save()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["author_full_name"], "John Smith")
+
+    def test_book_detail_not_modified(self) -> None:
+        url = reverse("books_service:books-detail", args=[self.book.id])
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.book.inventory = 1
+        self.book.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_cache_hit_answers_conditional_get_without_queries(self) -> None:
+        url = reverse("books_service:books-detail", args=[self.book.id])
+        etag = self.client.get(url)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response["ETag"], etag)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_book_list_not_modified_until_book_deleted(self) -> None:
+        Book.objects.create(
+            title="Another Book",
+            author=self.author1,
+            cover="soft",
+            inventory=1,
+            daily_fee=1.00,
+        )
+        etag = self.client.get(BOOK_URL)["ETag"]
+
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.book.delete()
+        response = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class FeedViewSetTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="reader@gmail.com", password="testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.followed = Author.objects.create(first_name="John", last_name="Doe")
+        self.other = Author.objects.create(first_name="Jane", last_name="Roe")
+        Subscription.subscribe(self.user.id, [self.followed.id])
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}",
+                author=author,
+                cover="hard",
+                inventory=1,
+                daily_fee=1.00,
+            )
+            for index in range(3)
+            for author in (self.followed, self.other)
+        ]
+
+    def feed_ids(self, response) -> list[int]:
+        return [book["id"] for book in response.data["results"]]
+
+    def test_feed_requires_authentication(self) -> None:
+        response = APIClient().get(FEED_URL)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @patch.object(KeysetPagination, "page_size", 2)
+    def test_feed_newest_books_of_subscribed_authors(self) -> None:
+        expected = [
+            book.id
+            for book in reversed(self.books)
+            if book.author_id == self.followed.id
+        ]
+
+        response = self.client.get(FEED_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.feed_ids(response), expected[:2])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(self.feed_ids(response), expected[2:])
+        self.assertIsNone(response.data["next"])
+
+    @override_settings(FEED_CACHE_MIN_SUBSCRIPTIONS=1)
+    def test_feed_cached_until_subscriptions_change(self) -> None:
+        self.assertEqual(self.client.get(FEED_URL)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(FEED_URL)["X-Cache"], "HIT")
+
+        Subscription.subscribe(self.user.id, [self.other.id])
+        response = self.client.get(FEED_URL)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(
+            self.feed_ids(response), [book.id for book in reversed(self.books)]
+        )
+
+        Book.objects.create(
+            title="Newest",
+            author=self.other,
+            cover="soft",
+            inventory=1,
+            daily_fee=1.00,
+        )
+        response = self.client.get(FEED_URL)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["title"], "Newest")
+
+    def test_feed_not_cached_for_few_subscriptions(self) -> None:
+        self.client.get(FEED_URL)
+        self.assertNotIn("X-Cache", self.client.get(FEED_URL))
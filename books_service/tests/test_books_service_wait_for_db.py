@@ -0,0 +1,39 @@
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.core.management import CommandError, call_command
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase
+
+
+COMMAND = "books_service.management.commands.wait_for_db"
+
+
+class WaitForDbTests(SimpleTestCase):
+    def wait(self, connection, **options):
+        with patch(f"{COMMAND}.connections", {"default": connection}):
+            with patch(f"{COMMAND}.time.sleep") as sleep:
+                call_command("wait_for_db", stdout=StringIO(), **options)
+        return [call.args[0] for call in sleep.call_args_list]
+
+    def test_probes_with_backoff_until_the_database_answers(self):
+        connection = MagicMock()
+        cursor = connection.cursor.return_value.__enter__.return_value
+        connection.cursor.side_effect = [
+            OperationalError("starting up"),
+            OperationalError("starting up"),
+            OperationalError("starting up"),
+            connection.cursor.return_value,
+        ]
+
+        pauses = self.wait(connection, max_delay=0.3)
+
+        self.assertEqual(pauses, [0.1, 0.2, 0.3])
+        cursor.execute.assert_called_once_with("SELECT 1")
+
+    def test_gives_up_after_timeout(self):
+        connection = MagicMock()
+        connection.cursor.side_effect = OperationalError("refused")
+
+        with self.assertRaisesMessage(CommandError, "after 0 seconds"):
+            self.wait(connection, timeout=0)
@@ -1,11 +1,12 @@
 from rest_framework.routers import DefaultRouter
 
-from .views import BookViewSet, AuthorViewSet
+from .views import BookViewSet, AuthorViewSet, FeedViewSet
 
 
 router = DefaultRouter()
 router.register("books", BookViewSet, basename="books")
 router.register("authors", AuthorViewSet, basename="authors")
+router.register("feed", FeedViewSet, basename="feed")
 
 urlpatterns = router.urls
 
@@ -1,24 +1,39 @@
+import hashlib
 import logging
 
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from drf_spectacular.utils import OpenApiParameter, extend_schema
-from rest_framework import viewsets
+from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Count
 
+from books_service.cache import cached_response
+from books_service.email_notice_package.email_notificator import (
+    EmailNotificator,
+)
 from books_service.models import Author, Book, Subscription
+from books_service.search import search_books
 from books_service.serializers.common import (
     BookSerializer,
     BookDetailSerializer,
+    BookFeedSerializer,
     BookListSerializer,
     AuthorSerializer,
+    SubscriptionBulkSerializer,
 )
 from books_service.serializers.nested import (
     AuthorImageSerializer,
     BookImageSerializer
 )
+from library_project.log import payload
+from library_project.pagination import KeysetPagination
 from library_project.permissions import IsAdminOrReadOnly
 
 
@@ -41,18 +56,127 @@ class CommonLogicMixin:
 
         if serializer.is_valid():
             serializer.save()
-            logger.info("Uploaded image to book", serializer.data)
+            logger.info(
+                "Uploaded image to book",
+                extra=payload(data=lambda: serializer.data),
+            )
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class AuthorViewSet(CommonLogicMixin, viewsets.ModelViewSet):
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified for list and retrieve, derived from the row
+    count and the latest `last_modified_fields` of the filtered queryset.
+    Unchanged resources get 304 without being serialized. Placed after
+    CachedResponseMixin, the aggregate only runs on cache misses: cached
+    pages keep their validators.
+    """
+
+    last_modified_fields = ("updated_at",)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            self.filter_queryset(self.get_queryset()),
+            lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            return super().retrieve(request, *args, **kwargs)
+
+        return self.conditional_response(
+            request,
+            queryset,
+            lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+    def get_validators(self, queryset):
+        aggregates = {
+            f"last_modified_{index}": Max(field)
+            for index, field in enumerate(self.last_modified_fields)
+        }
+        result = queryset.order_by().aggregate(count=Count("pk"), **aggregates)
+        count = result.pop("count")
+        last_modified = max(
+            (value for value in result.values() if value is not None),
+            default=None,
+        )
+        if last_modified is None:
+            return None, None
+
+        digest = hashlib.md5(
+            f"{count}:{last_modified.isoformat()}".encode()
+        ).hexdigest()
+        return f'W/"{digest}"', last_modified
+
+    def conditional_response(self, request, queryset, get_response):
+        etag, last_modified = self.get_validators(queryset)
+        if etag is None:
+            return get_response()
+
+        timestamp = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = get_response()
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(timestamp)
+        return response
+
+
+class CachedResponseMixin:
+    """Serve list and retrieve from the catalog cache of `cache_namespace`"""
+
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            self.cache_namespace,
+            request,
+            lambda: super(CachedResponseMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            self.cache_namespace,
+            request,
+            lambda: super(CachedResponseMixin, self).retrieve(
+                request, *args, **kwargs
+            ),
+            pk=kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+        )
+
+
+class AuthorViewSet(
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    CommonLogicMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
+    keyset_ordering = ("last_name", "first_name", "id")
+    cache_namespace = "authors"
+    replica_actions = ("list", "retrieve")
 
     def get_queryset(self):
-        queryset = Author.objects.annotate(books_count=Count("books"))
+        queryset = self.queryset
         filters = {}
 
         filter_mapping = {
@@ -76,6 +200,29 @@ class AuthorViewSet(CommonLogicMixin, viewsets.ModelViewSet):
 
         return queryset
 
+    @staticmethod
+    def queue_subscription_emails(
+        user, subscribed=(), unsubscribed=None
+    ) -> None:
+        unsubscribed = unsubscribed or {}
+        names = {
+            author.id: author.full_name
+            for author in Author.objects.filter(
+                pk__in=[*subscribed, *unsubscribed]
+            ).only("first_name", "last_name")
+        }
+        for author_id in subscribed:
+            EmailNotificator.queue_subscription_email(
+                user_email=user.email, author_full_name=names[author_id]
+            )
+        for author_id, started in unsubscribed.items():
+            EmailNotificator.queue_subscription_email(
+                user_email=user.email,
+                author_full_name=names.get(author_id, ""),
+                status=False,
+                date_subscription=started,
+            )
+
     @action(
         methods=["POST", "DELETE"],
         detail=True,
@@ -85,64 +232,120 @@ class AuthorViewSet(CommonLogicMixin, viewsets.ModelViewSet):
     def manage_subscribe(self, request, pk=None):
         user = self.request.user
         author = self.get_object()
-        user_subscriptions = user.subscribed.all()
-        user_subscribed = author in user_subscriptions
 
         if self.request.method == "POST":
-            if not user.is_staff and not user_subscribed:
-                user.subscribed.add(author)
-                data = {
-                    "message": (
-                        f"Subscribed to {author.full_name} "
-                        f"successfully!"
-                    ),
-                }
-                logger.info(
-                    f"Subscribed user to author {author.id}",
-                    {"user": request.user}
+            if user.is_staff:
+                return Response(
+                    {
+                        "impossible_to_subscribe": (
+                            "Staff members can not subscribe"
+                        )
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
                 )
-                return Response(data, status=status.HTTP_201_CREATED)
-
-            elif author in user_subscriptions:
-                data = {
-                    "impossible_to_subscribe": "You have already subscribed"
-                }
-                logger.info(
-                    "Attempted to subscribe an already subscribed "
-                    f"user to author {author.id}",
-                    {"user": request.user}
-                )
-                return Response(data, status=status.HTTP_400_BAD_REQUEST)
+            with transaction.atomic():
+                if Subscription.subscribe(user.id, [author.id]):
+                    self.queue_subscription_emails(user, [author.id])
+                    data = {
+                        "message": (
+                            f"Subscribed to {author.full_name} "
+                            f"successfully!"
+                        ),
+                    }
+                    logger.info(
+                        f"Subscribed user to author {author.id}",
+                        extra=payload(user_id=request.user.id),
+                    )
+                    return Response(data, status=status.HTTP_201_CREATED)
 
-        elif self.request.method == "DELETE":
             data = {
-                "delete_status": (
-                    f"Subscription to {author.full_name} "
-                    f"canceled successfully! "
-                )
+                "impossible_to_subscribe": "You have already subscribed"
             }
-            if user_subscribed:
-                subsctiption_date = Subscription.objects.get(
-                    user=user, author=author
-                ).subscription_started
-                data[
-                    "delete_status"
-                ] += f"You have been subscribed since {subsctiption_date}."
-                user.subscribed.remove(author)
-                logger.info(f"Unsubscribed user from author "
-                            f"{author.id}",
-                            {"user": request.user})
-                return Response(data, status=status.HTTP_204_NO_CONTENT)
+            logger.info(
+                "Attempted to subscribe an already subscribed "
+                f"user to author {author.id}",
+                extra=payload(user_id=request.user.id),
+            )
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
 
+        data = {
+            "delete_status": (
+                f"Subscription to {author.full_name} "
+                f"canceled successfully! "
+            )
+        }
+        with transaction.atomic():
+            unsubscribed = Subscription.unsubscribe(user.id, [author.id])
+            if unsubscribed:
+                self.queue_subscription_emails(
+                    user, unsubscribed=unsubscribed
+                )
+        if unsubscribed:
             data[
                 "delete_status"
-            ] = f"You are not subscribed to {author.full_name} yet."
+            ] += f"You have been subscribed since {unsubscribed[author.id]}."
+            logger.info(f"Unsubscribed user from author "
+                        f"{author.id}",
+                        extra=payload(user_id=request.user.id))
+            return Response(data, status=status.HTTP_204_NO_CONTENT)
+
+        data[
+            "delete_status"
+        ] = f"You are not subscribed to {author.full_name} yet."
+        logger.info(
+            "Attempted to unsubscribe an unsubscribed already user "
+            f"from author {author.id}",
+            extra=payload(user_id=request.user.id),
+        )
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(request=SubscriptionBulkSerializer)
+    @action(
+        methods=["POST", "DELETE"],
+        detail=False,
+        url_path="subscriptions",
+        permission_classes=[IsAuthenticated],
+    )
+    def manage_subscriptions(self, request):
+        """Subscribe to, or unsubscribe from, many authors at once"""
+        serializer = SubscriptionBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        author_ids = serializer.validated_data["authors"]
+        user = request.user
+
+        if request.method == "POST":
+            if user.is_staff:
+                return Response(
+                    {
+                        "impossible_to_subscribe": (
+                            "Staff members can not subscribe"
+                        )
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            with transaction.atomic():
+                subscribed = Subscription.subscribe(user.id, author_ids)
+                self.queue_subscription_emails(user, subscribed)
             logger.info(
-                "Attempted to unsubscribe an unsubscribed already user "
-                f"from author {author.id}",
-                {"user": request.user}
+                f"Subscribed user to {len(subscribed)} authors",
+                extra=payload(user_id=request.user.id),
             )
-            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+            return Response(
+                {"subscribed": sorted(subscribed)},
+                status=status.HTTP_200_OK,
+            )
+
+        with transaction.atomic():
+            unsubscribed = Subscription.unsubscribe(user.id, author_ids)
+            self.queue_subscription_emails(user, unsubscribed=unsubscribed)
+        logger.info(
+            f"Unsubscribed user from {len(unsubscribed)} authors",
+            extra=payload(user_id=request.user.id),
+        )
+        return Response(
+            {"unsubscribed": sorted(unsubscribed)},
+            status=status.HTTP_200_OK,
+        )
 
     @extend_schema(
         parameters=[
@@ -211,9 +414,20 @@ class AuthorViewSet(CommonLogicMixin, viewsets.ModelViewSet):
         return self.serializer_class
 
 
-class BookViewSet(CommonLogicMixin, viewsets.ModelViewSet):
+class BookViewSet(
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    CommonLogicMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Book.objects.select_related("author").all()
     serializer_class = BookSerializer
+    keyset_ordering = ("title", "id")
+    # search results are ordered by relevance, not by the keyset
+    keyset_excluded_params = ("q",)
+    cache_namespace = "books"
+    replica_actions = ("list", "retrieve")
+    last_modified_fields = ("updated_at", "author__updated_at")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -250,10 +464,21 @@ class BookViewSet(CommonLogicMixin, viewsets.ModelViewSet):
         if "unavailable" in self.request.query_params:
             queryset = queryset.filter(inventory=0)
 
+        if query := self.request.query_params.get("q"):
+            queryset = search_books(queryset, query)
+
         return queryset
 
     @extend_schema(
         parameters=[
+            OpenApiParameter(
+                name="q",
+                type=str,
+                description=(
+                    "Full-text search by title and author's name, "
+                    "results ordered by relevance (e.g., ?q=war peace)."
+                ),
+            ),
             OpenApiParameter(
                 name="title",
                 type=str,
@@ -305,3 +530,45 @@ class BookViewSet(CommonLogicMixin, viewsets.ModelViewSet):
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
+
+
+class FeedViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Newest books by the authors the user is subscribed to, one cursor
+    page at a time. Each page is a range scan of the created_at index
+    semi-joined with the user's subscriptions.
+    """
+
+    serializer_class = BookFeedSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-created_at", "-id")
+    replica_actions = ("list",)
+
+    def get_queryset(self):
+        return Book.objects.select_related("author").filter(
+            author__in=Subscription.objects.filter(
+                user=self.request.user
+            ).values("author")
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        Pages of users following at least FEED_CACHE_MIN_SUBSCRIPTIONS
+        authors are cached until their subscriptions or the books change
+        """
+        get_response = super().list
+        threshold = settings.FEED_CACHE_MIN_SUBSCRIPTIONS
+        if (
+            threshold is None
+            or Subscription.objects.filter(user=request.user).count()
+            < threshold
+        ):
+            return get_response(request, *args, **kwargs)
+
+        return cached_response(
+            "feed",
+            request,
+            lambda: get_response(request, *args, **kwargs),
+            pk=request.user.pk,
+        )
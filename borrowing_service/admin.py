@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Borrowing
+from .models import Borrowing, Notification
 
 
 @admin.register(Borrowing)
@@ -14,3 +14,8 @@ class BorrowingAdmin(admin.ModelAdmin):
     )
     search_fields = ("book__title",)
     sortable_by = ("id",)
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("id", "created_at", "message")
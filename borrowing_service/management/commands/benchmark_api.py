@@ -0,0 +1,445 @@
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from http.server import ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import patch
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import (
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+
+from books_service.models import Author, Book
+from borrowing_service.management.commands.run_fake_telegram import (
+    FakeTelegramHandler,
+)
+from library_project.benchmark import (
+    Recorder,
+    find_regressions,
+    load_baseline,
+    save_baseline,
+)
+from library_project.celery import app as celery_app
+from payments_service.management.commands.run_fake_stripe import (
+    FakeStripeHandler,
+)
+from payments_service.models import Payment
+from payments_service.stripe_client import configure_stripe
+
+
+SCENARIOS = ("catalog", "borrowing", "payments", "token")
+PASSWORD = "benchmark-password"
+WEBHOOK_SECRET = "whsec_benchmark"
+SEARCH_WORDS = ("war", "peace", "time", "night", "river", "quia", "dolor")
+
+
+def start_server(handler) -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def sign_webhook(payload: str) -> str:
+    timestamp = int(time.time())
+    signature = hmac.new(
+        WEBHOOK_SECRET.encode(),
+        f"{timestamp}.{payload}".encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure p50/p95/p99 latency, queries per request and throughput "
+        "of the main API endpoints on a throwaway test database filled by "
+        "generate_data, with Stripe and Telegram replaced by local fakes. "
+        "Results are compared with a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=SCENARIOS,
+            help="Scenario to run, may be repeated (default: all)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=300,
+            help="Requests per scenario, a tenth of it for token",
+        )
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--readers", type=int, default=20)
+        parser.add_argument("--books", type=int, default=2000)
+        parser.add_argument("--borrowings", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--stripe-latency",
+            type=int,
+            default=0,
+            help="Milliseconds the fake Stripe API takes per call",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="Baseline file "
+            "(default: benchmarks/baseline-<database vendor>.json)",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Store this run as the new baseline",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.5,
+            help="Allowed p95 latency growth over the baseline, as a share",
+        )
+        parser.add_argument(
+            "--locmem-cache",
+            action="store_true",
+            help="Use a local memory cache instead of the configured one",
+        )
+        parser.add_argument("--keepdb", action="store_true")
+
+    def handle(self, *args, **options):
+        baseline_path = options["baseline"] or os.path.join(
+            "benchmarks", f"baseline-{connection.vendor}.json"
+        )
+        recorder = Recorder()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+        )
+        try:
+            with ExitStack() as stack:
+                self.stub_services(stack, options)
+                self.prepare_data(options)
+                for scenario in options["scenario"] or SCENARIOS:
+                    getattr(self, f"run_{scenario}")(recorder, options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+
+        report = recorder.report()
+        self.print_report(report)
+        if options["save_baseline"]:
+            save_baseline(baseline_path, report)
+            self.stdout.write(f"Saved baseline to {baseline_path}")
+            return
+
+        baseline = load_baseline(baseline_path)
+        if baseline is None:
+            self.stdout.write(f"No baseline at {baseline_path}")
+            return
+        regressions = find_regressions(
+            report, baseline, options["tolerance"]
+        )
+        if regressions:
+            raise CommandError(
+                "Regressions against the baseline:\n"
+                + "\n".join(regressions)
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"No regressions against {baseline_path}")
+        )
+
+    def stub_services(self, stack: ExitStack, options: dict) -> None:
+        # allows the test client's host and keeps mail in memory
+        setup_test_environment()
+        stack.callback(teardown_test_environment)
+        FakeStripeHandler.latency = options["stripe_latency"] / 1000
+        FakeTelegramHandler.latency = 0
+        FakeTelegramHandler.rate_limit_every = 0
+        overrides = {
+            "STRIPE_ASYNC_SESSIONS": False,
+            "STRIPE_API_BASE": start_server(FakeStripeHandler),
+            "STRIPE_SECRET": "sk_test_benchmark",
+            "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+            "TELEGRAM_API_BASE": start_server(FakeTelegramHandler),
+        }
+        if options["locmem_cache"]:
+            overrides["CACHES"] = {
+                "default": {
+                    "BACKEND": (
+                        "django.core.cache.backends.locmem.LocMemCache"
+                    ),
+                }
+            }
+        stack.enter_context(override_settings(**overrides))
+        stack.enter_context(patch.object(stripe, "api_base", stripe.api_base))
+        stack.enter_context(patch.object(stripe, "api_key", stripe.api_key))
+        configure_stripe()
+        stack.enter_context(patch.dict(os.environ, {"TOKEN": "benchmark"}))
+        # throttling still runs, with rates no benchmark reaches
+        stack.enter_context(
+            patch.dict(
+                SimpleRateThrottle.THROTTLE_RATES,
+                {"anon": "1000000/s", "user": "1000000/s"},
+            )
+        )
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        stack.callback(
+            setattr, celery_app.conf, "task_always_eager", eager
+        )
+
+    def prepare_data(self, options: dict) -> None:
+        call_command(
+            "generate_data",
+            users=options["readers"],
+            authors=max(options["books"] // 20, 1),
+            books=options["books"],
+            borrowings=options["borrowings"],
+            seed=options["seed"],
+            workers=1,
+            password=PASSWORD,
+            stdout=StringIO(),
+        )
+        self.readers = list(
+            get_user_model().objects.filter(is_staff=False).order_by("id")
+        )
+        self.tokens = {
+            user.id: str(AccessToken.for_user(user))
+            for user in get_user_model().objects.all()
+        }
+        # generated popularity order: the lowest ids are borrowed most
+        self.popular_books = list(
+            Book.objects.order_by("id").values_list("id", flat=True)[:50]
+        )
+        Book.objects.filter(pk__in=self.popular_books).update(
+            inventory=1_000_000
+        )
+        self.author_ids = list(Author.objects.values_list("id", flat=True))
+
+    def client(self, reader) -> APIClient:
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {self.tokens[reader.id]}"
+        )
+        return client
+
+    def run_catalog(self, recorder: Recorder, options: dict) -> None:
+        books_url = reverse("books_service:books-list")
+        authors_url = reverse("books_service:authors-list")
+
+        def browse(index):
+            rng = random.Random(index)
+            client = self.client(rng.choice(self.readers))
+            kind = index % 6
+            if kind == 0:
+                recorder.request(
+                    "catalog:books-page",
+                    lambda: client.get(
+                        books_url, {"page": rng.randint(1, 5)}
+                    ),
+                )
+            elif kind == 1:
+                recorder.request(
+                    "catalog:books-cursor",
+                    lambda: client.get(books_url, {"pagination": "cursor"}),
+                )
+            elif kind == 2:
+                recorder.request(
+                    "catalog:books-by-author",
+                    lambda: client.get(
+                        books_url,
+                        {"author-id": rng.choice(self.author_ids)},
+                    ),
+                )
+            elif kind == 3:
+                recorder.request(
+                    "catalog:books-search",
+                    lambda: client.get(
+                        books_url, {"q": rng.choice(SEARCH_WORDS)}
+                    ),
+                )
+            elif kind == 4:
+                book_id = rng.choice(self.popular_books)
+                recorder.request(
+                    "catalog:book-detail",
+                    lambda: client.get(
+                        reverse("books_service:books-detail", args=[book_id])
+                    ),
+                )
+            else:
+                recorder.request(
+                    "catalog:authors-page",
+                    lambda: client.get(authors_url),
+                )
+
+        recorder.run(
+            "catalog",
+            browse,
+            list(range(options["requests"])),
+            options["concurrency"],
+        )
+
+    def run_borrowing(self, recorder: Recorder, options: dict) -> None:
+        url = reverse("borrowing_service:borrowing-list")
+        expected_return_date = str(
+            timezone.now().date() + timedelta(days=14)
+        )
+
+        def borrow_and_return(index):
+            rng = random.Random(index)
+            reader = self.readers[index % len(self.readers)]
+            client = self.client(reader)
+            response = recorder.request(
+                "borrowing:create",
+                lambda: client.post(
+                    url,
+                    {
+                        "book": rng.choice(self.popular_books),
+                        "expected_return_date": expected_return_date,
+                    },
+                    format="json",
+                ),
+                expected=(307,),
+            )
+            if response.status_code != 307:
+                return
+            borrowing_id = Payment.objects.get(
+                session_id=response.data["session_url"].rsplit("/", 1)[-1]
+            ).borrowing_id
+            recorder.request(
+                "borrowing:return",
+                lambda: client.post(
+                    reverse(
+                        "borrowing_service:order_return", args=[borrowing_id]
+                    )
+                ),
+            )
+            recorder.request(
+                "borrowing:list",
+                lambda: client.get(url, {"pagination": "cursor"}),
+            )
+
+        recorder.run(
+            "borrowing",
+            borrow_and_return,
+            list(range(options["requests"] // 3)),
+            options["concurrency"],
+        )
+
+    def run_payments(self, recorder: Recorder, options: dict) -> None:
+        webhook_url = reverse("payments:stripe_webhook")
+        success_url = reverse("payments:payment-order-success")
+        list_url = reverse("payments:payment-list")
+        pending = list(
+            Payment.objects.filter(status="pending")
+            .select_related("borrowing__user")
+            .order_by("id")
+        )
+        if not pending:
+            raise CommandError("No pending payments, generate borrowings")
+        for payment in pending:
+            FakeStripeHandler.sessions[payment.session_id] = {
+                "id": payment.session_id,
+                "object": "checkout.session",
+                "payment_status": "paid",
+            }
+
+        def callback(index):
+            payment = pending[index % len(pending)]
+            kind = index % 3
+            if kind == 0:
+                payload = json.dumps(
+                    {
+                        "id": f"evt_benchmark_{index}",
+                        "object": "event",
+                        "type": "checkout.session.completed",
+                        "data": {
+                            "object": {
+                                "id": payment.session_id,
+                                "object": "checkout.session",
+                                "payment_status": "paid",
+                            }
+                        },
+                    }
+                )
+                recorder.request(
+                    "payments:webhook",
+                    lambda: APIClient().post(
+                        webhook_url,
+                        payload,
+                        content_type="application/json",
+                        HTTP_STRIPE_SIGNATURE=sign_webhook(payload),
+                    ),
+                )
+                return
+
+            client = self.client(payment.borrowing.user)
+            if kind == 1:
+                recorder.request(
+                    "payments:success",
+                    lambda: client.get(
+                        success_url, {"session_id": payment.session_id}
+                    ),
+                )
+            else:
+                recorder.request(
+                    "payments:list",
+                    lambda: client.get(list_url, {"pagination": "cursor"}),
+                )
+
+        recorder.run(
+            "payments",
+            callback,
+            list(range(options["requests"])),
+            options["concurrency"],
+        )
+
+    def run_token(self, recorder: Recorder, options: dict) -> None:
+        url = reverse("user:token_obtain_pair")
+
+        def obtain(index):
+            reader = self.readers[index % len(self.readers)]
+            recorder.request(
+                "token:obtain",
+                lambda: APIClient().post(
+                    url,
+                    {"email": reader.email, "password": PASSWORD},
+                    format="json",
+                ),
+            )
+
+        recorder.run(
+            "token",
+            obtain,
+            list(range(max(options["requests"] // 10, 1))),
+            options["concurrency"],
+        )
+
+    def print_report(self, report: dict) -> None:
+        self.stdout.write(
+            f"{'endpoint':<28}{'requests':>9}{'errors':>7}{'p50 ms':>9}"
+            f"{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'rps':>8}"
+        )
+        for name, stats in report.items():
+            self.stdout.write(
+                f"{name:<28}{stats['requests']:>9}{stats['errors']:>7}"
+                f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}"
+                f"{stats['p99_ms']:>9}{stats['queries']:>9}"
+                f"{stats['rps'] or '':>8}"
+            )
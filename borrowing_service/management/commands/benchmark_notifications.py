@@ -0,0 +1,83 @@
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import requests
+from django.core.management import BaseCommand
+from django.test import override_settings
+
+from borrowing_service.management.commands.run_fake_telegram import (
+    FakeTelegramHandler,
+)
+from tgbot.notificator import send_notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sequential Telegram notifications with the concurrent "
+        "fan-out of send_notification against a local fake Telegram API"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipients", type=int, default=100)
+        parser.add_argument(
+            "--failing",
+            type=int,
+            default=5,
+            help="Recipients with an unknown chat id",
+        )
+        parser.add_argument(
+            "--latency",
+            type=int,
+            default=50,
+            help="Milliseconds the fake API takes per message",
+        )
+        parser.add_argument("--rate-limit-every", type=int, default=0)
+
+    def handle(self, *args, **options):
+        FakeTelegramHandler.latency = options["latency"] / 1000
+        FakeTelegramHandler.rate_limit_every = options["rate_limit_every"]
+        FakeTelegramHandler.retry_after = 0
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegramHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        api_base = f"http://127.0.0.1:{server.server_port}"
+
+        recipients = list(range(1, options["recipients"] + 1))
+        for index in range(min(options["failing"], len(recipients))):
+            recipients[index] = -recipients[index]
+        text = "Benchmark notification"
+
+        try:
+            self.report(
+                "sequential",
+                lambda: self.send_sequentially(api_base, recipients, text),
+            )
+            with override_settings(TELEGRAM_API_BASE=api_base):
+                self.report(
+                    "fan-out",
+                    lambda: len(send_notification(text, recipients)),
+                )
+        finally:
+            server.shutdown()
+
+    def report(self, name: str, send) -> None:
+        FakeTelegramHandler.delivered = 0
+        start = time.perf_counter()
+        failed = send()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{name:>10}: {FakeTelegramHandler.delivered} delivered, "
+            f"{failed} failed in {elapsed:.2f} s"
+        )
+
+    @staticmethod
+    def send_sequentially(api_base: str, recipients: list, text: str) -> int:
+        """The previous implementation: one new connection per chat"""
+        failed = 0
+        for chat_id in recipients:
+            resp = requests.get(
+                f"{api_base}/bottoken/sendMessage",
+                params={"chat_id": chat_id, "text": text},
+            )
+            failed += not resp.ok
+        return failed
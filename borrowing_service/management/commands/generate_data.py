@@ -0,0 +1,437 @@
+import csv
+import io
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker.providers.lorem.en_US import Provider as LoremProvider
+from faker.providers.person.en_US import Provider as PersonProvider
+
+from books_service.cache import invalidate_catalog_cache
+from books_service.models import Author, Book
+from books_service.search import fill_search_vectors
+from borrowing_service.models import Borrowing
+from payments_service.models import Payment
+
+
+FIRST_NAMES = tuple(PersonProvider.first_names)
+LAST_NAMES = tuple(PersonProvider.last_names)
+WORDS = tuple(LoremProvider.word_list)
+PHASES = ("users", "authors", "books", "borrowings")
+
+USER_COLUMNS = (
+    "id",
+    "email",
+    "password",
+    "first_name",
+    "last_name",
+    "telegram_id",
+    "is_staff",
+    "is_superuser",
+    "is_active",
+    "date_joined",
+)
+AUTHOR_COLUMNS = ("id", "first_name", "last_name", "books_count", "updated_at")
+BOOK_COLUMNS = (
+    "id",
+    "title",
+    "author_id",
+    "cover",
+    "inventory",
+    "daily_fee",
+    "created_at",
+    "updated_at",
+)
+BORROWING_COLUMNS = (
+    "id",
+    "borrow_date",
+    "expected_return_date",
+    "actual_return_date",
+    "book_id",
+    "user_id",
+)
+PAYMENT_COLUMNS = (
+    "status",
+    "type",
+    "borrowing_id",
+    "session_url",
+    "session_id",
+    "session_attempts",
+    "expires_at",
+    "money_to_pay",
+)
+
+
+def zipf_rank(rng: random.Random, count: int) -> int:
+    """
+    Rank in 1..count drawn with probability ~ 1/rank (Zipf with s=1), by
+    inverting the continuous distribution: a few books, authors and
+    readers take most of the borrowings, as in real libraries.
+    """
+    return min(int((count + 1) ** rng.random()), count)
+
+
+def person_name(index: int) -> tuple[str, str]:
+    """
+    Distinct (first name, last name) of every index: the pairs are walked
+    in a scrambled order, with a numeric suffix once they run out.
+    """
+    pairs = len(FIRST_NAMES) * len(LAST_NAMES)
+    cycle, index = divmod(index, pairs)
+    index = index * 7919 % pairs
+    last_name = LAST_NAMES[index // len(FIRST_NAMES)]
+    if cycle:
+        last_name = f"{last_name} {cycle + 1}"
+    return FIRST_NAMES[index % len(FIRST_NAMES)], last_name
+
+
+def daily_fee(book_id: int, seed: int) -> Decimal:
+    """Fee derived from the book id, so borrowings need no lookup"""
+    return Decimal(50 + (book_id * 2654435761 + seed) % 1950) / 100
+
+
+@contextmanager
+def explicit_dates():
+    """
+    Let bulk_create keep generated borrow dates and book creation times
+    instead of overwriting them with now()
+    """
+    fields = [
+        Borrowing._meta.get_field("borrow_date"),
+        Book._meta.get_field("created_at"),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def insert_rows(model, columns: tuple, rows: list[tuple]) -> None:
+    """
+    COPY plain tuples on PostgreSQL, which skips building model instances
+    and compiling INSERTs, the bulk of the cost at millions of rows.
+    Other databases get bulk_create.
+    """
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor != "postgresql":
+        model.objects.bulk_create(
+            model(**dict(zip(columns, row))) for row in rows
+        )
+        return
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    # unquoted empty fields are NULL in CSV, except in NOT NULL columns
+    not_null = [
+        column
+        for column in columns
+        if not model._meta.get_field(column).null
+    ]
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(model._meta.db_table)} "
+            f"({', '.join(columns)}) FROM STDIN WITH "
+            f"(FORMAT csv, FORCE_NOT_NULL ({', '.join(not_null)}))",
+            buffer,
+        )
+
+
+def generate_users(rng, start, stop, plan):
+    now = plan["now"]
+    rows = []
+    for pk in range(start, stop):
+        telegram_id = None
+        if rng.random() < plan["telegram_share"]:
+            telegram_id = rng.randrange(10**8, 10**9)
+        rows.append(
+            (
+                pk,
+                f"user{pk}@email.com",
+                plan["password"],
+                rng.choice(FIRST_NAMES),
+                rng.choice(LAST_NAMES),
+                telegram_id,
+                pk == 1,
+                pk == 1,
+                True,
+                now,
+            )
+        )
+    insert_rows(get_user_model(), USER_COLUMNS, rows)
+
+
+def generate_authors(rng, start, stop, plan):
+    now = plan["now"]
+    insert_rows(
+        Author,
+        AUTHOR_COLUMNS,
+        [(pk, *person_name(pk), 0, now) for pk in range(start, stop)],
+    )
+
+
+def generate_books(rng, start, stop, plan):
+    first_author, authors = plan["authors"]
+    now = plan["now"]
+    rows = []
+    for pk in range(start, stop):
+        words = rng.sample(WORDS, rng.randint(1, 4))
+        rows.append(
+            (
+                pk,
+                f"{' '.join(words).capitalize()} #{pk}",
+                first_author + zipf_rank(rng, authors) - 1,
+                rng.choice(("hard", "soft")),
+                0 if rng.random() < 0.1 else rng.randint(1, 20),
+                daily_fee(pk, plan["seed"]),
+                now - timedelta(seconds=rng.randrange(plan["days"] * 86400)),
+                now,
+            )
+        )
+    with transaction.atomic():
+        insert_rows(Book, BOOK_COLUMNS, rows)
+        fill_search_vectors(Book.objects.filter(pk__gte=start, pk__lt=stop))
+
+
+def payment_row(borrowing_id, payment_type, status, money, rng, plan):
+    timestamp = int(plan["now"].timestamp())
+    expires_at = None
+    if status == "pending":
+        expires_at = timestamp + rng.randint(-3600, 86400)
+    elif status == "expired":
+        expires_at = timestamp - rng.randint(3600, 86400 * plan["days"])
+    session_id = f"cs_synthetic_{borrowing_id}_{payment_type}"
+    return (
+        status,
+        payment_type,
+        borrowing_id,
+        "",
+        session_id,
+        1 if session_id else 0,
+        expires_at,
+        money,
+    )
+
+
+def generate_borrowings(rng, start, stop, plan):
+    """
+    Borrowings spread over the last `days` days: mostly returned (some of
+    them late, with a fine), a share still active and a share overdue.
+    Each gets its payment, and late returns a fee.
+    """
+    first_user, users = plan["users"]
+    first_book, books = plan["books"]
+    today = plan["now"].date()
+    borrowings, payments = [], []
+    for pk in range(start, stop):
+        book_id = first_book + zipf_rank(rng, books) - 1
+        fee = daily_fee(book_id, plan["seed"])
+        borrow_date = today - timedelta(days=rng.randint(0, plan["days"]))
+        expected = borrow_date + timedelta(days=rng.randint(7, 30))
+        actual = None
+        roll = rng.random()
+        if expected < today:
+            if roll >= plan["overdue_share"]:
+                late = rng.random() < plan["late_share"]
+                actual = (
+                    expected + timedelta(days=rng.randint(1, 14))
+                    if late
+                    else borrow_date + timedelta(
+                        days=rng.randint(1, (expected - borrow_date).days)
+                    )
+                )
+                actual = min(actual, today)
+        elif roll >= plan["active_share"]:
+            actual = borrow_date + timedelta(
+                days=rng.randint(0, (today - borrow_date).days)
+            )
+        borrowings.append(
+            (
+                pk,
+                borrow_date,
+                expected,
+                actual,
+                book_id,
+                first_user + zipf_rank(rng, users) - 1,
+            )
+        )
+
+        status = "paid"
+        if actual is None:
+            roll = rng.random()
+            if roll < plan["pending_share"]:
+                status = "pending"
+            elif roll < plan["pending_share"] + plan["expired_share"]:
+                status = "expired"
+        money = (expected - borrow_date).days * fee
+        payments.append(payment_row(pk, "payment", status, money, rng, plan))
+        if actual and actual > expected:
+            status = "paid" if rng.random() < 0.8 else "pending"
+            money = (actual - expected).days * fee * settings.FINE_MULTIPLIER
+            payments.append(payment_row(pk, "fee", status, money, rng, plan))
+
+    with transaction.atomic():
+        insert_rows(Borrowing, BORROWING_COLUMNS, borrowings)
+        insert_rows(Payment, PAYMENT_COLUMNS, payments)
+
+
+GENERATORS = {
+    "users": generate_users,
+    "authors": generate_authors,
+    "books": generate_books,
+    "borrowings": generate_borrowings,
+}
+
+
+def generate_chunk(phase, start, stop, plan):
+    """
+    Generate one chunk with its own random generator, seeded by the seed
+    and the chunk position only, so the data set does not depend on the
+    number of workers or the order they run in.
+    """
+    rng = random.Random(f"{plan['seed']}:{phase}:{start}")
+    GENERATORS[phase](rng, start, stop, plan)
+    return stop - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic library of the given size: "
+        "users, authors, books with popular titles, borrowings with "
+        "overdue ones and their payments. The same seed and batch size "
+        "give the same data on an empty database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--authors", type=int, default=500)
+        parser.add_argument("--books", type=int, default=10000)
+        parser.add_argument("--borrowings", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Borrowings and books are spread over the last days",
+        )
+        parser.add_argument("--overdue-share", type=float, default=0.05)
+        parser.add_argument("--active-share", type=float, default=0.5)
+        parser.add_argument("--late-share", type=float, default=0.15)
+        parser.add_argument("--pending-share", type=float, default=0.1)
+        parser.add_argument("--expired-share", type=float, default=0.05)
+        parser.add_argument("--telegram-share", type=float, default=0.3)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Processes inserting chunks in parallel",
+        )
+        parser.add_argument(
+            "--password",
+            default="GGduIU@",
+            help="Password of every generated user",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--batch-size and --workers must be positive")
+        borrowings = options["borrowings"]
+        if borrowings and not (options["users"] and options["books"]):
+            raise CommandError("Borrowings need users and books")
+        if options["books"] and not options["authors"]:
+            raise CommandError("Books need authors")
+
+        plan = {
+            "seed": options["seed"],
+            "now": timezone.now().replace(microsecond=0),
+            "days": options["days"],
+            # PBKDF2 is slow on purpose, every user shares one hash
+            "password": make_password(options["password"]),
+            **{
+                name: options[name]
+                for name in (
+                    "overdue_share",
+                    "active_share",
+                    "late_share",
+                    "pending_share",
+                    "expired_share",
+                    "telegram_share",
+                )
+            },
+        }
+        models = {
+            "users": get_user_model(),
+            "authors": Author,
+            "books": Book,
+            "borrowings": Borrowing,
+        }
+        for phase, model in models.items():
+            start = (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+            plan[phase] = (start, options[phase])
+
+        with explicit_dates():
+            for phase in PHASES:
+                self.run_phase(phase, plan, options)
+
+        with connection.cursor() as cursor:
+            for statement in connection.ops.sequence_reset_sql(
+                no_style(), [*models.values(), Payment]
+            ):
+                cursor.execute(statement)
+        Author.recount_books(
+            range(plan["authors"][0], sum(plan["authors"]))
+        )
+        for namespace in ("books", "authors", "feed"):
+            invalidate_catalog_cache(namespace, everything=True)
+
+    def run_phase(self, phase, plan, options):
+        first, count = plan[phase]
+        if not count:
+            return
+        batch_size = options["batch_size"]
+        chunks = [
+            (phase, start, min(start + batch_size, first + count), plan)
+            for start in range(first, first + count, batch_size)
+        ]
+        workers = min(options["workers"], len(chunks))
+
+        started = time.perf_counter()
+        if workers == 1:
+            for chunk in chunks:
+                generate_chunk(*chunk)
+        else:
+            # forked workers must not share the parent's connections
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+            ) as executor:
+                for future in [
+                    executor.submit(generate_chunk, *chunk)
+                    for chunk in chunks
+                ]:
+                    future.result()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{phase}: {count} rows in {elapsed:.1f} s "
+            f"({count / elapsed if elapsed else math.inf:.0f} rows/s, "
+            f"{workers} workers)"
+        )
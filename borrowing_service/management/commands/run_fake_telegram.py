@@ -0,0 +1,119 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management import BaseCommand
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Telegram Bot API sendMessage method:
+    - negative chat ids answer 400 "chat not found"
+    - every `rate_limit_every`-th request answers 429 with retry_after
+    """
+
+    latency = 0.0
+    rate_limit_every = 0
+    retry_after = 1
+    requests = itertools.count(1)
+    lock = threading.Lock()
+    delivered = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlparse(self.path)
+        if not url.path.endswith("/sendMessage"):
+            return self.send_json(
+                {"ok": False, "error_code": 404, "description": "Not Found"},
+                status=404,
+            )
+
+        number = next(self.requests)
+        if self.rate_limit_every and number % self.rate_limit_every == 0:
+            return self.send_json(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests",
+                    "parameters": {"retry_after": self.retry_after},
+                },
+                status=429,
+            )
+
+        params = parse_qs(url.query)
+        chat_id = int(params.get("chat_id", ["0"])[0])
+        if chat_id < 0:
+            return self.send_json(
+                {
+                    "ok": False,
+                    "error_code": 400,
+                    "description": "Bad Request: chat not found",
+                },
+                status=400,
+            )
+
+        with self.lock:
+            FakeTelegramHandler.delivered += 1
+        self.send_json(
+            {
+                "ok": True,
+                "result": {
+                    "chat": {"id": chat_id},
+                    "text": params.get("text", [""])[0],
+                },
+            }
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local fake Telegram Bot API for offline load tests. "
+        "Point TELEGRAM_API_BASE at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+        parser.add_argument(
+            "--latency",
+            type=int,
+            default=0,
+            help="Milliseconds added to every response",
+        )
+        parser.add_argument(
+            "--rate-limit-every",
+            type=int,
+            default=0,
+            help="Answer every N-th request with 429 Too Many Requests",
+        )
+
+    def handle(self, *args, **options):
+        FakeTelegramHandler.latency = options["latency"] / 1000
+        FakeTelegramHandler.rate_limit_every = options["rate_limit_every"]
+        server = ThreadingHTTPServer(
+            (options["host"], options["port"]), FakeTelegramHandler
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fake Telegram listening on "
+                f"http://{options['host']}:{options['port']}"
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
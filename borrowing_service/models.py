@@ -72,6 +72,33 @@ class Borrowing(models.Model):
 
     class Meta:
         ordering = ["expected_return_date"]
+        indexes = [
+            models.Index(
+                fields=["expected_return_date", "id"],
+                name="borrowing_return_keyset_idx",
+            ),
+            models.Index(
+                fields=["actual_return_date", "expected_return_date"],
+                name="borrowing_overdue_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"'{self.book.title}' borrowed by {self.user.email}"
+
+
+class Notification(models.Model):
+    """
+    Staff Telegram message buffered until the next digest. A message that
+    failed to reach a chat is queued again for that chat alone.
+    """
+
+    message = models.TextField()
+    chat_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("id",)
+
+    def __str__(self) -> str:
+        return self.message
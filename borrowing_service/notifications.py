@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.db import transaction
+
+from borrowing_service.models import Notification
+from borrowing_service.tasks import send_notification_task
+from library_project import metrics
+
+
+def queue_notification(message: str) -> None:
+    """
+    Buffer a staff notification for the next flush_notifications digest,
+    or send it on commit when NOTIFICATION_DIGEST_WINDOW is 0. The buffer
+    row is part of the caller's transaction, so a rolled back change
+    notifies nobody.
+    """
+    if not settings.NOTIFICATION_DIGEST_WINDOW:
+        transaction.on_commit(lambda: send_notification_task.delay(message))
+        return
+    Notification.objects.create(message=message)
+    metrics.increment("notifications:buffered")
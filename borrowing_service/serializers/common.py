@@ -1,11 +1,11 @@
 from django.core.exceptions import ValidationError
-from django.db import transaction
 from rest_framework import serializers
 from books_service.models import Book
 
 from books_service.serializers.common import BookDetailSerializer
 from payments_service.serializers.nested import PaymentBorrowingSerializer
 from borrowing_service.models import Borrowing
+from library_project.db import atomic_with_retry
 
 
 class BorrowingSerializer(serializers.ModelSerializer):
@@ -80,13 +80,14 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
         )
         return attrs
 
+    @atomic_with_retry()
     def create(self, validated_data):
-        with transaction.atomic():
-            book = validated_data.get("book")
-            borrowing = Borrowing.objects.create(**validated_data)
-            book.inventory -= 1
-            book.save()
-            return borrowing
+        book = validated_data.get("book")
+        if not Book.change_inventory(book.id, -1):
+            raise serializers.ValidationError(
+                f"Book '{book.title}' is out of stock"
+            )
+        return Borrowing.objects.create(**validated_data)
 
 
 class BorrowingReturnSerializer(BorrowingSerializer):
@@ -103,10 +104,15 @@ class BorrowingReturnSerializer(BorrowingSerializer):
 
         return attrs
 
+    @atomic_with_retry()
     def save(self, **kwargs):
-        with transaction.atomic():
-            book = self.instance.book
-            book.inventory += 1
-            book.save()
+        borrowing = Borrowing.objects.select_for_update().get(
+            pk=self.instance.pk
+        )
+        if borrowing.actual_return_date:
+            raise serializers.ValidationError(
+                "This borrowing has already been returned."
+            )
+        Book.change_inventory(borrowing.book_id, 1)
 
-            return super().save(**kwargs)
+        return super().save(**kwargs)
@@ -1,9 +1,23 @@
+from datetime import date
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable, Iterator, Optional, Sequence
+
 from celery import shared_task
-from django.db.models import Q
+from django.db import transaction
 from django.utils import timezone
 
-from borrowing_service.models import Borrowing
-from tgbot.notificator import send_notification
+from borrowing_service.models import Borrowing, Notification
+from library_project import metrics
+from tgbot.notificator import get_recipients, send_notification
+
+
+# Telegram rejects messages longer than 4096 characters
+MESSAGE_LIMIT = 4096
+
+OVERDUE_CHUNK_SIZE = 2000
+
+NOTIFICATION_BATCH_SIZE = 1000
 
 
 @shared_task
@@ -11,16 +25,178 @@ def send_notification_task(message: str) -> None:
     send_notification(message)
 
 
+def shorten(line: str, width: int) -> str:
+    return line if len(line) <= width else line[: width - 3] + "..."
+
+
+def overdue_report(
+    rows: Iterable[tuple[str, str, date]],
+    limit: int = MESSAGE_LIMIT,
+) -> Iterator[str]:
+    """
+    Pack (email, title, expected return date) rows, sorted by user, into
+    messages of at most `limit` characters, grouped by user. A user's
+    heading never ends a message without a line under it, and a user whose
+    borrowings continue in the next message is repeated there.
+    """
+    header = "Borrowings overdue:"
+    message = header
+    for email, borrowings in groupby(rows, key=itemgetter(0)):
+        continued = f"\n\n{email} (continued):"
+        width = limit - len(header) - len(continued) - 1
+        heading = f"\n\n{email}:"
+        for _, title, expected_return_date in borrowings:
+            line = shorten(
+                f"- '{title}' expected {expected_return_date}", width
+            )
+            if len(message) + len(heading) + len(line) + 1 > limit:
+                yield message
+                # "(continued)" only once lines of the user were sent
+                message = header if heading else header + continued
+            message += f"{heading}\n{line}"
+            heading = ""
+    if message != header:
+        yield message
+
+
 @shared_task
 def check_overdue_borrowings() -> None:
-    overdue_borrowings = Borrowing.objects.filter(
-        Q(expected_return_date__lt=timezone.now())
-        & Q(actual_return_date__isnull=True)
-    )
-    message = "No borrowings overdue today!"
-    if overdue_borrowings.exists():
-        borrowings_str = "\n".join(
-            str(borrowing) for borrowing in overdue_borrowings
+    overdue_rows = (
+        Borrowing.objects.filter(
+            actual_return_date__isnull=True,
+            expected_return_date__lt=timezone.now().date(),
         )
-        message = f"Borrowings overdue:\n{borrowings_str}"
-    send_notification(message)
+        .order_by("user_id", "expected_return_date")
+        .values_list("user__email", "book__title", "expected_return_date")
+        .iterator(chunk_size=OVERDUE_CHUNK_SIZE)
+    )
+    sent = 0
+    for message in overdue_report(overdue_rows):
+        send_notification(message)
+        sent += 1
+    if not sent:
+        send_notification("No borrowings overdue today!")
+
+
+def pack_messages(
+    lines: Sequence[str], header: str, limit: int = MESSAGE_LIMIT
+) -> Iterator[tuple[int, str]]:
+    """
+    Join lines under a header into messages of at most `limit` chars,
+    yielding (number of lines, message). "{count}" in the header is the
+    number of lines of that message.
+    """
+
+    def message(chunk: list[str]) -> tuple[int, str]:
+        return len(chunk), "\n".join([header.format(count=len(chunk))] + chunk)
+
+    widest = len(header.format(count=len(lines)))
+    width = limit - widest - 1
+    chunk: list[str] = []
+    length = widest
+    for line in lines:
+        line = shorten(line, width)
+        if chunk and length + len(line) + 1 > limit:
+            yield message(chunk)
+            chunk, length = [], widest
+        chunk.append(line)
+        length += len(line) + 1
+    if chunk:
+        yield message(chunk)
+
+
+def digests(
+    notifications: Sequence[Notification],
+) -> Iterator[tuple[Sequence[Notification], str]]:
+    """Pack notifications into digests, with the notifications of each"""
+    if len(notifications) == 1:
+        yield notifications, notifications[0].message
+        return
+
+    offset = 0
+    for count, message in pack_messages(
+        [f"- {notification}" for notification in notifications],
+        "{count} notifications:",
+    ):
+        yield notifications[offset:offset + count], message
+        offset += count
+
+
+@shared_task
+def flush_notifications() -> int:
+    """
+    Send buffered notifications as digests: everything queued since the
+    last run goes out in as few messages as Telegram allows. Records the
+    backlog and the age of its oldest message, which show whether the
+    digest keeps up.
+
+    A batch is claimed and deleted in a short transaction and sent after
+    it, so no lock is held during the HTTP calls. Notifications are queued
+    again for every chat a digest missed. When a digest to staff reaches
+    none of them, the rest is queued again as is for the next run.
+    Returns the number of notifications sent.
+    """
+    oldest = Notification.objects.order_by("id").first()
+    metrics.set_gauge("notifications:backlog", Notification.objects.count())
+    metrics.set_gauge(
+        "notifications:lag_seconds",
+        (timezone.now() - oldest.created_at).total_seconds()
+        if oldest
+        else 0,
+    )
+    if oldest is None:
+        return 0
+
+    # notifications queued again during this run wait for the next one
+    last_id = Notification.objects.order_by("-id").values_list(
+        "id", flat=True
+    )[0]
+    recipients = get_recipients()
+    flushed = 0
+    stopped = False
+    while not stopped:
+        with transaction.atomic():
+            batch = list(
+                Notification.objects.select_for_update(skip_locked=True)
+                .filter(id__lte=last_id)
+                .order_by("id")[:NOTIFICATION_BATCH_SIZE]
+            )
+            if not batch:
+                break
+            Notification.objects.filter(
+                pk__in=[notification.pk for notification in batch]
+            ).delete()
+
+        by_chat: dict[Optional[int], list[Notification]] = {}
+        for notification in batch:
+            by_chat.setdefault(notification.chat_id, []).append(notification)
+
+        sent = digests_sent = 0
+        requeued = []
+        for chat_id, notifications in by_chat.items():
+            chat_ids = recipients if chat_id is None else [chat_id]
+            unreachable = False
+            for chunk, message in digests(notifications):
+                failed_chats = chat_ids
+                if not (stopped or unreachable):
+                    failed_chats = send_notification(message, chat_ids)
+                if chat_ids and len(failed_chats) == len(chat_ids):
+                    # Telegram or the chat is down, retry it all later
+                    unreachable = True
+                    stopped = stopped or chat_id is None
+                    failed_chats = [chat_id]
+                else:
+                    sent += len(chunk)
+                    digests_sent += 1
+                requeued += [
+                    Notification(message=notification.message, chat_id=chat)
+                    for chat in failed_chats
+                    for notification in chunk
+                ]
+        Notification.objects.bulk_create(requeued)
+
+        flushed += sent
+        metrics.increment("notifications:sent", sent)
+        metrics.increment("notifications:digests", digests_sent)
+        metrics.increment("notifications:failed", len(requeued))
+    return flushed
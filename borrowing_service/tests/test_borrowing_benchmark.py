@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from library_project.benchmark import Recorder, find_regressions, percentile
+
+
+class FakeResponse:
+    def __init__(self, status_code: int) -> None:
+        self.status_code = status_code
+
+
+class BenchmarkTests(TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_recorder_counts_queries_and_errors(self):
+        recorder = Recorder()
+
+        def task(status_code):
+            def send():
+                get_user_model().objects.count()
+                return FakeResponse(status_code)
+
+            recorder.request("scenario:endpoint", send)
+
+        recorder.run("scenario", task, [200, 200, 500], concurrency=1)
+        stats = recorder.report()["scenario:endpoint"]
+
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["errors"], 1)
+        self.assertEqual(stats["queries"], 1.0)
+        self.assertGreater(stats["rps"], 0)
+
+    def test_find_regressions(self):
+        baseline = {
+            "scenario:endpoint": {"p95_ms": 10.0, "queries": 2.0, "errors": 0}
+        }
+
+        self.assertEqual(
+            find_regressions(
+                {
+                    "scenario:endpoint": {
+                        "p95_ms": 12.0,
+                        "queries": 2.0,
+                        "errors": 0,
+                    },
+                    "scenario:new": {"p95_ms": 99.0, "queries": 9, "errors": 0},
+                },
+                baseline,
+                tolerance=0.25,
+            ),
+            [],
+        )
+        regressions = find_regressions(
+            {
+                "scenario:endpoint": {
+                    "p95_ms": 13.0,
+                    "queries": 3.0,
+                    "errors": 1,
+                }
+            },
+            baseline,
+            tolerance=0.25,
+        )
+        self.assertEqual(len(regressions), 3)
@@ -0,0 +1,140 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books_service.models import Author, Book
+from borrowing_service.models import Borrowing
+
+BORROWING_URL = reverse("borrowing_service:borrowing-list")
+INVENTORY = 50
+BORROW_REQUESTS = 200
+WORKERS = 16
+SERIAL_REQUESTS = 20
+# parallel borrows may cost this many times a serial one before failing,
+# generous enough for slow machines, tight enough to catch lock convoys
+SLOWDOWN_LIMIT = 3
+
+
+def fake_stripe_session(request, borrowing, money_to_pay, **kwargs):
+    return SimpleNamespace(
+        id=f"cs_test_{borrowing.id}",
+        url=f"https://checkout.stripe.test/{borrowing.id}",
+        expires_at=int(timezone.now().timestamp()) + 3600,
+    )
+
+
+@skipUnlessDBFeature("has_select_for_update")
+@patch("payments_service.utils.create_stripe_session", fake_stripe_session)
+@patch("borrowing_service.signals.send_notification_task")
+class BorrowingConcurrencyTests(TransactionTestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email="testuser@example.com", password="testpassword"
+        )
+        self.book = Book.objects.create(
+            title="Popular Book",
+            author=Author.objects.create(first_name="Test", last_name="Test"),
+            cover="hard",
+            inventory=INVENTORY,
+            daily_fee=1.00,
+        )
+
+    def run_in_parallel(self, request, arguments, workers=WORKERS):
+        def worker(argument):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                return request(client, argument).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(worker, arguments))
+
+    def borrow(self, book, requests, workers=WORKERS):
+        """Statuses of borrowing the book, with the seconds they took"""
+        payload = {
+            "book": book.id,
+            "expected_return_date": str(
+                timezone.now().date() + timezone.timedelta(days=7)
+            ),
+        }
+        start = time.perf_counter()
+        statuses = self.run_in_parallel(
+            lambda client, _: client.post(
+                BORROWING_URL, payload, format="json"
+            ),
+            range(requests),
+            workers,
+        )
+        return statuses, time.perf_counter() - start
+
+    def test_parallel_borrow_and_return_keep_inventory_consistent(
+        self, mock_notification
+    ) -> None:
+        statuses, _ = self.borrow(self.book, BORROW_REQUESTS)
+
+        self.assertEqual(
+            statuses.count(status.HTTP_307_TEMPORARY_REDIRECT), INVENTORY
+        )
+        self.assertEqual(
+            statuses.count(status.HTTP_400_BAD_REQUEST),
+            BORROW_REQUESTS - INVENTORY,
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(Borrowing.objects.count(), INVENTORY)
+
+        borrowing_ids = list(Borrowing.objects.values_list("id", flat=True))
+        statuses = self.run_in_parallel(
+            lambda client, pk: client.post(
+                reverse("borrowing_service:order_return", args=[pk])
+            ),
+            borrowing_ids * 2,
+        )
+
+        self.assertEqual(statuses.count(status.HTTP_200_OK), INVENTORY)
+        self.assertEqual(
+            statuses.count(status.HTTP_400_BAD_REQUEST), INVENTORY
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, INVENTORY)
+        self.assertEqual(Borrowing.objects.count(), INVENTORY)
+        self.assertFalse(
+            Borrowing.objects.filter(actual_return_date__isnull=True).exists()
+        )
+
+    def test_parallel_borrows_are_not_slower_than_serial(
+        self, mock_notification
+    ) -> None:
+        other_book = Book.objects.create(
+            title="Another Book",
+            author=self.book.author,
+            cover="soft",
+            inventory=SERIAL_REQUESTS,
+            daily_fee=1.00,
+        )
+        statuses, serial = self.borrow(other_book, SERIAL_REQUESTS, 1)
+        self.assertEqual(
+            statuses.count(status.HTTP_307_TEMPORARY_REDIRECT),
+            SERIAL_REQUESTS,
+        )
+
+        statuses, parallel = self.borrow(self.book, BORROW_REQUESTS)
+
+        self.assertEqual(
+            statuses.count(status.HTTP_307_TEMPORARY_REDIRECT), INVENTORY
+        )
+        self.assertLess(
+            parallel / BORROW_REQUESTS,
+            serial / SERIAL_REQUESTS * SLOWDOWN_LIMIT,
+        )
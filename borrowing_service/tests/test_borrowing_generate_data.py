@@ -0,0 +1,103 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from books_service.models import Author, Book
+from borrowing_service.management.commands.generate_data import (
+    AUTHOR_COLUMNS,
+    BOOK_COLUMNS,
+    BORROWING_COLUMNS,
+    PAYMENT_COLUMNS,
+    USER_COLUMNS,
+)
+from borrowing_service.models import Borrowing
+from payments_service.models import Payment
+
+
+def generate(**options) -> None:
+    call_command(
+        "generate_data",
+        users=20,
+        authors=5,
+        books=50,
+        borrowings=300,
+        batch_size=64,
+        workers=1,
+        stdout=StringIO(),
+        **options,
+    )
+
+
+def snapshot() -> list:
+    return list(
+        Borrowing.objects.order_by("id").values_list(
+            "id",
+            "user_id",
+            "book_id",
+            "borrow_date",
+            "expected_return_date",
+            "actual_return_date",
+        )
+    )
+
+
+class GenerateDataCommandTests(TestCase):
+    def test_generates_requested_volume(self) -> None:
+        generate(seed=1)
+
+        self.assertEqual(get_user_model().objects.count(), 20)
+        self.assertEqual(Author.objects.count(), 5)
+        self.assertEqual(Book.objects.count(), 50)
+        self.assertEqual(Borrowing.objects.count(), 300)
+        self.assertGreaterEqual(Payment.objects.count(), 300)
+        self.assertTrue(
+            Borrowing.objects.filter(
+                actual_return_date__isnull=True,
+                expected_return_date__lt=timezone.now().date(),
+            ).exists()
+        )
+        self.assertTrue(Payment.objects.filter(type="fee").exists())
+        self.assertEqual(
+            sum(Author.objects.values_list("books_count", flat=True)), 50
+        )
+        user = get_user_model().objects.get(email="user1@email.com")
+        self.assertTrue(user.is_superuser)
+        self.assertTrue(user.check_password("GGduIU@"))
+
+    def test_same_seed_generates_same_data(self) -> None:
+        generate(seed=7)
+        first = snapshot()
+        for model in (get_user_model(), Author):
+            model.objects.all().delete()
+
+        generate(seed=7)
+        self.assertEqual(snapshot(), first)
+
+        for model in (get_user_model(), Author):
+            model.objects.all().delete()
+        generate(seed=8)
+        self.assertNotEqual(snapshot(), first)
+
+    def test_rows_fill_every_not_null_column(self) -> None:
+        # COPY lists its columns, Django defaults are not database defaults
+        tables = (
+            (get_user_model(), USER_COLUMNS),
+            (Author, AUTHOR_COLUMNS),
+            (Book, BOOK_COLUMNS),
+            (Borrowing, BORROWING_COLUMNS),
+            (Payment, PAYMENT_COLUMNS),
+        )
+        for model, columns in tables:
+            with self.subTest(model=model.__name__):
+                required = {
+                    field.column
+                    for field in model._meta.concrete_fields
+                    if not field.null and not field.primary_key
+                }
+                self.assertLessEqual(required, set(columns))
+
+        generate(seed=1)
+        self.assertFalse(Payment.objects.filter(session_attempts=0).exists())
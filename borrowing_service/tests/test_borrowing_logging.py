@@ -0,0 +1,131 @@
+import json
+import logging
+import queue
+import threading
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from library_project import log
+from library_project.log import (
+    DispatchListener,
+    JsonFormatter,
+    LoggerQueueHandler,
+    SamplingFilter,
+    payload,
+)
+
+
+class CollectingHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.add(threading.get_ident())
+
+
+class QueueLoggingTests(SimpleTestCase):
+    def setUp(self) -> None:
+        self.logger = logging.getLogger("test_queue_logging")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.collector = CollectingHandler()
+        self.handler = LoggerQueueHandler([self.collector])
+
+    def tearDown(self) -> None:
+        self.logger.handlers = []
+
+    def test_records_are_written_on_the_listener_thread(self):
+        self.handler.queue = queue.Queue(10)
+        listener = DispatchListener(self.handler.queue)
+        listener.start()
+        self.logger.addHandler(self.handler)
+        data = {"title": "Dune"}
+
+        self.logger.info(
+            "Created %s", "book", extra=payload(title=lambda: data["title"])
+        )
+        data["title"] = "changed after the call"
+        listener.stop()
+
+        record = self.collector.records[0]
+        self.assertEqual(record.getMessage(), "Created book")
+        self.assertEqual(record.payload, {"title": "Dune"})
+        self.assertNotIn(threading.get_ident(), self.collector.threads)
+
+    def test_full_queue_drops_records(self):
+        self.handler.queue = queue.Queue(1)
+        self.logger.addHandler(self.handler)
+        dropped = log.dropped_records
+
+        self.logger.info("first")
+        self.logger.info("second")
+
+        self.assertEqual(self.handler.queue.qsize(), 1)
+        self.assertEqual(log.dropped_records, dropped + 1)
+
+    def test_payload_is_not_built_for_disabled_levels(self):
+        self.handler.queue = queue.Queue(10)
+        self.logger.addHandler(self.handler)
+
+        def expensive():
+            raise AssertionError("payload of a disabled level was built")
+
+        self.logger.debug("skipped", extra=payload(data=expensive))
+
+        self.assertTrue(self.handler.queue.empty())
+
+    def test_json_formatter(self):
+        record = self.logger.makeRecord(
+            self.logger.name,
+            logging.INFO,
+            __file__,
+            1,
+            "Paid %s",
+            (7,),
+            None,
+            extra=payload(amount=lambda: 10),
+        )
+
+        entry = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(entry["message"], "Paid 7")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "test_queue_logging")
+        self.assertEqual(entry["payload"], {"amount": 10})
+
+    def test_sampling_keeps_warnings(self):
+        sampling = SamplingFilter({"noisy": 0, "noisy.kept": 1})
+
+        def record(name, level):
+            return logging.LogRecord(name, level, __file__, 1, "", (), None)
+
+        self.assertFalse(sampling.filter(record("noisy", logging.INFO)))
+        self.assertFalse(sampling.filter(record("noisy.child", logging.INFO)))
+        self.assertTrue(sampling.filter(record("noisy.kept", logging.INFO)))
+        self.assertTrue(sampling.filter(record("noisy", logging.WARNING)))
+        self.assertTrue(sampling.filter(record("quiet", logging.INFO)))
+
+
+class AuthenticationLogTests(TestCase):
+    def test_tokens_are_not_logged(self):
+        user = get_user_model().objects.create_user(
+            email="reader@example.com", password="testpassword"
+        )
+
+        with self.assertLogs("django.user", "INFO") as logs:
+            response = APIClient().post(
+                reverse("user:token_obtain_pair"),
+                {"email": "reader@example.com", "password": "testpassword"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(logs.records[0].payload, {"user_id": user.id})
+        self.assertNotIn(
+            response.data["access"], str(logs.records[0].__dict__)
+        )
@@ -0,0 +1,125 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from borrowing_service.tasks import check_overdue_borrowings
+from library_project import metrics
+
+
+METRICS_URL = reverse("metrics")
+
+
+@override_settings(METRICS_TOKEN="secret")
+class MetricsEndpointTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+
+    def scrape(self) -> str:
+        response = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return response.content.decode()
+
+    def test_request_latency_queries_and_cache(self):
+        self.client.get(reverse("books_service:books-list"))
+        self.client.get(reverse("books_service:books-list"))
+
+        body = self.scrape()
+        view = 'view="books_service:books-list"'
+        self.assertIn(
+            f"library_http_request_duration_ms_count{{{view}}} 2", body
+        )
+        self.assertIn(
+            f'library_http_request_duration_ms_bucket{{{view},le="+Inf"}} 2',
+            body,
+        )
+        self.assertIn(
+            f'library_http_responses_total{{{view},status="2xx"}} 2', body
+        )
+        self.assertIn(f"library_db_queries_total{{{view}}}", body)
+        self.assertIn(
+            'library_cache_requests_total{namespace="books",result="hits"} 1',
+            body,
+        )
+        self.assertIn(
+            'library_cache_hit_ratio{namespace="books"} 0.5', body
+        )
+
+    def test_celery_task_duration(self):
+        check_overdue_borrowings.apply()
+
+        body = self.scrape()
+        task = 'task="borrowing_service.tasks.check_overdue_borrowings"'
+        self.assertIn(f"library_celery_task_duration_ms_count{{{task}}} 1", body)
+        self.assertIn(
+            f'library_celery_tasks_total{{{task},state="success"}} 1', body
+        )
+        self.assertIn(
+            'task="borrowing_service.tasks.send_notification_task"', body
+        )
+        self.assertIn(
+            'task="payments_service.tasks.check_expired_payments"', body
+        )
+
+    def test_stripe_and_telegram_families(self):
+        metrics.increment("telegram:sent", 3)
+
+        body = self.scrape()
+        self.assertIn(
+            'library_stripe_request_duration_ms_count'
+            '{operation="session.create"} 0',
+            body,
+        )
+        self.assertIn(
+            'library_telegram_messages_total{result="sent"} 3', body
+        )
+
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 401)
+        response = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION="Bearer wrong"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_closed_without_token_outside_debug(self):
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(METRICS_URL).status_code, 200)
+
+
+class MetricsBufferTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    @override_settings(METRICS_FLUSH_INTERVAL=60)
+    def test_increments_are_written_in_batches(self):
+        metrics.flush()
+        metrics.increment("test:buffered")
+        metrics.increment("test:buffered", 2)
+
+        self.assertIsNone(cache.get("metrics:test:buffered"))
+        self.assertEqual(
+            metrics.get_counters(["test:buffered"]), {"test:buffered": 3}
+        )
+        self.assertEqual(cache.get("metrics:test:buffered"), 3)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in (5, 20, 20, 5000):
+            metrics.observe_ms("test:latency", value, (10, 100))
+
+        self.assertEqual(
+            metrics.get_histograms(["test:latency"], (10, 100)),
+            {
+                "test:latency": {
+                    "count": 4,
+                    "sum_ms": 5045,
+                    "le_10": 1,
+                    "le_100": 3,
+                }
+            },
+        )
@@ -0,0 +1,150 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from books_service import urls as books_urls
+from books_service.models import Author, Book, Subscription
+from borrowing_service import urls as borrowing_urls
+from borrowing_service.models import Borrowing
+from library_project import metrics
+from library_project.testing import QueryBudgetMixin
+from payments_service import urls as payments_urls
+from payments_service.models import Payment
+
+
+ROUTERS = (
+    ("books_service", books_urls.router),
+    ("borrowing_service", borrowing_urls.router),
+    ("payments", payments_urls.router),
+)
+
+# queries of a reader's request, whatever the number of rows returned;
+# every endpoint registered in ROUTERS needs an entry
+QUERY_BUDGETS = {
+    "books_service:books-list": 3,
+    "books_service:books-detail": 2,
+    "books_service:authors-list": 3,
+    "books_service:authors-detail": 2,
+    "books_service:feed-list": 2,
+    "borrowing_service:borrowing-list": 3,
+    "borrowing_service:borrowing-detail": 2,
+    "payments:payment-list": 2,
+    "payments:payment-detail": 1,
+}
+
+
+def registered_endpoints() -> list[str]:
+    endpoints = []
+    for namespace, router in ROUTERS:
+        for _, viewset, basename in router.registry:
+            endpoints.append(f"{namespace}:{basename}-list")
+            if hasattr(viewset, "retrieve"):
+                endpoints.append(f"{namespace}:{basename}-detail")
+    return endpoints
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.reader = get_user_model().objects.create_user(
+            email="reader@example.com", password="testpassword"
+        )
+        self.client.force_authenticate(self.reader)
+        self.objects = {}
+        today = timezone.now().date()
+        for number in range(3):
+            author = Author.objects.create(
+                first_name=f"First{number}", last_name=f"Last{number}"
+            )
+            Subscription.objects.create(author=author, user=self.reader)
+            for copy in range(3):
+                book = Book.objects.create(
+                    title=f"Book {number}-{copy}",
+                    author=author,
+                    cover="hard",
+                    inventory=5,
+                    daily_fee=1,
+                )
+                borrowing = Borrowing.objects.create(
+                    user=self.reader,
+                    book=book,
+                    expected_return_date=today + timezone.timedelta(days=7),
+                )
+                payment = Payment.objects.create(
+                    status="pending",
+                    type="payment",
+                    borrowing=borrowing,
+                    session_url="http://example.com/payment",
+                    session_id=f"cs_{borrowing.id}",
+                    money_to_pay=7,
+                )
+        self.objects = {
+            "books": book.id,
+            "authors": author.id,
+            "borrowing": borrowing.id,
+            "payment": payment.id,
+        }
+
+    def url(self, endpoint: str) -> str:
+        if endpoint.endswith("-detail"):
+            basename = endpoint.split(":")[1].rsplit("-", 1)[0]
+            return reverse(endpoint, args=[self.objects[basename]])
+        return reverse(endpoint)
+
+    def test_every_endpoint_has_a_budget(self):
+        self.assertEqual(
+            sorted(registered_endpoints()), sorted(QUERY_BUDGETS)
+        )
+
+    def test_endpoints_stay_within_budget(self):
+        for endpoint in registered_endpoints():
+            with self.subTest(endpoint=endpoint):
+                response = self.assertQueryBudget(
+                    QUERY_BUDGETS[endpoint],
+                    lambda: self.client.get(self.url(endpoint)),
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_detail_serializers_do_not_load_authors_one_by_one(self):
+        response = self.assertQueryBudget(
+            QUERY_BUDGETS["borrowing_service:borrowing-detail"],
+            lambda: self.client.get(
+                self.url("borrowing_service:borrowing-detail")
+            ),
+        )
+        self.assertEqual(
+            response.data["book"]["author_full_name"], "First2 Last2"
+        )
+
+    @override_settings(QUERY_PROFILING=True, QUERY_HEADERS=True)
+    def test_middleware_reports_queries(self):
+        response = self.client.get(reverse("payments:payment-list"))
+        view = "payments:payment-list"
+
+        self.assertEqual(
+            int(response["X-DB-Queries"]),
+            metrics.get_counters([f"queries:{view}:count"])[
+                f"queries:{view}:count"
+            ],
+        )
+        self.assertGreater(int(response["X-DB-Queries"]), 0)
+        self.assertIn("X-DB-Time-Ms", response)
+        self.assertEqual(response["X-DB-Duplicate-Queries"], "0")
+
+    @override_settings(QUERY_PROFILING=True, QUERY_HEADERS=False)
+    def test_query_headers_need_opt_in(self):
+        response = self.client.get(reverse("payments:payment-list"))
+        view = "payments:payment-list"
+
+        self.assertNotIn("X-DB-Queries", response)
+        self.assertNotIn("X-DB-Time-Ms", response)
+        self.assertGreater(
+            metrics.get_counters([f"queries:{view}:count"])[
+                f"queries:{view}:count"
+            ],
+            0,
+        )
@@ -0,0 +1,166 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from books_service.cache import invalidate_catalog_cache
+from books_service.models import Author, Book
+from borrowing_service.models import Borrowing
+from library_project.db_router import read_from_replicas
+
+
+REPLICA = "replica_test"
+BOOKS_URL = reverse("books_service:books-list")
+AUTHORS_URL = reverse("books_service:authors-list")
+BORROWINGS_URL = reverse("borrowing_service:borrowing-list")
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    The primary and a separate replica database hold different rows, so
+    every response shows which of them served it
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # the alias only exists for this class, the test runner does
+        # not create its database
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        connections.settings[REPLICA] = {
+            **primary,
+            "TEST": {**primary["TEST"], "NAME": None},
+        }
+        connections[REPLICA].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        cls.databases = {DEFAULT_DB_ALIAS, REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].creation.destroy_test_db(
+            connections[REPLICA].settings_dict["NAME"], verbosity=0
+        )
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="reader@example.com", password="testpassword"
+        )
+        self.author = Author.objects.create(
+            first_name="Frank", last_name="Herbert"
+        )
+        self.book = Book.objects.create(
+            title="On the primary",
+            author=self.author,
+            cover="hard",
+            inventory=5,
+            daily_fee=1,
+        )
+        # rows the replica has "replicated", written without signals
+        get_user_model().objects.using(REPLICA).bulk_create(
+            [get_user_model()(id=self.user.id, email=self.user.email)]
+        )
+        Author.objects.using(REPLICA).bulk_create(
+            [Author(id=self.author.id, first_name="Frank", last_name="H.")]
+        )
+        Book.objects.using(REPLICA).bulk_create(
+            [
+                Book(
+                    id=self.book.id,
+                    title="On the replica",
+                    author_id=self.author.id,
+                    cover="hard",
+                    inventory=5,
+                    daily_fee=1,
+                )
+            ]
+        )
+
+    def tearDown(self) -> None:
+        # flush skips tables the router does not migrate, replicas included
+        with override_settings(DATABASE_REPLICAS=[]):
+            call_command(
+                "flush",
+                database=REPLICA,
+                interactive=False,
+                inhibit_post_migrate=True,
+                verbosity=0,
+            )
+
+    def titles(self, response) -> list[str]:
+        return [book["title"] for book in response.data["results"]]
+
+    def test_router(self):
+        self.assertEqual(router.db_for_read(Book), DEFAULT_DB_ALIAS)
+        with read_from_replicas():
+            self.assertEqual(router.db_for_read(Book), REPLICA)
+            book = Book.objects.get(pk=self.book.pk)
+            self.assertEqual(
+                router.db_for_write(Book, instance=book), DEFAULT_DB_ALIAS
+            )
+        self.assertFalse(router.allow_migrate(REPLICA, "books_service"))
+
+    def test_catalog_is_read_from_replica(self):
+        response = self.client.get(BOOKS_URL)
+        self.assertEqual(self.titles(response), ["On the replica"])
+
+        response = self.client.get(
+            reverse("books_service:books-detail", args=[self.book.id])
+        )
+        self.assertEqual(response.data["title"], "On the replica")
+
+    def test_write_pins_client_to_primary(self):
+        admin = get_user_model().objects.create_superuser(
+            email="admin@example.com", password="testpassword"
+        )
+        self.client.force_authenticate(admin)
+
+        response = self.client.post(
+            AUTHORS_URL, {"first_name": "Ursula", "last_name": "Le Guin"}
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("primary_pin", response.cookies)
+        response = self.client.get(AUTHORS_URL)
+        self.assertEqual(
+            sorted(author["last_name"] for author in response.data["results"]),
+            ["Herbert", "Le Guin"],
+        )
+
+    def test_only_history_lists_use_replica(self):
+        today = datetime.date.today()
+        borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=today + datetime.timedelta(days=3),
+        )
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(BORROWINGS_URL)
+        self.assertEqual(response.data["results"], [])
+
+        response = self.client.get(
+            reverse("borrowing_service:borrowing-detail", args=[borrowing.id])
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_fresh_changes_read_from_replica_are_not_cached(self):
+        invalidate_catalog_cache("books", everything=True)
+
+        self.assertEqual(self.client.get(BOOKS_URL)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(BOOKS_URL)["X-Cache"], "MISS")
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.client.get(BOOKS_URL)
+            self.assertEqual(self.client.get(BOOKS_URL)["X-Cache"], "HIT")
@@ -0,0 +1,186 @@
+from datetime import date
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from books_service.models import Author, Book
+from borrowing_service.models import Borrowing, Notification
+from borrowing_service.notifications import queue_notification
+from borrowing_service.tasks import (
+    check_overdue_borrowings,
+    flush_notifications,
+    overdue_report,
+    pack_messages,
+)
+from library_project import metrics
+
+
+class OverdueBorrowingsTests(TestCase):
+    def setUp(self) -> None:
+        author = Author.objects.create(first_name="Test", last_name="Test")
+        today = timezone.now().date()
+        for index in range(3):
+            user = get_user_model().objects.create_user(
+                email=f"user{index}@test.com", password="test123"
+            )
+            for number in range(2):
+                book = Book.objects.create(
+                    title=f"Book {index}-{number}",
+                    author=author,
+                    cover="hard",
+                    inventory=4,
+                    daily_fee=1.00,
+                )
+                Borrowing.objects.create(
+                    expected_return_date=today, book=book, user=user
+                )
+        Borrowing.objects.update(
+            expected_return_date=today - timezone.timedelta(days=2)
+        )
+        Borrowing.objects.filter(user__email="user2@test.com").update(
+            actual_return_date=today
+        )
+
+    @patch("borrowing_service.tasks.send_notification")
+    def test_overdue_report_in_one_query(self, mock_send) -> None:
+        with self.assertNumQueries(1):
+            check_overdue_borrowings()
+
+        message = mock_send.call_args.args[0]
+        self.assertEqual(mock_send.call_count, 1)
+        self.assertIn("user0@test.com:\n- 'Book 0-0'", message)
+        self.assertIn("user1@test.com", message)
+        self.assertNotIn("user2@test.com", message)
+
+    @patch("borrowing_service.tasks.send_notification")
+    def test_no_overdue_borrowings(self, mock_send) -> None:
+        Borrowing.objects.update(actual_return_date=timezone.now().date())
+
+        check_overdue_borrowings()
+
+        mock_send.assert_called_once_with("No borrowings overdue today!")
+
+    def test_report_split_into_message_chunks(self) -> None:
+        rows = [
+            ("user@test.com", f"Book {index}", date(2024, 1, 1))
+            for index in range(50)
+        ]
+
+        messages = list(overdue_report(rows, limit=200))
+
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(all(len(message) <= 200 for message in messages))
+        self.assertIn("user@test.com (continued):", messages[1])
+        self.assertEqual(
+            sum(message.count("\n- ") for message in messages), 50
+        )
+
+    def test_report_message_boundary(self) -> None:
+        email = "a" * 60 + "@example.com"
+        for count in range(100, 130):
+            rows = [
+                ("first@test.com", f"Book {index:03}", date(2024, 1, 1))
+                for index in range(count)
+            ] + [(email, "Last book", date(2024, 1, 1))]
+
+            with self.subTest(count=count):
+                messages = list(overdue_report(rows))
+
+                self.assertTrue(all(len(m) <= 4096 for m in messages))
+                self.assertFalse(any(m.endswith(":") for m in messages))
+                self.assertNotIn(f"{email} (continued)", "".join(messages))
+                self.assertEqual(
+                    sum(m.count("\n- ") for m in messages), count + 1
+                )
+
+    def test_overlong_line_is_truncated(self) -> None:
+        rows = [("user@test.com", "x" * 300, date(2024, 1, 1))]
+
+        messages = list(overdue_report(rows, limit=200))
+
+        self.assertEqual(len(messages), 1)
+        self.assertLessEqual(len(messages[0]), 200)
+        self.assertTrue(messages[0].endswith("..."))
+
+
+@patch("borrowing_service.tasks.send_notification")
+class NotificationDigestTests(TestCase):
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=60)
+    def test_buffered_notifications_sent_as_one_digest(self, mock_send):
+        for index in range(3):
+            queue_notification(f"{index}0.00$ for borrowing {index} were paid")
+        mock_send.assert_not_called()
+
+        self.assertEqual(flush_notifications(), 3)
+
+        mock_send.assert_called_once()
+        digest = mock_send.call_args.args[0]
+        self.assertTrue(digest.startswith("3 notifications:"))
+        self.assertIn("- 20.00$ for borrowing 2 were paid", digest)
+        self.assertFalse(Notification.objects.exists())
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=0)
+    @patch("borrowing_service.notifications.send_notification_task")
+    def test_no_window_sends_on_commit(self, mock_task, mock_send):
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_notification("Paid")
+
+        mock_task.delay.assert_called_once_with("Paid")
+        self.assertFalse(Notification.objects.exists())
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=60)
+    @patch("borrowing_service.tasks.get_recipients", return_value=[1, 2])
+    def test_undelivered_notifications_stay_queued(
+        self, mock_recipients, mock_send
+    ):
+        cache.clear()
+        for index in range(5):
+            queue_notification(f"{index}" * 1000)
+        # the first digest misses a chat, the second reaches none of them
+        mock_send.side_effect = [[2], [1, 2]]
+
+        self.assertEqual(flush_notifications(), 4)
+
+        self.assertEqual(mock_send.call_count, 2)
+        self.assertEqual(
+            list(Notification.objects.values_list("chat_id", "message")),
+            [(2, f"{index}" * 1000) for index in range(4)]
+            + [(None, "4" * 1000)],
+        )
+        self.assertEqual(
+            metrics.get_counters(["notifications:failed"]),
+            {"notifications:failed": 5},
+        )
+
+        mock_send.side_effect = None
+        mock_send.return_value = []
+        self.assertEqual(flush_notifications(), 5)
+        self.assertEqual(
+            [call.args[1] for call in mock_send.call_args_list[2:]],
+            [[2], [1, 2]],
+        )
+        self.assertFalse(Notification.objects.exists())
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=60)
+    def test_batch_claimed_before_sending(self, mock_send):
+        queue_notification("Paid")
+        mock_send.side_effect = lambda message, recipients: (
+            self.assertFalse(Notification.objects.exists()) or []
+        )
+
+        self.assertEqual(flush_notifications(), 1)
+
+    def test_digest_parts_count_their_own_lines(self, mock_send):
+        lines = [f"- notification {index}" for index in range(10)]
+
+        messages = list(pack_messages(lines, "{count} notifications:", 80))
+
+        self.assertGreater(len(messages), 1)
+        self.assertEqual(sum(count for count, _ in messages), 10)
+        for count, message in messages:
+            self.assertLessEqual(len(message), 80)
+            self.assertTrue(message.startswith(f"{count} notifications:"))
+            self.assertEqual(message.count("\n- "), count)
@@ -175,3 +175,25 @@ class AuthenticatedBorrowingViewSetTests(TestCase):
         )
         res = self.client.post(url)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_borrowings_cursor_pagination(self) -> None:
+        for days in range(30):
+            sample_borrowing(
+                self.user,
+                self.book,
+                timezone.now().date() + timezone.timedelta(days=days % 4),
+            )
+        expected = list(
+            Borrowing.objects.order_by(
+                "expected_return_date", "id"
+            ).values_list("id", flat=True)
+        )
+
+        res = self.client.get(BORROWING_URL, {"pagination": "cursor"})
+        ids = [borrowing["id"] for borrowing in res.data["results"]]
+        res = self.client.get(res.data["next"])
+        ids += [borrowing["id"] for borrowing in res.data["results"]]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data["next"])
+        self.assertEqual(ids, expected)
@@ -12,6 +12,7 @@ from rest_framework_simplejwt.views import status
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
 from borrowing_service.models import Borrowing
+from library_project.log import payload
 from library_project.permissions import IsOwnerOrAdmin
 from borrowing_service.serializers.common import (
     BorrowingSerializer,
@@ -21,7 +22,10 @@ from borrowing_service.serializers.common import (
     BorrowingReturnSerializer,
 )
 from payments_service.models import Payment
-from payments_service.utils import create_stripe_session
+from payments_service.utils import (
+    payment_session_response,
+    start_payment_session,
+)
 
 
 logger = logging.getLogger("borrowing_service")
@@ -47,21 +51,19 @@ class ReturnBorrowingView(APIView):
                     * borrowing.book.daily_fee
                     * settings.FINE_MULTIPLIER
                 )
-                session = create_stripe_session(
-                    request, borrowing, money_to_pay
-                )
-                Payment.objects.create(
-                    type="fine",
-                    borrowing=borrowing,
-                    session_url=session.url,
-                    session_id=session.id,
-                    expires_at=session.expires_at,
+                payment = start_payment_session(
+                    request,
+                    Payment(
+                        type="fine",
+                        borrowing=borrowing,
+                        money_to_pay=money_to_pay,
+                    ),
                 )
-                return Response(
-                    {"session_url": session},
-                    status=status.HTTP_307_TEMPORARY_REDIRECT,
-                )
-            logger.info("Returned borrowing successful", serializer.data)
+                return payment_session_response(request, payment)
+            logger.info(
+                "Returned borrowing successful",
+                extra=payload(data=lambda: serializer.data),
+            )
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -73,11 +75,13 @@ class BorrowingViewSet(
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = Borrowing.objects.select_related("book").prefetch_related(
-        "payments"
-    )
+    queryset = Borrowing.objects.select_related(
+        "book__author"
+    ).prefetch_related("payments")
     serializer_class = BorrowingSerializer
     permission_classes = (IsAuthenticated, IsOwnerOrAdmin)
+    keyset_ordering = ("expected_return_date", "id")
+    replica_actions = ("list",)
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -120,21 +124,19 @@ class BorrowingViewSet(
         money_to_pay = (
             borrowing.expected_return_date - borrowing.borrow_date
         ).days * borrowing.book.daily_fee
-        session = create_stripe_session(request, borrowing, money_to_pay)
-        logger.info(
-            "Created borrowing successful, expect payment", serializer.data
-        )
-        Payment.objects.create(
-            type="payment",
-            borrowing=borrowing,
-            session_url=session.url,
-            session_id=session.id,
-            expires_at=session.expires_at,
+        payment = start_payment_session(
+            request,
+            Payment(
+                type="payment",
+                borrowing=borrowing,
+                money_to_pay=money_to_pay,
+            ),
         )
-        return Response(
-            {"session_url": session.url},
-            status=status.HTTP_307_TEMPORARY_REDIRECT,
+        logger.info(
+            "Created borrowing successful, expect payment",
+            extra=payload(data=lambda: serializer.data),
         )
+        return payment_session_response(request, payment)
 
     @extend_schema(
         parameters=[
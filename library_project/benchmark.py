@@ -0,0 +1,161 @@
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(values: list[float], share: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not values:
+        return 0.0
+    return values[max(math.ceil(share * len(values)) - 1, 0)]
+
+
+def recycle_connections() -> None:
+    """
+    What the request_started and request_finished handlers of a server
+    do, applying CONN_MAX_AGE and CONN_HEALTH_CHECKS. Connections inside
+    a transaction, e.g. of a TestCase, are left open.
+    """
+    for alias_connection in connections.all(initialized_only=True):
+        if not alias_connection.in_atomic_block:
+            alias_connection.close_if_unusable_or_obsolete()
+
+
+class Recorder:
+    """
+    Latency, query count and status of every request of a benchmark,
+    grouped by "<scenario>:<endpoint>". Safe to use from several threads.
+    """
+
+    def __init__(self) -> None:
+        self.samples: dict[str, list[tuple[float, int]]] = {}
+        self.errors: dict[str, int] = {}
+        self.wall_time: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def request(
+        self,
+        name: str,
+        send: Callable,
+        expected: Iterable[int] = (200,),
+    ):
+        # the test client skips the connection handling of a server, so
+        # connection setup is measured as well
+        start = time.perf_counter()
+        recycle_connections()
+        with CaptureQueriesContext(connection) as queries:
+            response = send()
+        elapsed = (time.perf_counter() - start) * 1000
+        recycle_connections()
+        with self.lock:
+            self.samples.setdefault(name, []).append(
+                (elapsed, len(queries))
+            )
+            if response.status_code not in expected:
+                self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+    def run(
+        self,
+        scenario: str,
+        task: Callable,
+        arguments: list,
+        concurrency: int,
+    ) -> list:
+        """Call task for every argument, `concurrency` at a time"""
+
+        def worker(argument):
+            try:
+                return task(argument)
+            finally:
+                if concurrency > 1:
+                    connections.close_all()
+
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(worker, arguments))
+        else:
+            results = [worker(argument) for argument in arguments]
+        self.wall_time[scenario] = time.perf_counter() - start
+        return results
+
+    def report(self) -> dict[str, dict]:
+        """
+        Per endpoint statistics; rps is the throughput of the whole
+        scenario the endpoint was called in
+        """
+        totals = {}
+        for name, samples in self.samples.items():
+            scenario = name.split(":", 1)[0]
+            totals[scenario] = totals.get(scenario, 0) + len(samples)
+
+        report = {}
+        for name, samples in sorted(self.samples.items()):
+            latencies = sorted(latency for latency, _ in samples)
+            scenario = name.split(":", 1)[0]
+            wall_time = self.wall_time.get(scenario)
+            report[name] = {
+                "requests": len(samples),
+                "errors": self.errors.get(name, 0),
+                "p50_ms": round(percentile(latencies, 0.5), 2),
+                "p95_ms": round(percentile(latencies, 0.95), 2),
+                "p99_ms": round(percentile(latencies, 0.99), 2),
+                "queries": round(
+                    sum(queries for _, queries in samples) / len(samples), 2
+                ),
+                "rps": round(totals[scenario] / wall_time, 1)
+                if wall_time
+                else None,
+            }
+        return report
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    try:
+        with open(path) as stream:
+            return json.load(stream)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path: str, report: dict) -> None:
+    with open(path, "w") as stream:
+        json.dump(report, stream, indent=2, sort_keys=True)
+        stream.write("\n")
+
+
+def find_regressions(
+    report: dict, baseline: dict, tolerance: float
+) -> list[str]:
+    """
+    Endpoints whose p95 latency grew by more than `tolerance` (a share of
+    the baseline) or which issue more queries per request than before
+    """
+    regressions = []
+    for name, stats in report.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {stats['p95_ms']} ms, "
+                f"baseline {base['p95_ms']} ms"
+            )
+        if stats["queries"] > base["queries"] + 0.5:
+            regressions.append(
+                f"{name}: {stats['queries']} queries per request, "
+                f"baseline {base['queries']}"
+            )
+        if stats["errors"] > base["errors"]:
+            regressions.append(
+                f"{name}: {stats['errors']} errors, "
+                f"baseline {base['errors']}"
+            )
+    return regressions
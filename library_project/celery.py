@@ -1,6 +1,10 @@
 import os
+import time
 
 from celery import Celery
+from celery.signals import task_postrun, task_prerun
+
+from library_project import metrics
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_project.settings")
 
@@ -9,3 +13,29 @@ app = Celery("library_project")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks()
+
+TASK_BUCKETS_MS = (100, 500, 1000, 5000, 15000, 60000, 300000)
+
+_task_started: dict[str, float] = {}
+
+
+@task_prerun.connect
+def start_task_timer(task_id: str, **kwargs) -> None:
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_metrics(task_id: str, task, state: str, **kwargs) -> None:
+    """
+    Duration and outcome of every task; the worker writes them to the
+    shared store right away, as it may stay idle until the next task
+    """
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        metrics.observe_ms(
+            f"celery:{task.name}:duration",
+            (time.perf_counter() - started) * 1000,
+            TASK_BUCKETS_MS,
+        )
+    metrics.increment(f"celery:{task.name}:{(state or 'unknown').lower()}")
+    metrics.flush()
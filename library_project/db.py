@@ -0,0 +1,45 @@
+import logging
+import random
+import time
+from functools import wraps
+
+from django.db import OperationalError, connection, transaction
+
+
+logger = logging.getLogger("library_project")
+
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.05
+
+
+def atomic_with_retry(
+    attempts: int = RETRY_ATTEMPTS, backoff: float = RETRY_BACKOFF
+):
+    """
+    Run the decorated function in its own transaction and retry it with
+    jittered exponential backoff on lock timeouts, deadlocks and
+    serialization failures. Inside an outer transaction the error is
+    re-raised at once, as only the outermost block can be retried.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                nested = connection.in_atomic_block
+                try:
+                    with transaction.atomic():
+                        return func(*args, **kwargs)
+                except OperationalError:
+                    if nested or attempt == attempts:
+                        raise
+                    delay = backoff * 2 ** (attempt - 1)
+                    logger.warning(
+                        f"Retrying {func.__qualname__} after "
+                        f"transaction conflict (attempt {attempt})"
+                    )
+                    time.sleep(random.uniform(0, delay))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,102 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+
+_replica_reads: ContextVar[bool] = ContextVar("replica_reads", default=False)
+
+
+def replica_reads_active() -> bool:
+    return _replica_reads.get() and bool(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def read_from_replicas():
+    """Send the reads of the block to a replica, writes stay on default"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Reads go to a random DATABASE_REPLICAS alias inside
+    read_from_replicas(), everything else to the primary. Replicas get
+    their schema by replication, so they are never migrated.
+    """
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        if replica_reads_active():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints) -> str:
+        # objects read from a replica would be saved back to it otherwise
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints) -> Optional[bool]:
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Run safe requests of the actions a viewset lists in
+    `replica_actions` against the replicas. A successful write pins the
+    client to the primary for REPLICA_PIN_SECONDS with a cookie, so
+    users read their own borrowings and payments before replication
+    catches up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            token = getattr(request, "_replica_reads_token", None)
+            if token is not None:
+                _replica_reads.reset(token)
+
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            not settings.DATABASE_REPLICAS
+            or request.method not in SAFE_METHODS
+            or settings.REPLICA_PIN_COOKIE in request.COOKIES
+        ):
+            return None
+        view_class = getattr(view_func, "cls", None)
+        actions = getattr(view_func, "actions", None) or {}
+        action = actions.get(request.method.lower())
+        if action in getattr(view_class, "replica_actions", ()):
+            request._replica_reads_token = _replica_reads.set(True)
+        return None
@@ -0,0 +1,180 @@
+import atexit
+import copy
+import json
+import logging
+import logging.config
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from django.conf import settings
+
+
+_listener: Optional["DispatchListener"] = None
+_handlers: list["LoggerQueueHandler"] = []
+dropped_records = 0
+
+
+def payload(**values) -> dict:
+    """
+    `extra` carrying structured data for JSON logs. Callable values are
+    only called once the record passed the level check, e.g.
+    logger.info("Created user", extra=payload(data=lambda: s.data))
+    """
+    return {"payload": values}
+
+
+def resolve_payload(record: logging.LogRecord) -> None:
+    values = getattr(record, "payload", None)
+    if values:
+        record.payload = {
+            name: value() if callable(value) else value
+            for name, value in values.items()
+        }
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the record's payload"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        resolve_payload(record)
+        entry = {
+            "time": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "location": f"{record.filename}:{record.lineno}",
+        }
+        if getattr(record, "payload", None):
+            entry["payload"] = record.payload
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a share of INFO and DEBUG records of the loggers in `rates`
+    ({"logger name": share}, the longest matching name wins); warnings
+    and errors always pass
+    """
+
+    def __init__(self, rates: dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+
+    def rate(self, name: str) -> float:
+        matches = [
+            logger
+            for logger in self.rates
+            if name == logger or name.startswith(f"{logger}.")
+        ]
+        return self.rates[max(matches, key=len)] if matches else 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        return random.random() < self.rate(record.name)
+
+
+class LoggerQueueHandler(QueueHandler):
+    """
+    Stand-in for a logger's handlers: records are prepared on the
+    calling thread and written by those handlers on the listener thread.
+    A full queue drops the record instead of blocking the caller.
+    """
+
+    def __init__(self, targets: list) -> None:
+        # the queue is set by the listener
+        super().__init__(None)
+        self.targets = targets
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        resolve_payload(record)
+        # arguments may change once the caller moves on, the message
+        # is rendered now; exc_info stays for the handlers' tracebacks
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.targets = self.targets
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global dropped_records
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records += 1
+
+
+class DispatchListener(QueueListener):
+    """Single thread writing every queued record to its own handlers"""
+
+    def handle(self, record: logging.LogRecord) -> None:
+        for handler in record.targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def _start_listener() -> None:
+    global _listener
+    log_queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    for handler in _handlers:
+        handler.queue = log_queue
+    _listener = DispatchListener(log_queue)
+    _listener.start()
+
+
+def stop_queue_logging() -> None:
+    """Write what is still queued and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configured_loggers() -> list[logging.Logger]:
+    return [logging.getLogger()] + [
+        logger
+        for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger) and logger.handlers
+    ]
+
+
+def start_queue_logging() -> None:
+    """Move the handlers of every configured logger behind the queue"""
+    for logger in configured_loggers():
+        if logger.handlers and not any(
+            isinstance(handler, LoggerQueueHandler)
+            for handler in logger.handlers
+        ):
+            handler = LoggerQueueHandler(logger.handlers[:])
+            _handlers.append(handler)
+            logger.handlers = [handler]
+    _start_listener()
+    atexit.register(stop_queue_logging)
+    # threads do not survive fork: worker processes need their own
+    os.register_at_fork(after_in_child=_start_listener)
+
+
+def configure_logging(config: dict) -> None:
+    """
+    LOGGING_CONFIG: dictConfig, then the queue and sampling, which is
+    applied before records are queued
+    """
+    logging.config.dictConfig(config)
+    if settings.LOG_QUEUE:
+        start_queue_logging()
+    if settings.LOG_SAMPLING:
+        sampling = SamplingFilter(settings.LOG_SAMPLING)
+        for logger in configured_loggers():
+            for handler in logger.handlers:
+                handler.addFilter(sampling)
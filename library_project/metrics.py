@@ -0,0 +1,110 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+logger = logging.getLogger("library_project")
+
+METRICS_PREFIX = "metrics"
+
+_pending: Counter = Counter()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _key(name: str) -> str:
+    return f"{METRICS_PREFIX}:{name}"
+
+
+def _add(name: str, delta: int) -> None:
+    key = _key(name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+
+def increment(name: str, delta: int = 1) -> None:
+    """
+    Add to a counter kept in the shared cache, so web and worker
+    processes report the same numbers. Increments are summed in the
+    process and written every METRICS_FLUSH_INTERVAL seconds, which
+    keeps per-request counters from costing a cache round trip each.
+    """
+    if not settings.METRICS_FLUSH_INTERVAL:
+        _add(name, delta)
+        return
+
+    with _lock:
+        _pending[name] += delta
+        elapsed = time.monotonic() - _last_flush
+    if elapsed >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def flush() -> None:
+    """Write the increments summed in this process to the cache"""
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    try:
+        for name, delta in pending.items():
+            _add(name, delta)
+    except Exception:
+        logger.exception("Could not write metrics")
+
+
+atexit.register(flush)
+
+
+def observe_ms(name: str, value_ms: float, buckets: tuple[int, ...]) -> None:
+    """
+    Record a duration in a histogram: call count, total milliseconds and
+    the first bucket the value fits in ("<name>:le_<ms>"); values above
+    the last bucket are only in the count.
+    """
+    increment(f"{name}:count")
+    increment(f"{name}:sum_ms", int(value_ms))
+    for bucket in buckets:
+        if value_ms <= bucket:
+            increment(f"{name}:le_{bucket}")
+            break
+
+
+def set_gauge(name: str, value: float) -> None:
+    cache.set(_key(name), value, timeout=None)
+
+
+def get_counters(names: list[str]) -> dict[str, int]:
+    flush()
+    values = cache.get_many([_key(name) for name in names])
+    return {name: values.get(_key(name), 0) for name in names}
+
+
+def get_histograms(
+    names: list[str], buckets: tuple[int, ...]
+) -> dict[str, dict]:
+    """
+    Histograms recorded with observe_ms, with cumulative buckets:
+    {"count", "sum_ms", "le_<ms>": values not above <ms>}
+    """
+    fields = ["count", "sum_ms"] + [f"le_{bucket}" for bucket in buckets]
+    values = get_counters(
+        [f"{name}:{field}" for name in names for field in fields]
+    )
+    histograms = {}
+    for name in names:
+        histogram = {field: values[f"{name}:{field}"] for field in fields}
+        cumulative = 0
+        for bucket in buckets:
+            cumulative += histogram[f"le_{bucket}"]
+            histogram[f"le_{bucket}"] = cumulative
+        histograms[name] = histogram
+    return histograms
@@ -0,0 +1,231 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over the composite `keyset_ordering` of a view.
+
+    The cursor holds the ordering values of the last (or first) row of
+    the page, so every page is a single index range scan regardless of
+    how deep it is and no COUNT(*) is issued. Ordering fields must be
+    non-nullable and end with a unique field (usually "id").
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = tuple(view.keyset_ordering)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._reverse_field(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(ordering, position)
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            }
+        ]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    @staticmethod
+    def _reverse_field(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def get_keyset_filter(ordering, position):
+        """
+        Row comparison `(a, b, c) > (x, y, z)` expanded into lookups, with
+        a leading `a >= x` bound so the index range scan starts at x.
+        """
+        keyset = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            keyset |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+
+        first = ordering[0]
+        bound = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{first.lstrip('-')}__{bound}": position[0]}) & keyset
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            position = cursor["p"]
+            reverse = bool(cursor.get("r"))
+        except (
+            BinasciiError,
+            KeyError,
+            TypeError,
+            UnicodeError,
+            ValueError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, reverse
+
+    def encode_cursor(self, instance, reverse):
+        cursor = {
+            "p": [
+                getattr(instance, field.lstrip("-"))
+                for field in self.ordering
+            ],
+        }
+        if reverse:
+            cursor["r"] = 1
+
+        encoded = urlsafe_b64encode(
+            json.dumps(cursor, default=str).encode("ascii")
+        ).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """
+    Page number pagination by default. Views with `keyset_ordering` switch
+    to KeysetPagination on `?pagination=cursor` or when a cursor is passed.
+    Query params that impose their own ordering are listed in the view's
+    `keyset_excluded_params` and rejected with keyset pagination.
+    """
+
+    pagination_query_param = "pagination"
+    keyset_pagination_class = KeysetPagination
+    keyset = None
+
+    def use_keyset(self, request, view):
+        if getattr(view, "keyset_ordering", None) is None:
+            return False
+
+        keyset = (
+            request.query_params.get(self.pagination_query_param) == "cursor"
+            or self.keyset_pagination_class.cursor_query_param
+            in request.query_params
+        )
+        if keyset:
+            for param in getattr(view, "keyset_excluded_params", ()):
+                if param in request.query_params:
+                    raise serializers.ValidationError(
+                        {
+                            param: "Cannot be combined with "
+                            "cursor pagination."
+                        }
+                    )
+        return keyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request, view):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        if getattr(view, "keyset_ordering", None) is None:
+            return parameters
+
+        return parameters + [
+            {
+                "name": self.pagination_query_param,
+                "required": False,
+                "in": "query",
+                "description": (
+                    "Set to 'cursor' for keyset pagination "
+                    "with next/previous cursor links and no count."
+                ),
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            *self.keyset_pagination_class().get_schema_operation_parameters(
+                view
+            ),
+        ]
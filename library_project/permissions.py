@@ -3,12 +3,15 @@ from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 class IsBorrowingOwnerOrAdmin(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.borrowing.user == request.user or request.user.is_staff
+        return (
+            obj.borrowing.user_id == request.user.id
+            or request.user.is_staff
+        )
 
 
 class IsOwnerOrAdmin(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user or request.user.is_staff
+        return obj.user_id == request.user.id or request.user.is_staff
 
 
 class IsAdminOrReadOnly(BasePermission):
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from library_project import metrics
+
+
+logger = logging.getLogger("library_project")
+
+# "IN (%s, %s, %s)" differs only by the number of values
+PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+# savepoints of nested atomic blocks repeat by design
+IGNORED_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO")
+
+HTTP_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def fingerprint(sql: str) -> str:
+    """SQL with parameters left out, identical for repeats of a query"""
+    return PLACEHOLDER_LIST.sub("%s...", sql)
+
+
+class QueryProfile:
+    """
+    Count queries, their total time and repeated fingerprints on every
+    database connection of the current thread while the context is open
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.time_ms = 0.0
+        self.fingerprints: Counter = Counter()
+        self.stack = ExitStack()
+
+    def __enter__(self) -> "QueryProfile":
+        for alias in connections:
+            self.stack.enter_context(
+                connections[alias].execute_wrapper(self)
+            )
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time_ms += (time.perf_counter() - start) * 1000
+            self.count += 1
+            if not sql.lstrip().upper().startswith(IGNORED_STATEMENTS):
+                self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self) -> dict[str, int]:
+        """Fingerprints run more than once, the usual sign of an N+1"""
+        return {
+            sql: count
+            for sql, count in self.fingerprints.items()
+            if count > 1
+        }
+
+    @property
+    def duplicate_count(self) -> int:
+        return sum(count - 1 for count in self.duplicates.values())
+
+
+def fingerprint_hash(sql: str) -> str:
+    return hashlib.md5(fingerprint(sql).encode()).hexdigest()[:8]
+
+
+class RequestMetricsMiddleware:
+    """
+    Latency histogram and response status counters per view, for the
+    /metrics endpoint; requests matching no view are not recorded
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        if match is not None:
+            view = match.view_name
+            metrics.observe_ms(f"http:{view}", elapsed_ms, HTTP_BUCKETS_MS)
+            metrics.increment(
+                f"http:{view}:status_{response.status_code // 100}xx"
+            )
+        return response
+
+
+class QueryCountMiddleware:
+    """
+    Profile the queries of every request: the totals are added to
+    per-view metrics counters, and returned in X-DB-Queries, X-DB-Time-Ms
+    and X-DB-Duplicate-Queries headers with QUERY_HEADERS; requests
+    repeating a query more than QUERY_DUPLICATES_WARNING times are logged
+    with the fingerprint.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_PROFILING:
+            return self.get_response(request)
+
+        with QueryProfile() as profile:
+            response = self.get_response(request)
+
+        if settings.QUERY_HEADERS:
+            response["X-DB-Queries"] = str(profile.count)
+            response["X-DB-Time-Ms"] = f"{profile.time_ms:.1f}"
+            response["X-DB-Duplicate-Queries"] = str(profile.duplicate_count)
+
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return response
+        view = match.view_name
+        metrics.increment(f"queries:{view}:requests")
+        metrics.increment(f"queries:{view}:count", profile.count)
+        metrics.increment(f"queries:{view}:time_ms", int(profile.time_ms))
+        if profile.duplicate_count:
+            metrics.increment(
+                f"queries:{view}:duplicates", profile.duplicate_count
+            )
+        for sql, count in profile.duplicates.items():
+            if count > settings.QUERY_DUPLICATES_WARNING:
+                logger.warning(
+                    f"{view} ran query {fingerprint_hash(sql)} "
+                    f"{count} times: {sql[:300]}"
+                )
+        return response
@@ -0,0 +1,353 @@
+import hmac
+import logging
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.views.decorators.http import require_GET
+
+from books_service.cache import get_cache_stats
+from library_project import metrics
+from library_project.celery import TASK_BUCKETS_MS, app as celery_app
+from library_project.profiling import HTTP_BUCKETS_MS
+from payments_service.stripe_client import (
+    LATENCY_BUCKETS_MS as STRIPE_BUCKETS_MS,
+    get_stripe_metrics,
+)
+
+
+logger = logging.getLogger("library_project")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# views of these namespaces are reported, admin and tooling are not
+API_NAMESPACES = ("books_service", "borrowing_service", "payments", "user")
+TASK_STATES = ("success", "failure", "retry")
+TELEGRAM_RESULTS = ("sent", "failed", "rate_limited")
+EVENT_COUNTERS = (
+    "emails:sent",
+    "emails:failed_attempts",
+    "new_book:chunks",
+    "new_book:emails_sent",
+    "new_book:telegram_sent",
+    "new_book:telegram_failed",
+    "notifications:buffered",
+    "notifications:sent",
+    "notifications:digests",
+    "notifications:failed",
+    "payments:expired",
+)
+GAUGES = ("notifications:backlog", "notifications:lag_seconds")
+
+
+def api_views(resolver=None, namespace: str = "") -> list[str]:
+    """View names of every named URL in the API namespaces"""
+    names = []
+    for pattern in (resolver or get_resolver()).url_patterns:
+        if isinstance(pattern, URLResolver):
+            nested = pattern.namespace
+            if nested:
+                nested = f"{namespace}:{nested}" if namespace else nested
+            names += api_views(pattern, nested or namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            if namespace.split(":")[0] in API_NAMESPACES:
+                names.append(f"{namespace}:{pattern.name}")
+    return sorted(set(names))
+
+
+def task_names() -> list[str]:
+    return sorted(
+        name for name in celery_app.tasks if not name.startswith("celery.")
+    )
+
+
+def queue_lengths() -> dict[str, int]:
+    """Messages waiting in the broker, per queue tasks are routed to"""
+    queues = {celery_app.conf.task_default_queue}
+    for route in (celery_app.conf.task_routes or {}).values():
+        if isinstance(route, dict) and route.get("queue"):
+            queues.add(route["queue"])
+
+    lengths = {}
+    try:
+        with celery_app.connection_for_read() as connection:
+            connection.ensure_connection(
+                max_retries=1,
+                interval_start=0,
+                timeout=settings.METRICS_BROKER_TIMEOUT,
+            )
+            for queue in sorted(queues):
+                try:
+                    lengths[queue] = connection.default_channel.queue_declare(
+                        queue=queue, passive=True
+                    ).message_count
+                except connection.channel_errors:
+                    # not declared yet, so nothing was ever queued
+                    lengths[queue] = 0
+    except Exception as error:
+        logger.warning(f"Could not read Celery queue lengths: {error}")
+    return lengths
+
+
+class Exposition:
+    """Prometheus text format, one metric family at a time"""
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+
+    @staticmethod
+    def _labels(labels: dict) -> str:
+        if not labels:
+            return ""
+        pairs = ",".join(
+            f'{name}="{value}"' for name, value in labels.items()
+        )
+        return "{" + pairs + "}"
+
+    def family(self, name: str, kind: str, help_text: str) -> None:
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, value: float, **labels) -> None:
+        self.lines.append(f"{name}{self._labels(labels)} {value}")
+
+    def histogram(
+        self,
+        name: str,
+        histogram: dict,
+        buckets: tuple[int, ...],
+        **labels,
+    ) -> None:
+        """Samples of a histogram read with metrics.get_histograms"""
+        for bucket in buckets:
+            self.sample(
+                f"{name}_bucket",
+                histogram[f"le_{bucket}"],
+                **labels,
+                le=bucket,
+            )
+        self.sample(
+            f"{name}_bucket", histogram["count"], **labels, le="+Inf"
+        )
+        self.sample(f"{name}_sum", histogram["sum_ms"], **labels)
+        self.sample(f"{name}_count", histogram["count"], **labels)
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def add_http_metrics(exposition: Exposition) -> None:
+    views = api_views()
+    histograms = metrics.get_histograms(
+        [f"http:{view}" for view in views], HTTP_BUCKETS_MS
+    )
+    statuses = [f"{code}xx" for code in range(1, 6)]
+    counters = metrics.get_counters(
+        [
+            f"http:{view}:status_{status}"
+            for view in views
+            for status in statuses
+        ]
+        + [
+            f"queries:{view}:{name}"
+            for view in views
+            for name in ("count", "time_ms", "duplicates")
+        ]
+    )
+    requested = [
+        view for view in views if histograms[f"http:{view}"]["count"]
+    ]
+
+    exposition.family(
+        "library_http_request_duration_ms",
+        "histogram",
+        "Latency of API requests per view",
+    )
+    for view in requested:
+        exposition.histogram(
+            "library_http_request_duration_ms",
+            histograms[f"http:{view}"],
+            HTTP_BUCKETS_MS,
+            view=view,
+        )
+
+    exposition.family(
+        "library_http_responses_total", "counter", "Responses per status"
+    )
+    for view in requested:
+        for status in statuses:
+            value = counters[f"http:{view}:status_{status}"]
+            if value:
+                exposition.sample(
+                    "library_http_responses_total",
+                    value,
+                    view=view,
+                    status=status,
+                )
+
+    for name, kind, help_text in (
+        ("count", "library_db_queries_total", "SQL queries per view"),
+        ("time_ms", "library_db_query_time_ms_total", "SQL time per view"),
+        (
+            "duplicates",
+            "library_db_duplicate_queries_total",
+            "Repeated SQL queries per view",
+        ),
+    ):
+        exposition.family(kind, "counter", help_text)
+        for view in requested:
+            exposition.sample(
+                kind, counters[f"queries:{view}:{name}"], view=view
+            )
+
+
+def add_cache_metrics(exposition: Exposition) -> None:
+    stats = get_cache_stats()
+    exposition.family(
+        "library_cache_requests_total",
+        "counter",
+        "Catalog response cache lookups",
+    )
+    for namespace, results in stats.items():
+        for result in ("hits", "misses"):
+            exposition.sample(
+                "library_cache_requests_total",
+                results[result],
+                namespace=namespace,
+                result=result,
+            )
+    exposition.family(
+        "library_cache_hit_ratio",
+        "gauge",
+        "Catalog response cache hit ratio",
+    )
+    for namespace, results in stats.items():
+        lookups = results["hits"] + results["misses"]
+        exposition.sample(
+            "library_cache_hit_ratio",
+            round(results["hits"] / lookups, 4) if lookups else 0,
+            namespace=namespace,
+        )
+
+
+def add_celery_metrics(exposition: Exposition) -> None:
+    tasks = task_names()
+    histograms = metrics.get_histograms(
+        [f"celery:{task}:duration" for task in tasks], TASK_BUCKETS_MS
+    )
+    states = metrics.get_counters(
+        [f"celery:{task}:{state}" for task in tasks for state in TASK_STATES]
+    )
+
+    exposition.family(
+        "library_celery_task_duration_ms",
+        "histogram",
+        "Run time of Celery tasks",
+    )
+    for task in tasks:
+        exposition.histogram(
+            "library_celery_task_duration_ms",
+            histograms[f"celery:{task}:duration"],
+            TASK_BUCKETS_MS,
+            task=task,
+        )
+
+    exposition.family(
+        "library_celery_tasks_total", "counter", "Finished Celery tasks"
+    )
+    for task in tasks:
+        for state in TASK_STATES:
+            exposition.sample(
+                "library_celery_tasks_total",
+                states[f"celery:{task}:{state}"],
+                task=task,
+                state=state,
+            )
+
+    exposition.family(
+        "library_celery_queue_length",
+        "gauge",
+        "Messages waiting in the broker",
+    )
+    for queue, length in queue_lengths().items():
+        exposition.sample("library_celery_queue_length", length, queue=queue)
+
+
+def add_integration_metrics(exposition: Exposition) -> None:
+    exposition.family(
+        "library_stripe_request_duration_ms",
+        "histogram",
+        "Latency of Stripe API calls",
+    )
+    stripe_metrics = get_stripe_metrics()
+    for operation, stats in stripe_metrics.items():
+        exposition.histogram(
+            "library_stripe_request_duration_ms",
+            stats,
+            STRIPE_BUCKETS_MS,
+            operation=operation,
+        )
+    exposition.family(
+        "library_stripe_errors_total", "counter", "Failed Stripe API calls"
+    )
+    for operation, stats in stripe_metrics.items():
+        exposition.sample(
+            "library_stripe_errors_total",
+            stats["errors"],
+            operation=operation,
+        )
+
+    telegram = metrics.get_counters(
+        [f"telegram:{result}" for result in TELEGRAM_RESULTS]
+    )
+    exposition.family(
+        "library_telegram_messages_total",
+        "counter",
+        "Telegram messages by outcome",
+    )
+    for result in TELEGRAM_RESULTS:
+        exposition.sample(
+            "library_telegram_messages_total",
+            telegram[f"telegram:{result}"],
+            result=result,
+        )
+
+
+def add_event_metrics(exposition: Exposition) -> None:
+    counters = metrics.get_counters(list(EVENT_COUNTERS))
+    exposition.family(
+        "library_events_total", "counter", "Application event counters"
+    )
+    for name, value in counters.items():
+        exposition.sample("library_events_total", value, event=name)
+
+    gauges = metrics.get_counters(list(GAUGES))
+    exposition.family("library_gauge", "gauge", "Application gauges")
+    for name, value in gauges.items():
+        exposition.sample("library_gauge", value, gauge=name)
+
+
+def render_metrics() -> str:
+    exposition = Exposition()
+    add_http_metrics(exposition)
+    add_cache_metrics(exposition)
+    add_celery_metrics(exposition)
+    add_integration_metrics(exposition)
+    add_event_metrics(exposition)
+    return exposition.render()
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Metrics of every web and worker process in the Prometheus text
+    format. Scrapers must send METRICS_TOKEN as a bearer token; without a
+    token configured the endpoint is only open in DEBUG.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        provided = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(provided, expected):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -1,5 +1,6 @@
 from datetime import timedelta
 import os
+import sys
 from pathlib import Path
 
 from django.utils.translation import gettext_lazy as _
@@ -26,6 +27,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     
     "rest_framework_simplejwt",
     "rest_framework",
@@ -43,7 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "library_project.profiling.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "library_project.profiling.QueryCountMiddleware",
+    "library_project.db_router.ReplicaRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.locale.LocaleMiddleware",
@@ -82,16 +87,53 @@ WSGI_APPLICATION = "library_project.wsgi.application"
 #     }
 # }
 
+# Connection reuse: "persistent" keeps a connection per process or
+# thread for DB_CONN_MAX_AGE seconds and checks it before reuse,
+# "pgbouncer" does the same through a transaction pooler (which does not
+# support server-side cursors), "none" connects for every request
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "persistent")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
         "HOST": os.environ["POSTGRES_HOST"],
+        "PORT": os.environ.get("POSTGRES_PORT", ""),
         "NAME": os.environ["POSTGRES_NAME"],
         "USER": os.environ["POSTGRES_USER"],
         "PASSWORD": os.environ["POSTGRES_PASSWORD"],
+        "CONN_MAX_AGE": (
+            0
+            if DB_POOL_MODE == "none"
+            else int(os.environ.get("DB_CONN_MAX_AGE", 60))
+        ),
+        "CONN_HEALTH_CHECKS": DB_POOL_MODE != "none",
+        "DISABLE_SERVER_SIDE_CURSORS": DB_POOL_MODE == "pgbouncer",
+        "OPTIONS": {
+            "connect_timeout": int(os.environ.get("DB_CONNECT_TIMEOUT", 5)),
+        },
     }
 }
 
+# Read replicas of the default database, comma separated hosts; list
+# and detail reads of the catalog and histories are routed to them
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+    filter(None, os.environ.get("POSTGRES_REPLICA_HOSTS", "").split(","))
+):
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{number}")
+
+DATABASE_ROUTERS = ["library_project.db_router.ReplicaRouter"]
+
+# Clients read from the primary for this long after a write, longer
+# than the replication lag
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_COOKIE = "primary_pin"
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation."
@@ -140,7 +182,7 @@ INTERNAL_IPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": (
-        "rest_framework.pagination.PageNumberPagination"
+        "library_project.pagination.PageNumberOrKeysetPagination"
     ),
     "PAGE_SIZE": 25,
     "DEFAULT_AUTHENTICATION_CLASSES": (
@@ -164,6 +206,38 @@ STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY")
 
 STRIPE_SECRET = os.environ.get("STRIPE_SECRET")
 
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+
+# Create checkout sessions in a Celery task instead of the request
+STRIPE_ASYNC_SESSIONS = os.environ.get("STRIPE_ASYNC_SESSIONS") == "True"
+
+# e.g. http://localhost:12111 to use `manage.py run_fake_stripe`
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE")
+
+# Stripe HTTP client: keep-alive pool size, timeouts in seconds and
+# network retries (with backoff and jitter) of the stripe library
+STRIPE_POOL_SIZE = int(os.environ.get("STRIPE_POOL_SIZE", 10))
+
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get("STRIPE_CONNECT_TIMEOUT", 3))
+
+STRIPE_READ_TIMEOUT = float(os.environ.get("STRIPE_READ_TIMEOUT", 20))
+
+STRIPE_MAX_RETRIES = int(os.environ.get("STRIPE_MAX_RETRIES", 2))
+
+# e.g. http://localhost:8081 to use `manage.py run_fake_telegram`
+TELEGRAM_API_BASE = os.environ.get(
+    "TELEGRAM_API_BASE", "https://api.telegram.org"
+)
+
+# Notifications: chats messaged at once, retries on 429, timeout in seconds
+TELEGRAM_CONCURRENCY = int(os.environ.get("TELEGRAM_CONCURRENCY", 8))
+
+TELEGRAM_MAX_RETRIES = 3
+
+TELEGRAM_TIMEOUT = 10
+
+TELEGRAM_RECIPIENTS_CACHE_TIMEOUT = 60 * 5
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Library Service API",
     "DESCRIPTION": "Manage books, borrowings and payments for library",
@@ -177,6 +251,12 @@ SPECTACULAR_SETTINGS = {
     },
 }
 
+# Seconds staff notifications are coalesced into one Telegram digest,
+# 0 sends every notification on its own
+NOTIFICATION_DIGEST_WINDOW = int(
+    os.environ.get("NOTIFICATION_DIGEST_WINDOW", 60)
+)
+
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
 CELERY_BEAT_SCHEDULE = {
@@ -187,13 +267,82 @@ CELERY_BEAT_SCHEDULE = {
     "check_expired_payments": {
         "task": "payments_service.tasks.check_expired_payments",
         "schedule": crontab(minute="*")
-    }
+    },
+    "send_outbox_emails": {
+        "task": "books_service.tasks.send_outbox_emails",
+        "schedule": crontab(minute="*"),
+    },
+    "flush_notifications": {
+        "task": "borrowing_service.tasks.flush_notifications",
+        "schedule": timedelta(seconds=NOTIFICATION_DIGEST_WINDOW or 60),
+    },
 }
 
 CELERY_BROKER_URL = "redis://localhost"
 
 CELERY_RESULT_BACKEND = "redis://localhost"
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get(
+            "REDIS_CACHE_URL", "redis://localhost:6379/1"
+        ),
+    }
+}
+
+if "test" in sys.argv:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = 60 * 15
+
+# Feed pages are cached for users with at least this many subscriptions,
+# None disables the feed cache
+FEED_CACHE_MIN_SUBSCRIPTIONS = 20
+
+# Count queries of every request into per-view metrics and X-DB-* headers,
+# warn when one query repeats more than QUERY_DUPLICATES_WARNING times
+QUERY_PROFILING = os.environ.get("QUERY_PROFILING", "True") == "True"
+
+# The X-DB-* headers reveal internals to every client, so they are only
+# sent in DEBUG unless turned on explicitly
+QUERY_HEADERS = os.environ.get("QUERY_HEADERS", str(DEBUG)) == "True"
+
+QUERY_DUPLICATES_WARNING = 5
+
+# Seconds metrics increments are summed in the process before being
+# written to the shared cache, 0 (the default of tests) writes every
+# increment right away
+METRICS_FLUSH_INTERVAL = float(
+    os.environ.get("METRICS_FLUSH_INTERVAL", 0 if "test" in sys.argv else 5)
+)
+
+# Bearer token /metrics requires, without it /metrics is only served in
+# DEBUG
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Seconds /metrics waits for the broker when reading queue lengths
+METRICS_BROKER_TIMEOUT = 1
+
+# Logging: handlers write from a background thread fed by a queue of
+# LOG_QUEUE_SIZE records (dropped when full), files are JSON lines with
+# LOG_JSON, and LOG_SAMPLING keeps a share of the INFO records of
+# chatty loggers, e.g. {"stripe": 0.1}
+LOGGING_CONFIG = "library_project.log.configure_logging"
+
+LOG_QUEUE = os.environ.get("LOG_QUEUE", "True") == "True"
+
+LOG_QUEUE_SIZE = 10000
+
+LOG_JSON = os.environ.get("LOG_JSON") == "True"
+
+LOG_SAMPLING = {}
+
+LOG_FILE_FORMATTER = "json" if LOG_JSON else "extended"
 
 LOGGING = {
     "version": 1,
@@ -216,6 +365,7 @@ LOGGING = {
             "(%(asctime)s; %(filename)s:%(lineno)d)",
             "datefmt": "%Y-%m-%d %H:%M:%S",
         },
+        "json": {"()": "library_project.log.JsonFormatter"},
     },
     "handlers": {
         "null": {
@@ -233,7 +383,7 @@ LOGGING = {
             "filename": "logs/errors.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
         "debug": {
             "level": "DEBUG",
@@ -241,7 +391,7 @@ LOGGING = {
             "filename": "logs/debug.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
         "trash_error": {
             "level": "ERROR",
@@ -249,7 +399,7 @@ LOGGING = {
             "filename": "logs/trash_error.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
         "books_service_file": {
             "level": "DEBUG",
@@ -257,7 +407,7 @@ LOGGING = {
             "filename": "logs/books_service_info.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
         "borrowing_service_file": {
             "level": "DEBUG",
@@ -265,7 +415,7 @@ LOGGING = {
             "filename": "logs/borrowing_service_info.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
         "payments_service_file": {
             "level": "DEBUG",
@@ -273,7 +423,7 @@ LOGGING = {
             "filename": "logs/payment_info.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
         "tg_bot_file": {
             "level": "DEBUG",
@@ -281,7 +431,7 @@ LOGGING = {
             "filename": "logs/tg_bot_info.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
         "stripe_file": {
             "level": "DEBUG",
@@ -289,7 +439,7 @@ LOGGING = {
             "filename": "logs/stripe_info.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
         "celery_file": {
             "level": "DEBUG",
@@ -297,7 +447,7 @@ LOGGING = {
             "filename": "logs/stripe_info.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
         "users_file": {
             "level": "DEBUG",
@@ -305,7 +455,7 @@ LOGGING = {
             "filename": "logs/user_info.log",
             "maxBytes": 1024 * 1024 * 5,
             "backupCount": 7,
-            "formatter": "extended",
+            "formatter": LOG_FILE_FORMATTER,
         },
     },
     "loggers": {
@@ -373,6 +523,8 @@ LOGGING = {
 
 FINE_MULTIPLIER = 2
 
+BOOK_SEARCH_CONFIG = "english"
+
 EMAIL_BACKEND = "django_smtp_ssl.SSLEmailBackend"
 
 DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL")
@@ -383,3 +535,11 @@ EMAIL_PORT = 465
 EMAIL_TIMEOUT = 10
 
 TEMPLATED_EMAIL_FILE_EXTENSION = "html"
+
+# Email outbox: emails sent per SMTP connection, attempts before giving up
+# and delay before the first retry in seconds (doubled on every retry)
+EMAIL_BATCH_SIZE = 100
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BACKOFF = 60
+# seconds a claimed batch is hidden from other workers while it is sent
+EMAIL_CLAIM_TIMEOUT = 300
@@ -0,0 +1,29 @@
+from library_project.profiling import QueryProfile
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin failing a test when a request runs more queries than
+    its budget, or repeats the same query, which is how N+1 shows up
+    """
+
+    def assertQueryBudget(
+        self,
+        budget: int,
+        send,
+        allow_duplicates: bool = False,
+    ):
+        with QueryProfile() as profile:
+            response = send()
+
+        problems = []
+        if profile.count > budget:
+            problems.append(f"{profile.count} queries, budget {budget}")
+        if not allow_duplicates:
+            problems.extend(
+                f"repeated {count} times: {sql}"
+                for sql, count in profile.duplicates.items()
+            )
+        if problems:
+            self.fail("\n".join(problems))
+        return response
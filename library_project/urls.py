@@ -9,8 +9,11 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from library_project.prometheus import metrics_view
+
 urlpatterns = [
-    re_path(r"^rosetta/", include("rosetta.urls"))
+    re_path(r"^rosetta/", include("rosetta.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 urlpatterns += i18n_patterns(
@@ -0,0 +1,131 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from books_service.models import Author, Book
+from borrowing_service.models import Borrowing
+from payments_service.models import Payment
+from payments_service.tasks import EXPIRE_CHUNK_SIZE, check_expired_payments
+
+
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the payments table with synthetic rows and measure "
+        "the cost of a check_expired_payments run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument(
+            "--expired",
+            type=float,
+            default=0.01,
+            help="Share of pending payments whose session timed out",
+        )
+        parser.add_argument(
+            "--pending",
+            type=float,
+            default=0.1,
+            help="Share of payments still pending",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=EXPIRE_CHUNK_SIZE
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the generated payments after the benchmark",
+        )
+
+    def handle(self, *args, **options):
+        borrowing = self.create_borrowing()
+        try:
+            self.fill(borrowing, options)
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE payments_service_payment")
+            self.explain()
+
+            for run in ("backlog", "steady state"):
+                start = time.perf_counter()
+                expired = check_expired_payments(options["chunk_size"])
+                elapsed = (time.perf_counter() - start) * 1000
+                self.stdout.write(
+                    f"{run:>12}: expired {expired} payments "
+                    f"in {elapsed:.1f} ms"
+                )
+        finally:
+            if not options["keep"]:
+                borrowing.delete()
+
+    def create_borrowing(self) -> Borrowing:
+        user, _ = get_user_model().objects.get_or_create(
+            email="benchmark@library.test"
+        )
+        book, _ = Book.objects.get_or_create(
+            title="Benchmark Book",
+            author=Author.objects.get_or_create(
+                first_name="Benchmark", last_name="Author"
+            )[0],
+            cover="soft",
+            defaults={"inventory": 1, "daily_fee": 1},
+        )
+        # bulk_create skips the Telegram notification of new borrowings
+        return Borrowing.objects.bulk_create(
+            [
+                Borrowing(
+                    expected_return_date=timezone.now().date(),
+                    book=book,
+                    user=user,
+                )
+            ]
+        )[0]
+
+    def fill(self, borrowing: Borrowing, options: dict) -> None:
+        now = int(timezone.now().timestamp())
+        rows = options["rows"]
+        pending = int(rows * options["pending"])
+        expired = int(pending * options["expired"])
+        start = time.perf_counter()
+        for offset in range(0, rows, BATCH_SIZE):
+            payments = []
+            for index in range(offset, min(offset + BATCH_SIZE, rows)):
+                if index < expired:
+                    status, expires_at = "pending", now - 60
+                elif index < pending:
+                    status, expires_at = "pending", now + 3600
+                else:
+                    status, expires_at = "paid", now - 86400
+                payments.append(
+                    Payment(
+                        status=status,
+                        type="payment",
+                        borrowing=borrowing,
+                        session_id=f"cs_bench_{index}",
+                        expires_at=expires_at,
+                        money_to_pay=1,
+                    )
+                )
+            Payment.objects.bulk_create(payments)
+        self.stdout.write(
+            f"Created {rows} payments ({pending} pending, {expired} of "
+            f"them expired) in {time.perf_counter() - start:.1f} s"
+        )
+
+    def explain(self) -> None:
+        current_timestamp = int(timezone.now().timestamp())
+        plan = (
+            Payment.objects.filter(
+                status="pending", expires_at__lt=current_timestamp
+            )
+            .order_by("expires_at")
+            .values("pk")[:EXPIRE_CHUNK_SIZE]
+            .explain()
+        )
+        self.stdout.write(f"Chunk query plan:\n{plan}")
@@ -0,0 +1,125 @@
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from django.core.management import BaseCommand
+
+
+SESSION_LIFETIME = 60 * 60 * 24
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Stripe checkout API:
+    - POST /v1/checkout/sessions creates an unpaid session
+    - GET /v1/checkout/sessions/<id> retrieves it
+    - GET /pay/<id> (the session url) pays it and redirects to success_url
+    """
+
+    sessions = {}
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_not_found(self):
+        self.send_json(
+            {"error": {"type": "invalid_request_error", "message": "No such"}},
+            status=404,
+        )
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        if urlparse(self.path).path != "/v1/checkout/sessions":
+            return self.send_not_found()
+
+        length = int(self.headers.get("Content-Length", 0))
+        params = dict(parse_qsl(self.rfile.read(length).decode()))
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        host = self.headers.get("Host")
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"http://{host}/pay/{session_id}",
+            "expires_at": int(time.time()) + SESSION_LIFETIME,
+            "payment_status": "unpaid",
+            "status": "open",
+            "amount_total": int(
+                params.get("line_items[0][price_data][unit_amount]", 0)
+            ),
+            "success_url": params.get("success_url", ""),
+            "cancel_url": params.get("cancel_url", ""),
+        }
+        self.sessions[session_id] = session
+        self.send_json(session)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        path = urlparse(self.path).path
+
+        if path.startswith("/v1/checkout/sessions/"):
+            session = self.sessions.get(path.rsplit("/", 1)[-1])
+            if session is None:
+                return self.send_not_found()
+            return self.send_json(session)
+
+        if path.startswith("/pay/"):
+            session = self.sessions.get(path.rsplit("/", 1)[-1])
+            if session is None:
+                return self.send_not_found()
+            session["payment_status"] = "paid"
+            session["status"] = "complete"
+            self.send_response(303)
+            self.send_header(
+                "Location",
+                session["success_url"].replace(
+                    "{CHECKOUT_SESSION_ID}", session["id"]
+                ),
+            )
+            self.end_headers()
+            return
+
+        self.send_not_found()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local fake Stripe checkout API for offline load tests. "
+        "Point STRIPE_API_BASE at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=12111)
+        parser.add_argument(
+            "--latency",
+            type=int,
+            default=0,
+            help="Milliseconds added to every response",
+        )
+
+    def handle(self, *args, **options):
+        FakeStripeHandler.latency = options["latency"] / 1000
+        server = ThreadingHTTPServer(
+            (options["host"], options["port"]), FakeStripeHandler
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fake Stripe listening on "
+                f"http://{options['host']}:{options['port']}"
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
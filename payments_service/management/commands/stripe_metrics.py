@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from payments_service.stripe_client import get_stripe_metrics
+
+
+class Command(BaseCommand):
+    help = "Show call counts, errors and latency of Stripe operations"
+
+    def handle(self, *args, **options):
+        for operation, stats in get_stripe_metrics().items():
+            count = stats["count"]
+            average = stats["sum_ms"] / count if count else 0
+            self.stdout.write(
+                f"{operation}: {count} calls, {stats['errors']} errors, "
+                f"average {average:.0f}ms"
+            )
+            for name, calls in stats.items():
+                if name.startswith("le_"):
+                    self.stdout.write(f"  <= {name[3:]}ms: {calls}")
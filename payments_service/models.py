@@ -1,11 +1,13 @@
 from django.conf import settings
 from django.db import models
+from django.db.models import Q
 
 from borrowing_service.models import Borrowing
 
 
 class Payment(models.Model):
     STATUS_CHOICES = (
+        ("creating", "Creating"),
         ("pending", "Pending"),
         ("paid", "Paid"),
     )
@@ -20,16 +22,48 @@ class Payment(models.Model):
     borrowing = models.ForeignKey(
         Borrowing, related_name="payments", on_delete=models.CASCADE
     )
-    session_url = models.URLField()
-    session_id = models.CharField(max_length=255)
-    expires_at = models.PositiveBigIntegerField()
+    session_url = models.URLField(blank=True)
+    session_id = models.CharField(max_length=255, blank=True, db_index=True)
+    expires_at = models.PositiveBigIntegerField(null=True, blank=True)
     money_to_pay = models.DecimalField(max_digits=8, decimal_places=2)
+    session_attempts = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
         ordering = ("status",)
+        indexes = [
+            models.Index(
+                fields=["status", "id"], name="payment_status_keyset_idx"
+            ),
+            models.Index(
+                fields=["expires_at"],
+                name="payment_pending_expiry_idx",
+                condition=Q(status="pending"),
+            ),
+        ]
 
     def __str__(self) -> str:
         return (
             f"{self.borrowing} {self.money_to_pay}$ "
             f"{self.type} ({self.status})"
         )
+
+
+class StripeEvent(models.Model):
+    """
+    Webhook event received from Stripe. The unique event id drops
+    redeliveries; unprocessed events are applied in bulk by
+    process_stripe_events.
+    """
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=63)
+    session_id = models.CharField(max_length=255)
+    payment_status = models.CharField(max_length=31, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ("id",)
+
+    def __str__(self) -> str:
+        return f"{self.type} {self.event_id}"
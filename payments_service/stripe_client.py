@@ -0,0 +1,122 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from library_project import metrics
+
+
+logger = logging.getLogger("payments_service")
+
+OPERATIONS = ("session.create", "session.retrieve")
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def build_http_client() -> stripe.http_client.RequestsClient:
+    """
+    HTTP client shared by every Stripe call of the process: one pooled
+    keep-alive session, so repeated calls skip the TCP and TLS handshake.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=settings.STRIPE_POOL_SIZE
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return stripe.http_client.RequestsClient(
+        timeout=(
+            settings.STRIPE_CONNECT_TIMEOUT,
+            settings.STRIPE_READ_TIMEOUT,
+        ),
+        session=session,
+    )
+
+
+def configure_stripe() -> None:
+    """
+    Connection errors, 409 and 5xx responses are retried by the stripe
+    library itself, with exponential backoff and jitter, up to
+    STRIPE_MAX_RETRIES times.
+    """
+    stripe.api_key = settings.STRIPE_SECRET
+    if settings.STRIPE_API_BASE:
+        stripe.api_base = settings.STRIPE_API_BASE
+    stripe.max_network_retries = settings.STRIPE_MAX_RETRIES
+    stripe.default_http_client = build_http_client()
+
+
+def _metric_name(operation: str) -> str:
+    return f"stripe:{operation}"
+
+
+def _record(operation: str, elapsed_ms: int, failed: bool) -> None:
+    metrics.observe_ms(
+        _metric_name(operation), elapsed_ms, LATENCY_BUCKETS_MS
+    )
+    if failed:
+        metrics.increment(f"{_metric_name(operation)}:errors")
+
+
+@contextmanager
+def track(operation: str):
+    """Record latency and outcome of a Stripe operation"""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except stripe.error.StripeError:
+        failed = True
+        raise
+    finally:
+        elapsed_ms = int((time.perf_counter() - start) * 1000)
+        try:
+            _record(operation, elapsed_ms, failed)
+        except Exception:
+            logger.exception("Could not record Stripe metrics")
+        logger.info(
+            f"Stripe {operation} took {elapsed_ms}ms"
+            + (" and failed" if failed else "")
+        )
+
+
+def get_stripe_metrics() -> dict:
+    """
+    Per operation: call count, errors, total latency and a cumulative
+    latency histogram ({"le_<ms>": calls not slower than <ms>}).
+    """
+    histograms = metrics.get_histograms(
+        [_metric_name(operation) for operation in OPERATIONS],
+        LATENCY_BUCKETS_MS,
+    )
+    errors = metrics.get_counters(
+        [f"{_metric_name(operation)}:errors" for operation in OPERATIONS]
+    )
+    return {
+        operation: {
+            **histograms[_metric_name(operation)],
+            "errors": errors[f"{_metric_name(operation)}:errors"],
+        }
+        for operation in OPERATIONS
+    }
+
+
+def create_checkout_session(
+    idempotency_key: Optional[str] = None, **params
+) -> stripe.checkout.Session:
+    with track("session.create"):
+        return stripe.checkout.Session.create(
+            idempotency_key=idempotency_key, **params
+        )
+
+
+def retrieve_checkout_session(session_id: str) -> stripe.checkout.Session:
+    with track("session.retrieve"):
+        return stripe.checkout.Session.retrieve(session_id)
+
+
+configure_stripe()
@@ -1,15 +1,157 @@
+import logging
+
+import stripe
+from django.db import transaction
 from django.utils import timezone
 from celery import shared_task
 
-from payments_service.models import Payment
+from borrowing_service.notifications import queue_notification
+from library_project import metrics
+from payments_service.models import Payment, StripeEvent
+from payments_service.utils import (
+    create_checkout_session,
+    get_idempotency_key,
+)
+
+
+logger = logging.getLogger("payments_service")
+
+SESSION_MAX_RETRIES = 5
+
+EVENTS_BATCH_SIZE = 500
+
+EXPIRE_CHUNK_SIZE = 5000
 
 
 @shared_task
-def check_expired_payments() -> None:
-    current_timestamp = timezone.now().timestamp()
-    expired_payments = Payment.objects.filter(
-        status="pending", expires_at__lt=current_timestamp
+def check_expired_payments(chunk_size: int = EXPIRE_CHUNK_SIZE) -> int:
+    """
+    Expire pending payments whose session timed out, one
+    UPDATE ... WHERE pk IN (SELECT ... LIMIT chunk_size) per chunk, so each
+    statement locks a bounded number of rows. Ordering by expires_at makes
+    the planner walk the partial payment_pending_expiry_idx index instead
+    of scanning for the few matching rows. Returns the number of rows
+    expired.
+    """
+    current_timestamp = int(timezone.now().timestamp())
+    expired = 0
+    while True:
+        chunk = Payment.objects.filter(
+            status="pending", expires_at__lt=current_timestamp
+        ).order_by("expires_at").values("pk")[:chunk_size]
+        updated = Payment.objects.filter(
+            pk__in=chunk, status="pending"
+        ).update(status="expired")
+        expired += updated
+        if updated < chunk_size:
+            break
+
+    metrics.increment("payments:expired", expired)
+    metrics.increment("payments:expire_runs")
+    if expired:
+        logger.info(f"Expired {expired} pending payments")
+    return expired
+
+
+@shared_task(bind=True, max_retries=SESSION_MAX_RETRIES)
+def create_payment_session_task(
+    self, payment_id: int, success_url: str, cancel_url: str
+) -> None:
+    """
+    Create the Stripe checkout session of a payment in "creating" status.
+    Stripe errors are retried with exponential backoff; when retries are
+    exhausted the payment is marked expired, so it can be renewed.
+    """
+    payment = (
+        Payment.objects.select_related("borrowing__book")
+        .filter(pk=payment_id, status="creating")
+        .first()
     )
-    for payment in expired_payments:
-        payment.status = "expired"
-    Payment.objects.bulk_update(expired_payments, ["status"])
+    if payment is None:
+        return
+
+    payment.session_attempts += 1
+    payment.save(update_fields=["session_attempts"])
+    try:
+        session = create_checkout_session(
+            payment.borrowing.book.title,
+            payment.money_to_pay,
+            success_url,
+            cancel_url,
+            idempotency_key=get_idempotency_key(payment),
+        )
+    except stripe.error.StripeError as error:
+        if self.request.retries >= self.max_retries:
+            Payment.objects.filter(pk=payment_id, status="creating").update(
+                status="expired"
+            )
+            logger.error(
+                f"Could not create checkout session of payment {payment_id}"
+            )
+            return
+        raise self.retry(exc=error, countdown=2**self.request.retries)
+
+    Payment.objects.filter(pk=payment_id, status="creating").update(
+        status="pending",
+        session_url=session.url,
+        session_id=session.id,
+        expires_at=session.expires_at,
+    )
+    logger.info(f"Created checkout session of payment {payment_id}")
+
+
+@shared_task
+def process_stripe_events() -> None:
+    """
+    Apply received webhook events in batches: one update marks all paid
+    sessions of the batch, another expires the abandoned ones. Workers
+    running concurrently skip batches locked by each other.
+    """
+    while True:
+        with transaction.atomic():
+            events = list(
+                StripeEvent.objects.select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True)
+                .order_by("id")[:EVENTS_BATCH_SIZE]
+            )
+            if not events:
+                return
+
+            paid_sessions = {
+                event.session_id
+                for event in events
+                if event.type == "checkout.session.completed"
+                and event.payment_status == "paid"
+            }
+            expired_sessions = {
+                event.session_id
+                for event in events
+                if event.type == "checkout.session.expired"
+            }
+            paid_payments = list(
+                Payment.objects.select_related(
+                    "borrowing__book", "borrowing__user"
+                )
+                .filter(session_id__in=paid_sessions)
+                .exclude(status="paid")
+            )
+            Payment.objects.filter(
+                pk__in=[payment.pk for payment in paid_payments]
+            ).update(status="paid")
+            expired = Payment.objects.filter(
+                session_id__in=expired_sessions, status="pending"
+            ).update(status="expired")
+            StripeEvent.objects.filter(
+                pk__in=[event.pk for event in events]
+            ).update(processed_at=timezone.now())
+
+            for payment in paid_payments:
+                queue_notification(
+                    f"{payment.money_to_pay}$ for "
+                    f"{payment.borrowing} were paid"
+                )
+
+        logger.info(
+            f"Processed {len(events)} Stripe events: "
+            f"{len(paid_payments)} payments paid, {expired} expired"
+        )
@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books_service.models import Author, Book
+from payments_service.models import Payment
+from payments_service.stripe_client import get_stripe_metrics
+
+
+def fake_create(**params) -> SimpleNamespace:
+    return SimpleNamespace(
+        id="cs_test_1",
+        url="https://checkout.stripe.test/cs_test_1",
+        expires_at=int(timezone.now().timestamp()) + 3600,
+    )
+
+
+class StripeClientTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testuser@gmail.com", password="testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Test_Book",
+            author=Author.objects.create(first_name="Test", last_name="Test"),
+            cover="hard",
+            inventory=4,
+            daily_fee=10.00,
+        )
+        self.payload = {
+            "book": self.book.id,
+            "expected_return_date": str(
+                timezone.now().date() + timezone.timedelta(days=7)
+            ),
+        }
+
+    @patch("stripe.checkout.Session.create", side_effect=fake_create)
+    def test_session_created_with_idempotency_key(self, mock_create) -> None:
+        res = self.client.post(
+            reverse("borrowing_service:borrowing-list"),
+            self.payload,
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_307_TEMPORARY_REDIRECT)
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, "pending")
+        self.assertEqual(
+            mock_create.call_args.kwargs["idempotency_key"],
+            f"borrowing-{payment.borrowing_id}-payment-{payment.id}-attempt-1",
+        )
+        metrics = get_stripe_metrics()["session.create"]
+        self.assertEqual(metrics["count"], 1)
+        self.assertEqual(metrics["errors"], 0)
+
+    @patch(
+        "stripe.checkout.Session.create",
+        side_effect=stripe.error.APIConnectionError("unreachable"),
+    )
+    @patch("payments_service.tasks.create_payment_session_task.delay")
+    def test_failed_session_is_retried_in_background(
+        self, mock_task, mock_create
+    ) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                reverse("borrowing_service:borrowing-list"),
+                self.payload,
+                format="json",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        payment = Payment.objects.get()
+        self.assertEqual(res.data["payment_id"], payment.id)
+        self.assertEqual(payment.status, "creating")
+        self.assertEqual(mock_task.call_args.args[0], payment.id)
+        self.assertEqual(get_stripe_metrics()["session.create"]["errors"], 1)
+
+    @patch(
+        "stripe.checkout.Session.create",
+        side_effect=stripe.error.APIConnectionError("unreachable"),
+    )
+    def test_renewal_after_failure_uses_new_idempotency_key(
+        self, mock_create
+    ) -> None:
+        with self.captureOnCommitCallbacks():
+            self.client.post(
+                reverse("borrowing_service:borrowing-list"),
+                self.payload,
+                format="json",
+            )
+        Payment.objects.update(status="expired")
+        mock_create.side_effect = fake_create
+
+        res = self.client.post(
+            reverse(
+                "payments:renew_payment_session",
+                args=[Payment.objects.get().id],
+            )
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_307_TEMPORARY_REDIRECT)
+        first, renewal = (
+            call.kwargs["idempotency_key"]
+            for call in mock_create.call_args_list
+        )
+        self.assertTrue(first.endswith("-attempt-1"))
+        self.assertTrue(renewal.endswith("-attempt-2"))
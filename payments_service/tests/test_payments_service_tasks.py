@@ -0,0 +1,130 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books_service.models import Author, Book
+from borrowing_service.models import Borrowing
+from payments_service.models import Payment
+from payments_service.tasks import (
+    check_expired_payments,
+    create_payment_session_task,
+)
+
+
+def fake_session(*args, **kwargs) -> SimpleNamespace:
+    return SimpleNamespace(
+        id="cs_test_1",
+        url="https://checkout.stripe.test/cs_test_1",
+        expires_at=int(timezone.now().timestamp()) + 3600,
+    )
+
+
+class PaymentSessionTaskTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="testuser@gmail.com", password="testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Test_Book",
+            author=Author.objects.create(first_name="Test", last_name="Test"),
+            cover="hard",
+            inventory=4,
+            daily_fee=10.00,
+        )
+        self.borrowing = Borrowing.objects.create(
+            expected_return_date=timezone.now().date()
+            + timezone.timedelta(days=7),
+            book=self.book,
+            user=self.user,
+        )
+        self.payment = Payment.objects.create(
+            status="creating",
+            type="payment",
+            borrowing=self.borrowing,
+            money_to_pay=70.00,
+        )
+
+    @override_settings(STRIPE_ASYNC_SESSIONS=True)
+    @patch("payments_service.tasks.create_payment_session_task.delay")
+    def test_borrow_enqueues_session_creation(self, mock_delay) -> None:
+        payload = {
+            "book": self.book.id,
+            "expected_return_date": str(
+                timezone.now().date() + timezone.timedelta(days=7)
+            ),
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                reverse("borrowing_service:borrowing-list"),
+                payload,
+                format="json",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        payment = Payment.objects.get(pk=res.data["payment_id"])
+        self.assertEqual(payment.status, "creating")
+        self.assertEqual(mock_delay.call_args.args[0], payment.id)
+
+    @patch("payments_service.tasks.create_checkout_session", fake_session)
+    def test_task_fills_session(self) -> None:
+        create_payment_session_task(self.payment.id, "success", "cancel")
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "pending")
+        self.assertEqual(self.payment.session_id, "cs_test_1")
+
+    @patch(
+        "payments_service.tasks.create_checkout_session",
+        side_effect=stripe.error.APIConnectionError("unreachable"),
+    )
+    def test_task_expires_payment_after_retries(self, mock_create) -> None:
+        create_payment_session_task.apply(
+            args=(self.payment.id, "success", "cancel")
+        )
+
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, "expired")
+        self.assertEqual(
+            mock_create.call_count, create_payment_session_task.max_retries + 1
+        )
+
+    def test_poll_session(self) -> None:
+        url = reverse("payments:payment-session", args=[self.payment.id])
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+        with patch(
+            "payments_service.tasks.create_checkout_session", fake_session
+        ):
+            create_payment_session_task(self.payment.id, "success", "cancel")
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_307_TEMPORARY_REDIRECT)
+        self.assertEqual(
+            res.data["session_url"], "https://checkout.stripe.test/cs_test_1"
+        )
+
+    def test_check_expired_payments_in_chunks(self) -> None:
+        now = int(timezone.now().timestamp())
+        Payment.objects.bulk_create(
+            Payment(
+                status="pending",
+                type="payment",
+                borrowing=self.borrowing,
+                expires_at=now + (-60 if index < 5 else 3600),
+                money_to_pay=70.00,
+            )
+            for index in range(8)
+        )
+
+        self.assertEqual(check_expired_payments(chunk_size=2), 5)
+        self.assertEqual(Payment.objects.filter(status="expired").count(), 5)
+        self.assertEqual(Payment.objects.filter(status="pending").count(), 3)
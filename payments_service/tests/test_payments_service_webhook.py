@@ -0,0 +1,123 @@
+import hashlib
+import hmac
+import json
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books_service.models import Author, Book
+from borrowing_service.models import Borrowing
+from payments_service.models import Payment, StripeEvent
+from payments_service.tasks import process_stripe_events
+
+WEBHOOK_URL = reverse("payments:stripe_webhook")
+WEBHOOK_SECRET = "whsec_test"
+
+
+def signed_event(event_id: str, event_type: str, session: dict) -> dict:
+    payload = json.dumps(
+        {
+            "id": event_id,
+            "object": "event",
+            "type": event_type,
+            "data": {"object": {"object": "checkout.session", **session}},
+        }
+    )
+    timestamp = int(time.time())
+    signature = hmac.new(
+        WEBHOOK_SECRET.encode(),
+        f"{timestamp}.{payload}".encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return {
+        "data": payload,
+        "content_type": "application/json",
+        "HTTP_STRIPE_SIGNATURE": f"t={timestamp},v1={signature}",
+    }
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+@patch("payments_service.views.process_stripe_events.delay")
+@patch("payments_service.tasks.queue_notification")
+class StripeWebhookTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(
+            email="testuser@gmail.com", password="testpassword"
+        )
+        borrowing = Borrowing.objects.create(
+            expected_return_date=timezone.now().date()
+            + timezone.timedelta(days=7),
+            book=Book.objects.create(
+                title="Test_Book",
+                author=Author.objects.create(
+                    first_name="Test", last_name="Test"
+                ),
+                cover="hard",
+                inventory=4,
+                daily_fee=10.00,
+            ),
+            user=user,
+        )
+        self.paid, self.abandoned = (
+            Payment.objects.create(
+                status="pending",
+                type="payment",
+                borrowing=borrowing,
+                session_id=session_id,
+                money_to_pay=70.00,
+            )
+            for session_id in ("cs_paid", "cs_abandoned")
+        )
+
+    def test_events_update_payments(self, mock_notification, mock_delay):
+        events = [
+            signed_event(
+                "evt_1",
+                "checkout.session.completed",
+                {"id": "cs_paid", "payment_status": "paid"},
+            ),
+            signed_event(
+                "evt_2",
+                "checkout.session.expired",
+                {"id": "cs_abandoned", "payment_status": "unpaid"},
+            ),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            for event in events + events[:1]:
+                res = self.client.post(WEBHOOK_URL, **event)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(StripeEvent.objects.count(), 2)
+        self.assertTrue(mock_delay.called)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            process_stripe_events()
+
+        self.paid.refresh_from_db()
+        self.abandoned.refresh_from_db()
+        self.assertEqual(self.paid.status, "paid")
+        self.assertEqual(self.abandoned.status, "expired")
+        self.assertFalse(
+            StripeEvent.objects.filter(processed_at__isnull=True).exists()
+        )
+        mock_notification.assert_called_once()
+
+    def test_invalid_signature_rejected(self, mock_notification, mock_delay):
+        event = signed_event(
+            "evt_1",
+            "checkout.session.completed",
+            {"id": "cs_paid", "payment_status": "paid"},
+        )
+        event["HTTP_STRIPE_SIGNATURE"] += "0"
+
+        res = self.client.post(WEBHOOK_URL, **event)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
@@ -1,7 +1,11 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from payments_service.views import PaymentViewSet, RenewPaymentSessionView
+from payments_service.views import (
+    PaymentViewSet,
+    RenewPaymentSessionView,
+    StripeWebhookView,
+)
 
 
 router = DefaultRouter()
@@ -15,6 +19,7 @@ urlpatterns = [
         RenewPaymentSessionView.as_view(),
         name="renew_payment_session",
     ),
+    path("webhook/", StripeWebhookView.as_view(), name="stripe_webhook"),
 ]
 
 app_name = "payments"
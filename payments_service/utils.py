@@ -1,26 +1,58 @@
+import logging
+
+from django.db import transaction
+from rest_framework import status
 from rest_framework.request import Request
+from rest_framework.response import Response
 import stripe
 from django.conf import settings
 from rest_framework.reverse import reverse
 
 from borrowing_service.models import Borrowing
+from payments_service import stripe_client
+from payments_service.models import Payment
 
 
-stripe.api_key = settings.STRIPE_SECRET
+logger = logging.getLogger("payments_service")
 
 
-def create_stripe_session(
-    request: Request,
-    borrowing: Borrowing,
+def get_checkout_urls(request: Request) -> tuple[str, str]:
+    success_url = (
+        reverse("payments:payment-order-success", request=request)
+        + "?session_id={CHECKOUT_SESSION_ID}"
+    )
+    cancel_url = reverse("payments:payment-order-cancel", request=request)
+    return success_url, cancel_url
+
+
+def get_idempotency_key(payment: Payment) -> str:
+    """
+    Key of the current attempt to create a session of the payment: the
+    network retries of one attempt never open a second checkout session,
+    while the next attempt, e.g. a renewal after a failure, is not
+    answered with the error Stripe cached for the previous one.
+    """
+    return (
+        f"borrowing-{payment.borrowing_id}-payment-{payment.id}-"
+        f"attempt-{payment.session_attempts}"
+    )
+
+
+def create_checkout_session(
+    product_name: str,
     money_to_pay: float,
+    success_url: str,
+    cancel_url: str,
+    idempotency_key: str = None,
 ):
-    session = stripe.checkout.Session.create(
+    return stripe_client.create_checkout_session(
+        idempotency_key=idempotency_key,
         line_items=[
             {
                 "price_data": {
                     "currency": "usd",
                     "product_data": {
-                        "name": borrowing.book.title,
+                        "name": product_name,
                     },
                     "unit_amount": int(money_to_pay * 100),
                 },
@@ -28,8 +60,101 @@ def create_stripe_session(
             }
         ],
         mode="payment",
-        success_url=reverse("payments:payment-order-success", request=request)
-        + "?session_id={CHECKOUT_SESSION_ID}",
-        cancel_url=reverse("payments:payment-order-cancel", request=request),
+        success_url=success_url,
+        cancel_url=cancel_url,
+    )
+
+
+def create_stripe_session(
+    request: Request,
+    borrowing: Borrowing,
+    money_to_pay: float,
+    idempotency_key: str = None,
+):
+    return create_checkout_session(
+        borrowing.book.title,
+        money_to_pay,
+        *get_checkout_urls(request),
+        idempotency_key=idempotency_key,
+    )
+
+
+def create_session_later(request: Request, payment: Payment) -> Payment:
+    """
+    Save the payment in "creating" status and leave the session to a
+    Celery task started after commit; clients poll the session url
+    """
+    from payments_service.tasks import create_payment_session_task
+
+    payment.status = "creating"
+    payment.save()
+    success_url, cancel_url = get_checkout_urls(request)
+    transaction.on_commit(
+        lambda: create_payment_session_task.delay(
+            payment.id, success_url, cancel_url
+        )
+    )
+    return payment
+
+
+def start_payment_session(request: Request, payment: Payment) -> Payment:
+    """
+    Create the Stripe checkout session of the payment and save it.
+
+    A new payment is saved first, its id is part of the idempotency key.
+    If Stripe fails, the session is left to the Celery task, which
+    retries it and expires the payment for renewal when Stripe stays
+    unreachable.
+
+    With STRIPE_ASYNC_SESSIONS every session is created by the task, so
+    the request does not wait for the Stripe round trip.
+    """
+    if settings.STRIPE_ASYNC_SESSIONS:
+        return create_session_later(request, payment)
+
+    if payment.pk is None:
+        payment.status = "creating"
+    payment.session_attempts += 1
+    payment.save()
+    try:
+        session = create_stripe_session(
+            request,
+            payment.borrowing,
+            payment.money_to_pay,
+            idempotency_key=get_idempotency_key(payment),
+        )
+    except stripe.error.StripeError as error:
+        logger.warning(
+            f"Could not create checkout session of payment {payment.id}, "
+            f"retrying in the background: {error}"
+        )
+        return create_session_later(request, payment)
+    payment.session_url = session.url
+    payment.session_id = session.id
+    payment.expires_at = session.expires_at
+    payment.status = "pending"
+    payment.save()
+    return payment
+
+
+def payment_session_response(request: Request, payment: Payment) -> Response:
+    """Redirect to the checkout page, or point to the polling url"""
+    if payment.status == "creating":
+        return Response(
+            {
+                "payment_id": payment.id,
+                "status": payment.status,
+                "session": reverse(
+                    "payments:payment-session",
+                    args=[payment.id],
+                    request=request,
+                ),
+            },
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Retry-After": "1"},
+        )
+
+    return Response(
+        {"session_url": payment.session_url},
+        status=status.HTTP_307_TEMPORARY_REDIRECT,
     )
-    return session
@@ -1,23 +1,30 @@
 import logging
 
+import stripe
+from django.conf import settings
+from django.db import transaction
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
 from rest_framework_simplejwt.views import status
-import stripe
-from borrowing_service.tasks import send_notification_task
+from borrowing_service.notifications import queue_notification
 
-from payments_service.models import Payment
+from payments_service.models import Payment, StripeEvent
 from payments_service.serializers.common import (
     PaymentListSerializer,
     PaymentDetailSerializer,
 )
 from library_project.permissions import IsBorrowingOwnerOrAdmin
-from payments_service.utils import create_stripe_session
+from payments_service.stripe_client import retrieve_checkout_session
+from payments_service.tasks import process_stripe_events
+from payments_service.utils import (
+    payment_session_response,
+    start_payment_session,
+)
 
 
 logger = logging.getLogger("payments_service")
@@ -29,27 +36,65 @@ class RenewPaymentSessionView(APIView):
     def post(self, request, pk):
         payment = get_object_or_404(Payment, pk=pk)
         if payment.status == "expired":
-            borrowing = payment.borrowing
-            session = create_stripe_session(
-                request, borrowing, payment.money_to_pay
-            )
-            payment.session_url = session.url
-            payment.session_id = session.id
-            payment.status = "pending"
-            payment.save()
-            return Response(
-                {"session_url": session.url},
-                status=status.HTTP_307_TEMPORARY_REDIRECT,
-            )
+            payment = start_payment_session(request, payment)
+            return payment_session_response(request, payment)
         return Response(
             {"info": "This payment is not expired"}, status=status.HTTP_200_OK
         )
 
 
+class StripeWebhookView(APIView):
+    """
+    Receive signed checkout session events from Stripe. Events are only
+    stored here, deduplicated by their id, and applied in bulk by the
+    process_stripe_events task, so Stripe gets its answer right away.
+    """
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    throttle_classes = ()
+    handled_events = (
+        "checkout.session.completed",
+        "checkout.session.expired",
+    )
+
+    def post(self, request):
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            logger.error("STRIPE_WEBHOOK_SECRET is not configured")
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        try:
+            event = stripe.Webhook.construct_event(
+                request.body,
+                request.META.get("HTTP_STRIPE_SIGNATURE", ""),
+                settings.STRIPE_WEBHOOK_SECRET,
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
+            logger.warning("Rejected Stripe webhook with invalid signature")
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        if event["type"] in self.handled_events:
+            session = event["data"]["object"]
+            StripeEvent.objects.bulk_create(
+                [
+                    StripeEvent(
+                        event_id=event["id"],
+                        type=event["type"],
+                        session_id=session["id"],
+                        payment_status=session.get("payment_status") or "",
+                    )
+                ],
+                ignore_conflicts=True,
+            )
+            transaction.on_commit(process_stripe_events.delay)
+        return Response(status=status.HTTP_200_OK)
+
+
 class PaymentViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
     queryset = Payment.objects.select_related("borrowing__book")
     serializer_class = PaymentDetailSerializer
     permission_classes = (IsAuthenticated, IsBorrowingOwnerOrAdmin)
+    keyset_ordering = ("status", "id")
+    replica_actions = ("list",)
 
     def get_queryset(self):
         queryset = self.queryset
@@ -64,20 +109,33 @@ class PaymentViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
             return PaymentListSerializer
         return self.serializer_class
 
+    @action(methods=["GET"], detail=True, url_path="session")
+    def session(self, request, pk=None):
+        """Poll until the checkout session of the payment is created"""
+        return payment_session_response(request, self.get_object())
+
     @action(methods=["GET"], detail=False, url_path="success")
     def order_success(self, request):
         if session_id := request.query_params.get("session_id"):
-            session = stripe.checkout.Session.retrieve(session_id)
-            payment = Payment.objects.get(session_id=session_id)
-            if session["payment_status"] == "paid":
-                payment.status = "paid"
-                payment.save()
-                message = (
-                    f"{payment.money_to_pay}$ for "
-                    f"{payment.borrowing} were paid"
+            payment = get_object_or_404(Payment, session_id=session_id)
+            if payment.status == "paid":
+                return Response(
+                    {"info": "Your payment was successful"},
+                    status=status.HTTP_200_OK,
                 )
-                send_notification_task.delay(message)
-                logger.info(f"Successful payment {payment.id}")
+            session = retrieve_checkout_session(session_id)
+            if session["payment_status"] == "paid":
+                # the webhook may have marked it paid in the meantime
+                if (
+                    Payment.objects.filter(pk=payment.pk)
+                    .exclude(status="paid")
+                    .update(status="paid")
+                ):
+                    queue_notification(
+                        f"{payment.money_to_pay}$ for "
+                        f"{payment.borrowing} were paid"
+                    )
+                    logger.info(f"Successful payment {payment.id}")
                 return Response(
                     {"info": "Your payment was successful"},
                     status=status.HTTP_200_OK,
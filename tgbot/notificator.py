@@ -1,35 +1,134 @@
 import logging
 import os
-from django.contrib.auth import get_user_model
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from dotenv import load_dotenv
-from requests import HTTPError
+from requests import HTTPError, RequestException
+from requests.adapters import HTTPAdapter
+
+from library_project import metrics
 
 
 logger = logging.getLogger("tg_bot")
 
+load_dotenv()
 
-def send_notification(notification: str):
-    """Send message to admins in private telegram chat"""
-    load_dotenv()
-    token = os.environ.get("TOKEN")
-    recievers = (
-        get_user_model()
-        .objects.filter(is_staff=True, telegram_id__isnull=False)
-        .distinct()
-        .values_list("telegram_id", flat=True)
-    )
-    recievers = list(recievers)
-    for chat_id in recievers:
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        params = {
-            "chat_id": chat_id,
-            "text": notification,
-        }
+RECIPIENTS_CACHE_KEY = "tgbot:recipients"
+
+_session: Optional[requests.Session] = None
+
+
+def get_session() -> requests.Session:
+    """Keep-alive session shared by every notification of the process"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.mount(
+            "https://",
+            HTTPAdapter(pool_maxsize=settings.TELEGRAM_CONCURRENCY),
+        )
+        session.mount(
+            "http://",
+            HTTPAdapter(pool_maxsize=settings.TELEGRAM_CONCURRENCY),
+        )
+        _session = session
+    return _session
+
+
+def get_recipients() -> list[int]:
+    """Telegram ids of staff users, cached until a user changes"""
+    recipients = cache.get(RECIPIENTS_CACHE_KEY)
+    if recipients is None:
+        recipients = list(
+            get_user_model()
+            .objects.filter(is_staff=True, telegram_id__isnull=False)
+            .distinct()
+            .values_list("telegram_id", flat=True)
+        )
+        cache.set(
+            RECIPIENTS_CACHE_KEY,
+            recipients,
+            settings.TELEGRAM_RECIPIENTS_CACHE_TIMEOUT,
+        )
+    return recipients
+
+
+def invalidate_recipients() -> None:
+    cache.delete(RECIPIENTS_CACHE_KEY)
+
+
+def send_message(url: str, chat_id: int, text: str) -> bool:
+    """
+    Send one message; on 429 wait for the retry_after Telegram asks for
+    and try again, up to TELEGRAM_MAX_RETRIES times
+    """
+    params = {"chat_id": chat_id, "text": text}
+    for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
         try:
-            resp = requests.get(url, params=params)
+            resp = get_session().get(
+                url, params=params, timeout=settings.TELEGRAM_TIMEOUT
+            )
+            if (
+                resp.status_code == 429
+                and attempt < settings.TELEGRAM_MAX_RETRIES
+            ):
+                retry_after = (
+                    resp.json().get("parameters", {}).get("retry_after", 1)
+                )
+                metrics.increment("telegram:rate_limited")
+                logger.warning(
+                    f"Telegram rate limit, retrying {chat_id} "
+                    f"in {retry_after}s"
+                )
+                time.sleep(retry_after)
+                continue
             resp.raise_for_status()
+            metrics.increment("telegram:sent")
+            return True
         except HTTPError:
             logger.error(f"Wrong telegram id {chat_id}")
-            return recievers
+            break
+        except RequestException as error:
+            logger.error(f"Could not notify telegram id {chat_id}: {error}")
+            break
+    metrics.increment("telegram:failed")
+    return False
+
+
+def send_notification(
+    notification: str, recipients: Optional[list[int]] = None
+) -> list[int]:
+    """
+    Send message to admins in private telegram chat, or to the given
+    telegram ids.
+
+    Recipients are notified concurrently, at most TELEGRAM_CONCURRENCY at
+    a time; a failing chat does not stop the others. Returns the telegram
+    ids that could not be notified.
+    """
+    token = os.environ.get("TOKEN")
+    chat_ids = get_recipients() if recipients is None else recipients
+    if not token:
+        logger.error("Telegram TOKEN is not configured")
+        return chat_ids
+    if not chat_ids:
+        return []
+
+    url = f"{settings.TELEGRAM_API_BASE}/bot{token}/sendMessage"
+    workers = min(settings.TELEGRAM_CONCURRENCY, len(chat_ids))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        sent = list(
+            executor.map(
+                lambda chat_id: send_message(url, chat_id, notification),
+                chat_ids,
+            )
+        )
+    return [
+        chat_id for chat_id, success in zip(chat_ids, sent) if not success
+    ]
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import requests
 import asynctest
@@ -16,9 +16,14 @@ class TestSendNotification(unittest.TestCase):
         self.receivers = [123456789, 987654321]
         self.notification = "Test notification"
 
-    @patch("tgbot.notificator.requests.get")
+    @patch("tgbot.notificator.get_recipients")
+    @patch("tgbot.notificator.get_session")
     @patch("tgbot.notificator.os.environ.get")
-    def test_successful_notification(self, mock_get, mock_request_get):
+    def test_successful_notification(
+        self, mock_get, mock_session, mock_recipients
+    ):
+        mock_recipients.return_value = self.receivers
+        mock_request_get = mock_session.return_value.get
         mock_get.return_value = "test_token"
         mock_request_get.return_value.status_code = 200
         mock_request_get.return_value.raise_for_status.return_value = None
@@ -27,27 +32,53 @@ class TestSendNotification(unittest.TestCase):
 
         self.assertEqual(mock_request_get.call_count, len(self.receivers))
 
+    @patch("tgbot.notificator.get_recipients")
     @patch("tgbot.notificator.os.environ.get")
-    def test_missing_token(self, mock_get):
+    def test_missing_token(self, mock_get, mock_recipients):
+        mock_recipients.return_value = self.receivers
         mock_get.return_value = None
 
         self.assertIsNotNone(
             send_notification(self.notification)
         )
 
-    @patch("tgbot.notificator.requests.get")
+    @patch("tgbot.notificator.get_recipients")
+    @patch("tgbot.notificator.get_session")
     @patch("tgbot.notificator.os.environ.get")
-    def test_failed_notification(self, mock_get, mock_request_get):
+    def test_failed_notification(
+        self, mock_get, mock_session, mock_recipients
+    ):
+        mock_recipients.return_value = self.receivers
+        mock_request_get = mock_session.return_value.get
         mock_get.return_value = "test_token"
         mock_request_get.return_value.status_code = 400
         mock_request_get.return_value.raise_for_status.side_effect = (
             requests.HTTPError
         )
 
-        self.assertIsNotNone(
-            send_notification(self.notification)
+        self.assertEqual(
+            send_notification(self.notification), self.receivers
         )
 
+    @patch("tgbot.notificator.time.sleep")
+    @patch("tgbot.notificator.get_recipients")
+    @patch("tgbot.notificator.get_session")
+    @patch("tgbot.notificator.os.environ.get")
+    def test_rate_limited_notification(
+        self, mock_get, mock_session, mock_recipients, mock_sleep
+    ):
+        mock_recipients.return_value = self.receivers[:1]
+        mock_get.return_value = "test_token"
+        rate_limited = Mock(status_code=429)
+        rate_limited.json.return_value = {"parameters": {"retry_after": 3}}
+        mock_session.return_value.get.side_effect = [
+            rate_limited,
+            Mock(status_code=200),
+        ]
+
+        self.assertEqual(send_notification(self.notification), [])
+        mock_sleep.assert_called_once_with(3)
+
 
 class TestBotHandlers(asynctest.TestCase):
     async def test_command_help_handler(self):
@@ -8,6 +8,7 @@ from rest_framework.viewsets import GenericViewSet
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from library_project.log import payload
 from user.serializers import UserSerializer, TelegramUserSerializer
 
 
@@ -24,7 +25,9 @@ class CreateUserView(
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
-        logger.info("Created user", {"data": serializer.data})
+        logger.info(
+            "Created user", extra=payload(data=lambda: serializer.data)
+        )
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED,
@@ -55,7 +58,9 @@ class ManageUserView(
         if getattr(instance, "_prefetched_objects_cache", None):
             instance._prefetched_objects_cache = {}
 
-        logger.info("Updated user", {"data": serializer.data})
+        logger.info(
+            "Updated user", extra=payload(data=lambda: serializer.data)
+        )
         return Response(serializer.data)
 
 
@@ -83,7 +88,10 @@ class TelegramUserView(
         if getattr(instance, "_prefetched_objects_cache", None):
             instance._prefetched_objects_cache = {}
 
-        logger.info("Updated telegram user", {"data": serializer.data})
+        logger.info(
+            "Updated telegram user",
+            extra=payload(data=lambda: serializer.data),
+        )
         return Response(serializer.data)
 
 
@@ -96,5 +104,9 @@ class CustomTokenObtainPairView(TokenObtainPairView):
         except TokenError as e:
             raise InvalidToken(e.args[0])
 
-        logger.info("Authenticated user", {"data": serializer.data})
+        # the data holds the issued tokens, which must not reach the logs
+        logger.info(
+            "Authenticated user",
+            extra=payload(user_id=serializer.user.id),
+        )
         return Response(serializer.validated_data, status=status.HTTP_200_OK)